@@ -40,6 +40,7 @@ setup(
     zip_safe=False,
     license="MPL 2.0",
     install_requires=install_requires,
+    extras_require={"epub": ["markdown"], "pdf": ["markdown", "weasyprint"]},
     tests_require=tests_requires,
     python_requires=">=3.7",
     classifiers=[
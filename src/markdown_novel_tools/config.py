@@ -8,10 +8,10 @@ import sys
 from copy import deepcopy
 from pathlib import Path
 
-import yaml
 from git import InvalidGitRepositoryError, Repo
 
 from markdown_novel_tools.constants import DEFAULT_CONFIG
+from markdown_novel_tools.yaml_backend import load_yaml
 
 
 def get_config_path():
@@ -32,6 +32,19 @@ def get_config_path():
             return path
 
 
+def get_cache_dir(config, name):
+    """Return the cache directory for `name`, creating it if needed."""
+    if config.get("cache_dir"):
+        cache_dir = Path(config["cache_dir"])
+    elif os.environ.get("XDG_CACHE_HOME"):
+        cache_dir = Path(os.environ["XDG_CACHE_HOME"]) / "md-novel"
+    else:
+        cache_dir = Path(os.environ["HOME"]) / ".cache" / "md-novel"
+    cache_dir = cache_dir / name
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
 def get_metadata_path(config, format_="default"):
     """Get the `novel convert` metadata path for a given format."""
     return Path(
@@ -132,7 +145,7 @@ def get_config(args=None, keep_book_num=True):
     user_config = {}
     if path is not None:
         with open(path) as fh:
-            user_config = yaml.safe_load(fh)
+            user_config = load_yaml(fh)
     if not keep_book_num:
         config["book_num"] = None
         user_config["book_num"] = None
@@ -44,7 +44,22 @@ DEFAULT_CONFIG = {
             "epub_css_path": "epub.css",
         },
         "shunn_repo_url": "https://github.com/escapewindow/pandoc-templates",
+        # A local checkout to use as is; otherwise we keep a checkout in the cache dir
         "shunn_repo_path": None,
+        # Clone the cached checkout from this local path or url instead, e.g. for offline use
+        "shunn_repo_mirror": None,
+        # Pin the cached checkout to this commit. Unpinned, the first clone is kept as is; pin a
+        # newer commit to update it
+        "shunn_repo_rev": None,
+        # `auto` renders pdfs in-process if WeasyPrint and Python-Markdown are installed;
+        # `pandoc` always runs `pandoc --pdf-engine=weasyprint`
+        "pdf_engine": "auto",
+        # `auto` packages epubs natively if Python-Markdown is installed, rebuilding only the
+        # changed chapters; `pandoc` always runs `pandoc -t epub`
+        "epub_engine": "auto",
+        # `auto` sends pandoc conversions to one long-lived `pandoc-server` if it's installed;
+        # `subprocess` always runs a new `pandoc` per document
+        "pandoc_engine": "auto",
     },
     # TODO works in develop env, need an install fix
     "markdown_template_dir": str(
@@ -52,10 +67,38 @@ DEFAULT_CONFIG = {
     ),
     "find_files_by_name_cmd": ["fd", "-s"],
     "find_files_by_content_cmd": ["rg", "-l"],
+    # Defaults to $XDG_CACHE_HOME/md-novel or ~/.cache/md-novel
+    "cache_dir": None,
 }
 
 
+# Convert {{{1
+CONVERT_FORMATS = ("pdf", "chapter-pdf", "shunn-docx", "shunn-md", "text", "epub", "simple-pdf")
+
+# Bump this when the cached epub chapter xhtml changes shape.
+EPUB_BUILD_VERSION = 2
+
+# Prune each book's epub build dir back to this size, least recently used first.
+EPUB_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Pandoc formats that are read and written as bytes.
+PANDOC_BINARY_FORMATS = ("docx", "epub", "epub2", "epub3", "odt", "pptx")
+
+# Seconds to wait for `pandoc-server` to start listening, and for it to convert one document.
+PANDOC_SERVER_START_TIMEOUT = 5
+PANDOC_SERVER_TIMEOUT = 120
+
+# The cached pandoc-templates checkout is cloned again if any of these are missing.
+SHUNN_REPO_FILES = ("bin/md2long.sh",)
+
+# These take other input files, so they can't share a build with the other formats.
+SINGLE_CONVERT_FORMATS = ("shunn-md", "simple-pdf")
+
+
 # Outline {{{1
+# Evict the least recently used parsed outline snapshots past this total size.
+OUTLINE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
 OUTLINE_HTML_HEADER = """<html><head><style>
     table, th, td {
       border: 1px solid black;
@@ -68,28 +111,95 @@ OUTLINE_HTML_HEADER = """<html><head><style>
 # Regex {{{1
 ALPHANUM_REGEX = re.compile(r"""\w""")
 
+# A structure beat in an outline Arc or Beat value
 BEATS_REGEX = re.compile(
-    r"""[ ,/](Hook|Plot Turn 1|Pinch 1|Midpoint|Pinch 2|Plot Turn 2|Resolution|Series Arc|Book Arc)[ ,/][^|]*|\s+$"""
+    r"""(?:^|[ ,/])(Hook|Plot Turn 1|Pinch 1|Midpoint|Pinch 2|Plot Turn 2|Resolution|Series Arc|Book Arc)(?:[ ,/]|$)"""
 )
 
+# A run of digits, kept by `re.split`
+DIGITS_REGEX = re.compile(r"""(\d+)""")
+
+# ` - ` or `--` between two non-hyphens, to turn into an em-dash
+EM_DASH_REGEX = re.compile(r"""([^-])(\s+-\s+|--)([^-]|$)""")
+
+# The start of a level-1 heading, where the epub is split into chapters
+EPUB_CHAPTER_REGEX = re.compile(r"""^(?=# )""", re.MULTILINE)
+
+# The leading frontmatter block: a `---` line at the start of the file, through the next `---` line
+FRONTMATTER_REGEX = re.compile(r"""\A---\r?\n(?P<frontmatter>.*?\n)??---(?:\r?\n|\Z)""", re.DOTALL)
+
+# A named html entity, which xhtml doesn't define
+HTML_ENTITY_REGEX = re.compile(r"""&(?P<name>[A-Za-z][A-Za-z0-9]*);""")
+
+# An html h1 element, for the epub table of contents
+HTML_H1_REGEX = re.compile(r"""<h1[^>]*>(?P<label>.*?)</h1>""", re.DOTALL)
+
+HTML_ID_REGEX = re.compile(r"""\sid=["'](?P<id>[^"']+)["']""")
+
+# A link to an anchor in the same html document
+HTML_LOCAL_HREF_REGEX = re.compile(r"""href=["']#(?P<id>[^"']+)["']""")
+
+HTML_TAG_REGEX = re.compile(r"""<[^>]+>""")
+
+# A symbol-only word at the start of the text, e.g. `--`
+LEADING_SYMBOL_WORD_REGEX = re.compile(r"""[^\s\w]+(?!\S)""")
+
 LINKS_REGEX = re.compile(r"""\[\[([^\[\]]+)\]\]""")
 
+# A `-` list marker, followed by the item. Doesn't match `--` dialogue dashes.
+LIST_ITEM_REGEX = re.compile(r"""^\s*-(?=\s+\S)""")
+
 MANUSCRIPT_REGEX = re.compile(
     r"""^(?P<book_num>\d+)[-_](?P<chapter_num>\d+)[-_](?P<scene_num>\d+) - (?P<POV>\S+)"""
 )
 
+MD_SUFFIX_REGEX = re.compile(r"""\.md$""")
+
 OUTLINE_SCENE_REGEX = re.compile(
     r"""^((?P<book_num>\d*)\.)?(?P<chapter_num>\d+)\.(?P<scene_num>\d+)$"""
 )
 
-QUESTIONS_REGEX = re.compile(r"""[ ,/](Question|Promise|Reveal|Status)[ ,/][^|]*|\s+$""")
+# A question beat in an outline Arc or Beat value
+QUESTIONS_REGEX = re.compile(r"""(?:^|[ ,/])(Question|Promise|Reveal|Status)(?:[ ,/]|$)""")
+
+# A single `frontmatter query` token: an operator, a paren, a quoted value, or a bare word
+QUERY_TOKEN_REGEX = re.compile(
+    r"""\s*(?:(?P<op>\^?=)|(?P<paren>[()])|(?P<quoted>"[^"]*"|'[^']*')|(?P<word>[^\s()=^"']+))\s*"""
+)
+
+# A double quote next to a single quote: `'"` closes, `"'` opens
+QUOTE_NBSP_REGEX = re.compile(r"""(?<=')(?P<close>")|"(?=')""")
 
 SCENE_SPLIT_REGEX = re.compile(r"""^\s{4,}\* \* \*""")
 
+SPACES_REGEX = re.compile(r""" +""")
+
 SPECIAL_CHAR_REGEX = re.compile(r"""[^A-Za-z0-9 ]""")
 
+# A whitespace-delimited word with no alphanumeric characters, e.g. ` --` or ` *`
+SYMBOL_WORD_REGEX = re.compile(r"""\s[^\s\w]+(?!\S)""")
+
 TABLE_DIVIDER_REGEX = re.compile(r"""^[|\-\s]*$""")
 
+# Every table header character that isn't a column separator
+TABLE_HEADER_CHAR_REGEX = re.compile(r"""[^+|]""")
+
+# A `---` or `- - -` horizontal rule
+THEMATIC_BREAK_REGEX = re.compile(r"""^\s*(?:-\s*){3,}$""")
+
+TRIPLE_LINK_REGEX = re.compile(r"""\[\[\[+""")
+
+# A `novel beats --where` scene range value: `10..20` or `10.2..12.1`
+WHERE_RANGE_REGEX = re.compile(r"""^(?P<low>\d+(\.\d+)?)\.\.(?P<high>\d+(\.\d+)?)$""")
+
+# A single `novel beats --where` token: an operator, a paren or comma, a quoted value, or a bare word
+WHERE_TOKEN_REGEX = re.compile(
+    r"""\s*(?:(?P<op>~?=)|(?P<paren>[(),])|(?P<quoted>"[^"]*"|'[^']*')|(?P<word>[^\s(),=~"']+))\s*"""
+)
+
+# A wikilink, optionally with an alias: `[[target]]` or `[[target|alias]]`
+WIKILINK_REGEX = re.compile(r"""\[\[([^\]\|]+\|)?([^\]]+)\]\]""")
+
 # Strings {{{1
 SCENE_SPLIT_ASTERISK = (
     r"\n<center>\n&ast;&nbsp;&nbsp;&nbsp;&ast;&nbsp;&nbsp;&nbsp;&ast;\n</center>\n"
@@ -6,48 +6,58 @@ plugins and the various existing pandoc formats aren't working for me.
 """
 
 import os
-import re
 import shutil
-import subprocess
 import sys
+import threading
 import time
 from pathlib import Path
 
-import yaml
 from num2words import num2words
 
-from markdown_novel_tools.config import get_css_path, get_metadata_path
+from markdown_novel_tools.config import get_cache_dir, get_css_path, get_metadata_path
 from markdown_novel_tools.constants import (
     ALPHANUM_REGEX,
+    EM_DASH_REGEX,
     MANUSCRIPT_REGEX,
+    MD_SUFFIX_REGEX,
+    QUOTE_NBSP_REGEX,
     SCENE_SPLIT_ASTERISK,
     SCENE_SPLIT_PLAINTEXT,
     SCENE_SPLIT_POUND,
     SCENE_SPLIT_REGEX,
+    WIKILINK_REGEX,
 )
+from markdown_novel_tools.epub import EpubBuilder, split_chapters, use_epub_packager
+from markdown_novel_tools.mdfile import get_frontmatter_and_body
+from markdown_novel_tools.pdf_backend import get_pdf_renderer, use_pdf_renderer
+from markdown_novel_tools.profiling import check_call, timed
 from markdown_novel_tools.utils import find_markdown_files, get_git_revision, local_time, mkdir
+from markdown_novel_tools.yaml_backend import load_yaml
 
 
 def unwikilink(string):
     """remove the [[ ]] from a string"""
-    return re.sub(r"""\[\[([^\]\|]+\|)?([^\]]+)\]\]""", r"\2", string)
+    if "[[" not in string:
+        return string
+    return WIKILINK_REGEX.sub(r"\2", string)
 
 
+def _quote_nbsp(match):
+    """Replace a double quote next to a single quote with a curly quote and a nbsp."""
+    if match["close"]:
+        return "&nbsp;&#8221;"
+    return "&#8220;&nbsp;"
+
+
+@timed()
 def simplify_markdown(
     contents, ignore_blank_lines=True, plaintext=True, scene_split_string=None, **kwargs
 ):
     """Simplify the markdown - remove frontmatter, unwikilink."""
-    in_meta = False
-    simplified_contents = ""
-    for line in contents.splitlines():
-        if line == "---":
-            in_meta = not in_meta
-            continue
-
-        # Ignore metadata
-        if in_meta:
-            continue
-
+    simplified_contents = []
+    # Ignore metadata
+    _, body = get_frontmatter_and_body(contents)
+    for line in body.splitlines():
         # Ignore blank lines
         if ignore_blank_lines and ALPHANUM_REGEX.search(line) is None:
             continue
@@ -55,14 +65,15 @@ def simplify_markdown(
         line = unwikilink(line)
         if not plaintext:
             # em-dash
-            line = re.sub(r"""([^-])(\s+-\s+|--)([^-]|$)""", r"\1&mdash;\3", line)
+            if "-" in line:
+                line = EM_DASH_REGEX.sub(r"\1&mdash;\3", line)
             # nbsp between single quote and double quote
-            line = re.sub(r"'\"", r"'&nbsp;&#8221;", line)
-            line = re.sub(r"\"'", r"&#8220;&nbsp;'", line)
+            if "'" in line and '"' in line:
+                line = QUOTE_NBSP_REGEX.sub(_quote_nbsp, line)
             if scene_split_string:
-                line = re.sub(SCENE_SPLIT_REGEX, scene_split_string, line)
-        simplified_contents = f"{simplified_contents}{line}\n"
-    return simplified_contents
+                line = SCENE_SPLIT_REGEX.sub(scene_split_string, line)
+        simplified_contents.append(f"{line}\n")
+    return "".join(simplified_contents)
 
 
 def munge_metadata(path, artifact_dir):
@@ -84,28 +95,43 @@ def munge_metadata(path, artifact_dir):
     return (contents, orig_image, new_image)
 
 
-def get_output_basestr(
-    args, format_string="book{book_num}-{datestr}-{subtitle_dash}{revstr}", repl_dict=None
-):
-    """Get the basestr for the name of our output file."""
-    if repl_dict is None:
-        repl_dict = {
+def get_naming_context(args, format_string=None):
+    """Return the values used to name our output files.
+
+    These are computed once per run and shared through `args.naming_context`, so every format of
+    a multi-format build gets the same names. `revstr` and `datestr` are only computed once a
+    `format_string` needs them; None means every value is needed.
+    """
+    context = getattr(args, "naming_context", None)
+    if context is None:
+        context = {
             "book_num": args.config["book_num"],
             "subtitle": "",
             "subtitle_dash": "",
         }
-        if "{revstr}" in format_string:
-            repl_dict["revstr"] = get_git_revision()
-        if "{datestr}" in format_string:
-            repl_dict["datestr"] = local_time(
-                time.time(), timezone=args.config["timezone"]
-            ).strftime("%Y.%m.%d")
         if args.subtitle:
-            repl_dict["subtitle"] = args.subtitle
-            repl_dict["subtitle_dash"] = f"{args.subtitle}-"
+            context["subtitle"] = args.subtitle
+            context["subtitle_dash"] = f"{args.subtitle}-"
+        args.naming_context = context
+    if "revstr" not in context and (format_string is None or "{revstr}" in format_string):
+        context["revstr"] = get_git_revision()
+    if "datestr" not in context and (format_string is None or "{datestr}" in format_string):
+        context["datestr"] = local_time(time.time(), timezone=args.config["timezone"]).strftime(
+            "%Y.%m.%d"
+        )
+    return context
+
+
+def get_output_basestr(
+    args, format_string="book{book_num}-{datestr}-{subtitle_dash}{revstr}", repl_dict=None
+):
+    """Get the basestr for the name of our output file."""
+    if repl_dict is None:
+        repl_dict = get_naming_context(args, format_string)
     return format_string.format(**repl_dict)
 
 
+@timed()
 def single_markdown_to_pdf(
     args,
     basename,
@@ -114,9 +140,15 @@ def single_markdown_to_pdf(
     artifact_dir=None,
     css_path=None,
 ):
-    """Create a pdf from each chapter"""
+    """Create a pdf from each chapter.
+
+    Render in-process through the shared PdfRenderer if we can, and fall back to pandoc.
+    """
     output_pdf = Path(artifact_dir or args.artifact_dir) / f"{basename}.pdf"
     css = css_path or get_css_path(args.config, variant="manuscript_pdf_css_path")
+    if use_pdf_renderer(args.config):
+        get_pdf_renderer().render(from_, output_pdf, css, toc=toc)
+        return
     cmd = [
         "pandoc",
         from_,
@@ -129,14 +161,14 @@ def single_markdown_to_pdf(
     if toc:
         cmd.append("--toc")
 
-    subprocess.check_call(cmd)
+    check_call(cmd)
 
 
 def convert_simple_pdf(args):
     """Create a non-outline, non-manuscript pdf from a markdown file."""
     mkdir(args.artifact_dir, clean=args.clean)
     for from_ in args.filename:
-        output_basestr = re.sub(r"\.md", "", os.path.basename(from_))
+        output_basestr = MD_SUFFIX_REGEX.sub("", os.path.basename(from_))
 
         single_markdown_to_pdf(
             args,
@@ -174,6 +206,13 @@ def _get_title_and_toc(title, heading_link, toc):
     return title, toc
 
 
+def _read_file(path):
+    """Return the contents of `path`."""
+    with open(path, encoding="utf-8") as fh:
+        return fh.read()
+
+
+@timed()
 def _get_converted_chapter_markdown_and_toc(
     paths,
     build_toc=False,
@@ -182,6 +221,7 @@ def _get_converted_chapter_markdown_and_toc(
     plaintext=False,
     scene_split_string=SCENE_SPLIT_POUND,
     title_separator=r"&mdash;",
+    read_file=_read_file,
 ):
     """Helper function to convert all novel markdown files in a path"""
     chapters = {}
@@ -209,24 +249,65 @@ def _get_converted_chapter_markdown_and_toc(
             if metadata:
                 chapter_title = f"{metadata}\n\n{chapter_title}"
             chapters.setdefault(chapter_num, chapter_title)
-            with open(path, encoding="utf-8") as fh:
-                simplified_contents = simplify_markdown(
-                    fh.read(),
-                    ignore_blank_lines=ignore_blank_lines,
-                    plaintext=plaintext,
-                    scene_split_string=scene_split_string,
-                )
-                if not first:
-                    chapters[chapter_num] = f"{chapters[chapter_num]}\n\n{scene_split_string}\n\n"
-                chapters[chapter_num] = f"{chapters[chapter_num]}{simplified_contents}\n"
+            simplified_contents = simplify_markdown(
+                read_file(path),
+                ignore_blank_lines=ignore_blank_lines,
+                plaintext=plaintext,
+                scene_split_string=scene_split_string,
+            )
+            if not first:
+                chapters[chapter_num] = f"{chapters[chapter_num]}\n\n{scene_split_string}\n\n"
+            chapters[chapter_num] = f"{chapters[chapter_num]}{simplified_contents}\n"
             first = False
     return chapters, toc
 
 
+class ChapterCache:
+    """Share the manuscript between the formats of a multi-format build.
+
+    Each source file is read once, and the chapters are converted once per distinct convert
+    config, no matter how many formats use them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contents = {}
+        self._chapters = {}
+
+    def read_file(self, path):
+        """Return the contents of `path`, reading it only once."""
+        if path not in self._contents:
+            self._contents[path] = _read_file(path)
+        return self._contents[path]
+
+    def get(self, paths, **kwargs):
+        """Return `_get_converted_chapter_markdown_and_toc(paths, **kwargs)`, converting once."""
+        key = (tuple(str(path) for path in paths), tuple(sorted(kwargs.items())))
+        # Conversion is pure python, so holding the lock costs no parallelism.
+        with self._lock:
+            if key not in self._chapters:
+                self._chapters[key] = _get_converted_chapter_markdown_and_toc(
+                    paths, read_file=self.read_file, **kwargs
+                )
+            return self._chapters[key]
+
+
+def get_chapters(args, **kwargs):
+    """Return the converted chapters and toc of `args.filename`, through `args.chapter_cache` if set."""
+    chapter_cache = getattr(args, "chapter_cache", None)
+    if chapter_cache is None:
+        return _get_converted_chapter_markdown_and_toc(args.filename, **kwargs)
+    return chapter_cache.get(args.filename, **kwargs)
+
+
+@timed()
 def convert_chapter(
     args, per_chapter_callback=None, output_basestr=None, plaintext=False, ignore_blank_lines=False
 ):
-    """Convert chapters into their own files."""
+    """Convert chapters into their own files.
+
+    Returns the chapter markdown paths this run wrote, in order.
+    """
     separator = "&mdash;"
     artifact_dir = Path(args.artifact_dir)
     metadata_path = get_metadata_path(args.config, args.format)
@@ -236,9 +317,7 @@ def convert_chapter(
     mkdir(artifact_dir, clean=args.clean)
 
     convert_config = get_format_convert_config(args.format)
-    chapters, _ = _get_converted_chapter_markdown_and_toc(
-        args.filename, metadata=metadata, **convert_config
-    )
+    chapters, _ = get_chapters(args, metadata=metadata, **convert_config)
 
     chapter_markdown = []
     chapter_count = 0
@@ -254,6 +333,7 @@ def convert_chapter(
         chapter_markdown.append(chapter_md)
         if per_chapter_callback is not None:
             per_chapter_callback(args, chapter_output_basestr, chapter_md)
+    return chapter_markdown
 
 
 def get_front_back_matter(matter_config, convert_config, toc):
@@ -276,6 +356,7 @@ def get_front_back_matter(matter_config, convert_config, toc):
     return contents, toc
 
 
+@timed()
 def convert_full(args):
     """Convert the full manuscript."""
     contents = ""
@@ -289,7 +370,7 @@ def convert_full(args):
         metadata, orig_image, new_image = munge_metadata(metadata_path, artifact_dir=artifact_dir)
 
     convert_config = get_format_convert_config(args.format)
-    chapters, toc = _get_converted_chapter_markdown_and_toc(args.filename, **convert_config)
+    chapters, toc = get_chapters(args, **convert_config)
 
     front_contents, front_toc = get_front_back_matter(
         args.config["convert"]["frontmatter_files"], convert_config, toc
@@ -305,26 +386,12 @@ def convert_full(args):
     if convert_config["build_toc"]:
         toc = f"# Table of Contents\n\n{front_toc}{toc}{back_toc}"
         contents = f"{toc}\n\n{contents}"
+    body = contents
     contents = f"{metadata}{contents}"
 
-    bin_dir = Path("bin")
     mkdir(artifact_dir, clean=args.clean)
-    subtitle = subtitle_dash = ""
-    if args.subtitle:
-        subtitle = args.subtitle
-        subtitle_dash = f"{subtitle}-"
-    revstr = get_git_revision()
-    datestr = local_time(time.time(), timezone=args.config["timezone"]).strftime("%Y.%m.%d")
-    output_basestr = get_output_basestr(
-        args,
-        repl_dict={
-            "datestr": datestr,
-            "revstr": revstr,
-            "subtitle": subtitle,
-            "subtitle_dash": subtitle_dash,
-            "book_num": args.config["book_num"],
-        },
-    )
+    naming_context = get_naming_context(args)
+    output_basestr = get_output_basestr(args, repl_dict=naming_context)
     output_md = artifact_dir / f"{output_basestr}.md"
     with open(output_md, "w", encoding="utf-8") as fh:
         fh.write(contents)
@@ -340,37 +407,42 @@ def convert_full(args):
         )
 
     elif args.format == "epub":
-        parsed_metadata = yaml.safe_load(metadata.replace("---", ""))
-        cover_title = f"{parsed_metadata['title']}\n{datestr}\n{subtitle}\n{revstr}"
+        parsed_metadata = load_yaml(metadata.replace("---", ""))
+        cover_title = (
+            f"{parsed_metadata['title']}\n{naming_context['datestr']}\n"
+            f"{naming_context['subtitle']}\n{naming_context['revstr']}"
+        )
+        css_path = get_css_path(args.config, variant="epub_css_path")
+        builder = EpubBuilder(
+            get_cache_dir(args.config, "epub") / f"book{naming_context['book_num']}", args.config
+        )
 
         # Create cover image
-        subprocess.check_call(
-            [
-                "magick",
-                orig_image,
-                "-pointsize",
-                "24",
-                "-fill",
-                "white",
-                "-annotate",
-                "+50+50",
-                cover_title,
-                new_image,
-            ]
-        )
+        cover_path = builder.cover(orig_image, cover_title)
+        shutil.copyfile(cover_path, new_image)
 
         # Create epub
-        subprocess.check_call(
-            [
-                "pandoc",
-                "-f",
-                "markdown",
-                "-t",
-                "epub",
-                "--css",
-                get_css_path(args.config, variant="epub_css_path"),
-                "-o",
+        if use_epub_packager(args.config):
+            builder.write(
                 artifact_dir / f"{output_basestr}.epub",
-                output_md,
-            ]
-        )
+                parsed_metadata,
+                split_chapters(body),
+                css_path,
+                cover_path=cover_path,
+            )
+        else:
+            check_call(
+                [
+                    "pandoc",
+                    "-f",
+                    "markdown",
+                    "-t",
+                    "epub",
+                    "--css",
+                    css_path,
+                    "-o",
+                    artifact_dir / f"{output_basestr}.epub",
+                    output_md,
+                ]
+            )
+        builder.prune()
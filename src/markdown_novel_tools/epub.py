@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""markdown-novel-tools native epub packaging.
+
+Package the converted manuscript as an epub ourselves, instead of running `pandoc -t epub` over
+the whole book on every build. The manuscript is split into chapters at its level-1 headings, like
+pandoc does, and each chapter's xhtml is kept in the build directory under the hash of its
+markdown, so a rebuild only converts the chapters that changed. The nav and package document are
+small and rebuilt every time. The annotated cover is kept under the hash of the original image and
+its annotation text, so `magick` only runs when the title, date, subtitle or revision change.
+
+Chapters are converted with Python-Markdown if it's installed, otherwise through the pandoc
+server. If neither is available, callers fall back to `pandoc -t epub`.
+"""
+
+import hashlib
+import mimetypes
+import os
+import sys
+import time
+import uuid
+import zipfile
+from html import escape, unescape
+from pathlib import Path
+
+from markdown_novel_tools.constants import (
+    EPUB_BUILD_VERSION,
+    EPUB_CACHE_MAX_BYTES,
+    EPUB_CHAPTER_REGEX,
+    HTML_ENTITY_REGEX,
+    HTML_H1_REGEX,
+    HTML_ID_REGEX,
+    HTML_LOCAL_HREF_REGEX,
+    HTML_TAG_REGEX,
+)
+from markdown_novel_tools.pandoc_backend import pandoc_convert, pandoc_server_cmd, use_pandoc_server
+from markdown_novel_tools.profiling import check_call, count, timed
+
+try:
+    import markdown
+
+    HAS_MARKDOWN = True
+except ImportError:
+    HAS_MARKDOWN = False
+
+# `smarty` curls quotes and turns `--` and `---` into dashes, like pandoc's default `smart`.
+MARKDOWN_EXTENSIONS = ("extra", "sane_lists", "smarty")
+
+# The entities xml defines; every other named entity is replaced by its character.
+XML_ENTITIES = ("amp", "apos", "gt", "lt", "quot")
+
+CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="EPUB/content.opf" media-type="application/oebps-package+xml" />
+  </rootfiles>
+</container>
+"""
+
+XHTML_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" \
+xml:lang="{lang}" lang="{lang}">
+<head>
+<meta charset="utf-8" />
+<title>{title}</title>
+<link rel="stylesheet" type="text/css" href="{css}" />
+</head>
+<body{body_attrs}>
+{body}
+</body>
+</html>
+"""
+
+
+def use_epub_packager(config):
+    """Return True if epubs should be packaged natively, per `convert.epub_engine` in `config`.
+
+    `auto` packages natively when Python-Markdown or the pandoc server is available; `pandoc`
+    always uses `pandoc -t epub`. The server isn't started here; `chapter_xhtml` starts it on
+    first use.
+    """
+    engine = config["convert"].get("epub_engine", "auto")
+    if engine not in ("auto", "pandoc"):
+        raise ValueError(f"Unknown convert.epub_engine {engine}!")
+    if engine != "auto":
+        return False
+    return HAS_MARKDOWN or (use_pandoc_server(config) and pandoc_server_cmd() is not None)
+
+
+def epub_needs_pandoc(config):
+    """Return True if building an epub per `config` runs pandoc.
+
+    The native packager only needs pandoc to convert the chapters when Python-Markdown is missing.
+    """
+    return not (HAS_MARKDOWN and use_epub_packager(config))
+
+
+def split_chapters(contents):
+    """Split the markdown `contents` into chapters at each level-1 heading.
+
+    Any text before the first heading is its own chapter. Blank chapters are dropped.
+    """
+    return [chapter for chapter in EPUB_CHAPTER_REGEX.split(contents) if chapter.strip()]
+
+
+def _xml_entity(match):
+    """Replace a named html entity that xml doesn't define with its character."""
+    if match["name"] in XML_ENTITIES:
+        return match[0]
+    character = unescape(match[0])
+    if character == match[0]:
+        # Unknown to html too; escape it rather than write broken xml.
+        return f"&amp;{match['name']};"
+    return escape(character, quote=False)
+
+
+def _sha256(*parts):
+    """Return the sha256 hexdigest of the str or bytes `parts`."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8") if isinstance(part, str) else part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _write_atomically(path, contents):
+    """Write the str `contents` to `path` through a temporary file."""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        fh.write(contents)
+    os.replace(tmp_path, path)
+
+
+class EpubBuilder:
+    """Build epubs from a build directory of converted chapters and covers.
+
+    Chapters are kept under `build_dir/chapters` and covers under `build_dir/covers`, both named
+    by content hash. Each one is touched when it's used, and `prune` deletes the least recently
+    used ones from earlier builds once the build dir is too big.
+    """
+
+    def __init__(self, build_dir, config):
+        self.build_dir = Path(build_dir)
+        self.config = config
+        self._markdown = None
+        self._used = set()
+        for subdir in ("chapters", "covers"):
+            os.makedirs(self.build_dir / subdir, exist_ok=True)
+
+    def chapter_xhtml(self, chapter):
+        """Return the markdown `chapter` as an xhtml fragment, converting it only if it changed."""
+        engine = "markdown" if HAS_MARKDOWN else "pandoc"
+        key = _sha256(str(EPUB_BUILD_VERSION), engine, chapter)
+        path = self.build_dir / "chapters" / f"{key}.xhtml"
+        self._used.add(path)
+        if path.exists():
+            count("epub chapters cached")
+            os.utime(path)
+            with open(path, encoding="utf-8") as fh:
+                return fh.read()
+        count("epub chapters converted")
+        if engine == "pandoc":
+            fragment = pandoc_convert(self.config, chapter, "markdown", "html5")
+        else:
+            if self._markdown is None:
+                self._markdown = markdown.Markdown(
+                    extensions=list(MARKDOWN_EXTENSIONS), output_format="xhtml"
+                )
+            self._markdown.reset()
+            fragment = self._markdown.convert(chapter)
+        fragment = HTML_ENTITY_REGEX.sub(_xml_entity, fragment)
+        _write_atomically(path, fragment)
+        return fragment
+
+    def cover(self, orig_image, annotation):
+        """Return the path to `orig_image` annotated with `annotation`, drawing it only if needed."""
+        orig_image = Path(orig_image)
+        with open(orig_image, "rb") as fh:
+            key = _sha256(fh.read(), annotation)
+        path = self.build_dir / "covers" / f"{key}{orig_image.suffix}"
+        self._used.add(path)
+        if path.exists():
+            count("epub covers cached")
+            os.utime(path)
+            return path
+        count("epub covers drawn")
+        tmp_path = path.with_name(f"{key}.{os.getpid()}.tmp{orig_image.suffix}")
+        try:
+            check_call(
+                [
+                    "magick",
+                    orig_image,
+                    "-pointsize",
+                    "24",
+                    "-fill",
+                    "white",
+                    "-annotate",
+                    "+50+50",
+                    annotation,
+                    tmp_path,
+                ]
+            )
+        except FileNotFoundError:
+            print("Drawing the epub cover requires `imagemagick`! Exiting...", file=sys.stderr)
+            sys.exit(1)
+        os.replace(tmp_path, path)
+        return path
+
+    def prune(self, max_bytes=EPUB_CACHE_MAX_BYTES):
+        """Delete the least recently used chapters and covers until they total `max_bytes` or less.
+
+        Anything used since this builder was created is kept, however big the build dir is.
+        """
+        entries = []
+        for subdir in ("chapters", "covers"):
+            for entry in os.scandir(self.build_dir / subdir):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, Path(entry.path)))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if path in self._used:
+                continue
+            count("epub build files pruned")
+            os.remove(path)
+            total -= size
+
+    @timed("epub.write")
+    def write(self, output_path, metadata, chapters, css_path, cover_path=None):
+        """Write the markdown `chapters` to the epub `output_path`.
+
+        `metadata` is the parsed pandoc metadata dict; `title`, `author`, `lang`, `rights` and
+        `identifier` are used.
+        """
+        lang = escape(str(metadata.get("lang", "en-US")))
+        title = escape(str(metadata.get("title", "")))
+        fragments = [self.chapter_xhtml(chapter) for chapter in chapters]
+        names = [f"ch{num:03d}.xhtml" for num in range(1, len(fragments) + 1)]
+
+        # Same-document links, like the table of contents, point at other chapters now.
+        id_to_name = {}
+        for name, fragment in zip(names, fragments):
+            for m in HTML_ID_REGEX.finditer(fragment):
+                id_to_name.setdefault(m["id"], name)
+
+        def page(body, page_title, css, body_attrs=""):
+            return XHTML_TEMPLATE.format(
+                lang=lang, title=page_title, css=css, body=body, body_attrs=body_attrs
+            )
+
+        documents = {}
+        nav_items = []
+        for num, (name, fragment) in enumerate(zip(names, fragments), start=1):
+
+            def relink(match, name=name):
+                target = id_to_name.get(match["id"])
+                if target is None or target == name:
+                    return match[0]
+                return f'href="{target}#{match["id"]}"'
+
+            m = HTML_H1_REGEX.search(fragment)
+            label = HTML_TAG_REGEX.sub("", m["label"]).strip() if m else ""
+            label = label or f"Section {num}"
+            nav_items.append(f'<li><a href="text/{name}">{label}</a></li>')
+            documents[f"EPUB/text/{name}"] = page(
+                HTML_LOCAL_HREF_REGEX.sub(relink, fragment), label, "../styles/stylesheet.css"
+            )
+
+        manifest = [
+            '<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav" />',
+            '<item id="stylesheet" href="styles/stylesheet.css" media-type="text/css" />',
+        ]
+        spine = []
+        cover_name = None
+        if cover_path is not None:
+            cover_path = Path(cover_path)
+            cover_name = f"media/cover{cover_path.suffix}"
+            media_type = mimetypes.guess_type(cover_path.name)[0] or "application/octet-stream"
+            manifest.append(
+                f'<item id="cover-image" href="{cover_name}" media-type="{media_type}" '
+                'properties="cover-image" />'
+            )
+            manifest.append(
+                '<item id="cover" href="text/cover.xhtml" media-type="application/xhtml+xml" />'
+            )
+            spine.append('<itemref idref="cover" />')
+            documents["EPUB/text/cover.xhtml"] = page(
+                f'<section epub:type="cover">\n<img src="../{cover_name}" alt="cover image" />\n'
+                "</section>",
+                title,
+                "../styles/stylesheet.css",
+                body_attrs=' id="cover"',
+            )
+        for num, name in enumerate(names, start=1):
+            manifest.append(
+                f'<item id="ch{num:03d}" href="text/{name}" media-type="application/xhtml+xml" />'
+            )
+            spine.append(f'<itemref idref="ch{num:03d}" />')
+
+        nav_list = "\n".join(nav_items)
+        documents["EPUB/nav.xhtml"] = page(
+            f'<nav epub:type="toc" id="toc">\n<h1>{title}</h1>\n<ol>\n{nav_list}\n</ol>\n</nav>',
+            title,
+            "styles/stylesheet.css",
+        )
+        documents["EPUB/content.opf"] = self._package_document(metadata, manifest, spine)
+
+        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            # The mimetype has to come first, uncompressed.
+            zf.writestr(zipfile.ZipInfo("mimetype"), "application/epub+zip", zipfile.ZIP_STORED)
+            zf.writestr("META-INF/container.xml", CONTAINER_XML)
+            for arcname, document in documents.items():
+                zf.writestr(arcname, document)
+            zf.write(css_path, "EPUB/styles/stylesheet.css")
+            if cover_name is not None:
+                zf.write(cover_path, f"EPUB/{cover_name}", zipfile.ZIP_STORED)
+        count("epub chapters packaged", len(names))
+
+    @staticmethod
+    def _package_document(metadata, manifest, spine):
+        """Return the content.opf package document."""
+        title = str(metadata.get("title", ""))
+        authors = metadata.get("author") or []
+        if not isinstance(authors, list):
+            authors = [authors]
+        identifier = metadata.get("identifier") or (
+            f"urn:uuid:{uuid.uuid5(uuid.NAMESPACE_URL, f'{title}/{authors}')}"
+        )
+        lines = [
+            f'<dc:identifier id="book-id">{escape(str(identifier))}</dc:identifier>',
+            f"<dc:title>{escape(title)}</dc:title>",
+        ]
+        lines.extend(f"<dc:creator>{escape(str(author))}</dc:creator>" for author in authors)
+        lines.append(f"<dc:language>{escape(str(metadata.get('lang', 'en-US')))}</dc:language>")
+        if metadata.get("rights"):
+            lines.append(f"<dc:rights>{escape(str(metadata['rights']))}</dc:rights>")
+        modified = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        lines.append(f'<meta property="dcterms:modified">{modified}</meta>')
+        newline = "\n"
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" '
+            'unique-identifier="book-id">\n'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">\n'
+            f"{newline.join(lines)}\n</metadata>\n"
+            f"<manifest>\n{newline.join(manifest)}\n</manifest>\n"
+            f"<spine>\n{newline.join(spine)}\n</spine>\n"
+            "</package>\n"
+        )
@@ -3,20 +3,26 @@
 
 import argparse
 import os
-import re
 import sys
 from pathlib import Path
 
-import yaml
-
-from markdown_novel_tools.config import add_config_parser_args, get_config
-from markdown_novel_tools.constants import MANUSCRIPT_REGEX
+from markdown_novel_tools.config import add_config_parser_args, get_cache_dir, get_config
+from markdown_novel_tools.constants import MANUSCRIPT_REGEX, MD_SUFFIX_REGEX
 from markdown_novel_tools.mdfile import (
     FRONTMATTER_VALIDATOR,
     get_markdown_file,
     write_markdown_file,
 )
-from markdown_novel_tools.outline import build_table_from_files, get_yaml_from_table
+from markdown_novel_tools.outline import build_table_from_files, get_scene_yaml, get_yaml_by_scene
+from markdown_novel_tools.profiling import add_profile_parser_args, run_func, timed
+from markdown_novel_tools.query import (
+    load_query_index,
+    parse_query,
+    query_fields,
+    run_query,
+    save_query_index,
+    update_query_index,
+)
 from markdown_novel_tools.utils import (
     diff_yaml,
     find_markdown_files,
@@ -24,6 +30,7 @@ from markdown_novel_tools.utils import (
     print_object_one_line_per,
     yaml_string,
 )
+from markdown_novel_tools.yaml_backend import load_yaml
 
 
 # Frontmatter {{{1
@@ -36,7 +43,7 @@ def frontmatter_check(args, strict=None):
     files = find_markdown_files(args.path)
     for path in files:
         markdown_file = get_markdown_file(path)
-        if markdown_file.manuscript_info["is_manuscript"]:
+        if markdown_file.is_manuscript:
             FRONTMATTER_VALIDATOR.validate(markdown_file.parsed_yaml)
             if FRONTMATTER_VALIDATOR.errors:
                 print(f"{os.path.basename(path)}\n{FRONTMATTER_VALIDATOR.errors}", file=sys.stderr)
@@ -47,40 +54,83 @@ def frontmatter_check(args, strict=None):
     return has_errors
 
 
-def frontmatter_diff(args):
-    """Diff frontmatter."""
+def _scene_filter(m):
+    """Return the outline keys a manuscript filename match `m` can have."""
+    return [
+        f"{m['chapter_num']}.{m['scene_num']}",
+        f"{m['book_num']}.{m['chapter_num']}.{m['scene_num']}",
+    ]
 
-    outline = Path(args.outline or args.config["outline"]["single"]["primary_outline_file"])
 
-    files = find_markdown_files(args.path)
-    table = build_table_from_files([outline], column="Scene")
+@timed()
+def reconcile_scenes(table, files):
+    """Join the outline `table` with the summaries of the scenes in `files`, in one pass.
 
-    # Diff summaries
+    Returns a tuple of a combined diff of every mismatched summary, the scene paths with no
+    outline beats, and the outline keys with no scene.
+    """
+    yaml_by_scene = get_yaml_by_scene(table)
+    unmatched_keys = set(yaml_by_scene[0])
+    keys_by_part = yaml_by_scene[1]
+    diffs = []
+    missing_from_outline = []
     for path in files:
         m = MANUSCRIPT_REGEX.match(os.path.basename(path))
         if not m:
             continue
-
-        outline_summary = get_yaml_from_table(
-            table,
-            filter_=[
-                f"{m['chapter_num']}.{m['scene_num']}",
-                f"{m['book_num']}.{m['chapter_num']}.{m['scene_num']}",
-            ],
+        scene_filter = _scene_filter(m)
+        outline_summary = get_scene_yaml(yaml_by_scene, scene_filter)
+        if outline_summary is None:
+            missing_from_outline.append(path)
+            outline_summary = ""
+        for part in scene_filter:
+            unmatched_keys.difference_update(keys_by_part.get(part, []))
+
+        parsed_yaml = get_markdown_file(path).parsed_yaml
+        summary = parsed_yaml.get("summary") if isinstance(parsed_yaml, dict) else None
+        scene_summary = yaml_string(summary) if summary else ""
+
+        base_filename = MD_SUFFIX_REGEX.sub("", os.path.basename(path))
+        diffs.append(
+            diff_yaml(
+                scene_summary,
+                outline_summary,
+                from_name=f"{base_filename} scene",
+                to_name=f"{base_filename} outline",
+                verbose=False,
+            )
         )
+    return "".join(diffs), missing_from_outline, sorted(unmatched_keys)
 
-        markdown_file = get_markdown_file(path)
-        scene_summary = yaml_string(markdown_file.parsed_yaml["summary"])
-
-        base_filename = re.sub(r"\.md$", "", os.path.basename(path))
-        diff = diff_yaml(
-            scene_summary,
-            outline_summary,
-            from_name=f"{base_filename} scene",
-            to_name=f"{base_filename} outline",
-            verbose=False,
-        )
-        output_diff(diff)
+
+def _get_outline_table(args):
+    """Build the scene-keyed table from `--outline` or the primary outline file."""
+    outline = Path(args.outline or args.config["outline"]["single"]["primary_outline_file"])
+    cache_dir = None if args.no_cache else get_cache_dir(args.config, "outline")
+    return build_table_from_files([outline], column="Scene", cache_dir=cache_dir)
+
+
+def frontmatter_diff(args):
+    """Diff frontmatter."""
+    diff, _, _ = reconcile_scenes(_get_outline_table(args), find_markdown_files(args.path))
+    output_diff(diff)
+
+
+def frontmatter_reconcile(args):
+    """Report the scenes missing from either the outline or the manuscript, and diff the rest."""
+    diff, missing_from_outline, missing_from_manuscript = reconcile_scenes(
+        _get_outline_table(args), find_markdown_files(args.path)
+    )
+    if missing_from_outline:
+        print("Scenes missing from the outline:")
+        print_object_one_line_per(missing_from_outline, padding="    ")
+    if missing_from_manuscript:
+        print("Outline scenes missing from the manuscript:")
+        print_object_one_line_per(missing_from_manuscript, padding="    ")
+    sys.stdout.flush()
+    output_diff(diff)
+    if diff or missing_from_outline or missing_from_manuscript:
+        sys.exit(1)
 
 
 def fix_frontmatter(old_frontmatter):
@@ -109,10 +159,8 @@ def fix_frontmatter(old_frontmatter):
 def frontmatter_update(args):
     """Overwrite frontmatter with formatted output after replacing the summary."""
 
-    outline = Path(args.outline or args.config["outline"]["single"]["primary_outline_file"])
     files = find_markdown_files(args.path)
-
-    table = build_table_from_files([outline], column="Scene")
+    yaml_by_scene = get_yaml_by_scene(_get_outline_table(args))
 
     # Update summaries
     for path in files:
@@ -120,15 +168,7 @@ def frontmatter_update(args):
         if not m:
             continue
 
-        outline_summary = yaml.safe_load(
-            get_yaml_from_table(
-                table,
-                filter_=[
-                    f"{m['chapter_num']}.{m['scene_num']}",
-                    f"{m['book_num']}.{m['chapter_num']}.{m['scene_num']}",
-                ],
-            )
-        )
+        outline_summary = load_yaml(get_scene_yaml(yaml_by_scene, _scene_filter(m)) or "")
 
         markdown_file = get_markdown_file(path)
         if args.fix:
@@ -137,7 +177,7 @@ def frontmatter_update(args):
         new_yaml = yaml_string(markdown_file.parsed_yaml).rstrip()
 
         if args.noop:
-            base_filename = re.sub(r"\.md$", "", os.path.basename(path))
+            base_filename = MD_SUFFIX_REGEX.sub("", os.path.basename(path))
             diff = diff_yaml(
                 markdown_file.yaml,
                 new_yaml,
@@ -151,22 +191,61 @@ def frontmatter_update(args):
     frontmatter_check(args)
 
 
+def _get_query_index(args, files):
+    """Load the query index, bring it up to date with `files`, and save it if it changed.
+
+    Returns the index and the set of index keys for `files`.
+    """
+    index_path = get_cache_dir(args.config, "query") / "index.json"
+    index = load_query_index(index_path)
+    keys, changed = update_query_index(index, files)
+    if changed:
+        save_query_index(index_path, index)
+    return index, keys
+
+
+def frontmatter_where(args, files, index, keys):
+    """Print the files matching the `--where` query."""
+    try:
+        tree = parse_query(args.where)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+    key_to_path = {os.path.abspath(path): path for path in files}
+    matches = sorted(key_to_path[key] for key in run_query(index, tree, keys))
+    if not args.verbose:
+        print_object_one_line_per(matches)
+        return
+    fields = [args.field] if args.field else query_fields(tree)
+    paths_to_values = {}
+    for path in matches:
+        values = index["files"][os.path.abspath(path)]["fields"]
+        paths_to_values[path] = [
+            f"{field}: {', '.join(values[field])}" for field in fields if field in values
+        ]
+    print_object_one_line_per(paths_to_values)
+
+
 def frontmatter_query(args):
     """Query frontmatter."""
+    if not (args.field or args.where):
+        print("Specify --field and/or --where!", file=sys.stderr)
+        sys.exit(1)
     files = find_markdown_files(args.path)
+    index, keys = _get_query_index(args, files)
+    if args.where:
+        frontmatter_where(args, files, index, keys)
+        sys.exit()
 
     paths_to_values = {}
     values_to_paths = {}
-    # Diff summaries
     for path in files:
-        markdown_file = get_markdown_file(path)
-        if not isinstance(markdown_file.parsed_yaml, dict):
+        fields = index["files"][os.path.abspath(path)]["fields"]
+        if fields is None:
             if args.verbose:
                 print(f"{path} doesn't have yaml; skipping.")
             continue
-        values = markdown_file.parsed_yaml.get(args.field, [])
-        if isinstance(values, str):
-            values = [values]
+        values = fields.get(args.field, [])
         if args.grep and args.grep not in values:
             continue
         paths_to_values[path] = values
@@ -195,6 +274,7 @@ def frontmatter_parser():
     config, remaining_args = get_config()
     parser = argparse.ArgumentParser(prog="frontmatter")
     parser.add_argument("-s", "--strict", action="store_true")
+    add_profile_parser_args(parser)
     add_config_parser_args(
         parser
     )  # these args will be swallowed by the config_parser, but add for --help
@@ -215,16 +295,37 @@ def frontmatter_parser():
     )
     diff_parser.set_defaults(require_book_num=True)
     diff_parser.add_argument("-o", "--outline")
+    diff_parser.add_argument(
+        "--no-cache", action="store_true", help="Don't read or write the parsed outline cache."
+    )
     diff_parser.add_argument("path", nargs="+")
     diff_parser.set_defaults(func=frontmatter_diff)
 
+    # frontmatter reconcile
+    reconcile_parser = subparsers.add_parser(
+        "reconcile",
+        help="Report the scenes missing from the outline or the manuscript, and any summary diffs.",
+    )
+    reconcile_parser.set_defaults(require_book_num=True)
+    reconcile_parser.add_argument("-o", "--outline")
+    reconcile_parser.add_argument(
+        "--no-cache", action="store_true", help="Don't read or write the parsed outline cache."
+    )
+    reconcile_parser.add_argument("path", nargs="+")
+    reconcile_parser.set_defaults(func=frontmatter_reconcile)
+
     # frontmatter query
     query_parser = subparsers.add_parser(
         "query", help="Show all values of the given field in the given path."
     )
     query_parser.set_defaults(require_book_num=True)
-    query_parser.add_argument("-f", "--field", required=True)
+    query_parser.add_argument("-f", "--field")
     query_parser.add_argument("-g", "--grep")
+    query_parser.add_argument(
+        "-w",
+        "--where",
+        help="Print the files matching a query, e.g. `characters=Alice and not pov^=Al`.",
+    )
     query_parser.add_argument(
         "-a",
         "--aggregate",
@@ -243,6 +344,9 @@ def frontmatter_parser():
     update_parser.add_argument("-f", "--fix", action="store_true")
     update_parser.add_argument("-n", "--noop", action="store_true")
     update_parser.add_argument("-o", "--outline")
+    update_parser.add_argument(
+        "--no-cache", action="store_true", help="Don't read or write the parsed outline cache."
+    )
     update_parser.add_argument("path", nargs="+")
     update_parser.set_defaults(func=frontmatter_update)
 
@@ -264,4 +368,4 @@ def frontmatter_tool():
     if not hasattr(args, "func"):
         print(parser.format_help())
         raise SystemExit(1)
-    args.func(args)
+    run_func(args)
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""Lint markdown files.
+
+Each rule is registered with `line_rule` or `file_rule`. `lint_file` reads a file once, runs every
+rule in a single pass, and optionally applies the fixes in the same pass; `lint_files` lints many
+files in parallel.
+"""
+
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import quote
+
+from git import Repo
+
+from markdown_novel_tools.constants import LIST_ITEM_REGEX, THEMATIC_BREAK_REGEX, TRIPLE_LINK_REGEX
+from markdown_novel_tools.frontmatter import fix_frontmatter
+from markdown_novel_tools.mdfile import (
+    FRONTMATTER_VALIDATOR,
+    get_markdown_file,
+    write_markdown_file,
+)
+from markdown_novel_tools.profiling import count, timed
+from markdown_novel_tools.utils import write_to_file
+from markdown_novel_tools.yaml_backend import YAMLError, load_yaml
+
+Diagnostic = namedtuple("Diagnostic", ("path", "line", "column", "rule", "message"))
+
+# The result of a line rule. `fix` is the fixed line, or None to remove the line.
+Finding = namedtuple("Finding", ("column", "message", "fix"))
+
+Rule = namedtuple("Rule", ("rule_id", "func", "description", "manuscript_only"))
+
+LINE_RULES = {}
+FILE_RULES = {}
+
+# Don't start worker processes for fewer files than this.
+MIN_PARALLEL_FILES = 32
+
+OUTPUT_FORMATS = ("text", "json", "sarif")
+
+# Bump this when a rule changes what it reports, to drop the cached diagnostics.
+LINT_CACHE_VERSION = 2
+
+
+# Rule registry {{{1
+def _register(registry, rule_id, manuscript_only):
+    """Return a decorator registering a rule in `registry`."""
+
+    def decorator(func):
+        if rule_id in LINE_RULES or rule_id in FILE_RULES:
+            raise ValueError(f"Duplicate lint rule {rule_id}!")
+        registry[rule_id] = Rule(rule_id, func, func.__doc__.strip(), manuscript_only)
+        return func
+
+    return decorator
+
+
+def line_rule(rule_id, manuscript_only=False):
+    """Register a rule run on each body line.
+
+    The rule takes the line and returns None or a `Finding`.
+    """
+    return _register(LINE_RULES, rule_id, manuscript_only)
+
+
+def file_rule(rule_id, manuscript_only=False):
+    """Register a rule run once per file.
+
+    The rule takes the MarkdownFile and the fix flag, and returns a list of `(line, column,
+    message)` tuples for the problems that remain.
+    """
+    return _register(FILE_RULES, rule_id, manuscript_only)
+
+
+# Rules {{{1
+@line_rule("triple-link")
+def _triple_link(line):
+    """Wikilinks open with `[[`, not `[[[`."""
+    column = line.find("[[[")
+    if column == -1:
+        return None
+    return Finding(column + 1, "found [[[", TRIPLE_LINK_REGEX.sub("[[", line))
+
+
+@line_rule("list-item", manuscript_only=True)
+def _list_item(line):
+    """Manuscript lines aren't `-` list items; horizontal rules and `--` dashes are fine."""
+    m = LIST_ITEM_REGEX.match(line)
+    if m is None or THEMATIC_BREAK_REGEX.match(line):
+        return None
+    return Finding(m.end(), "starts with -", None)
+
+
+@file_rule("frontmatter-schema", manuscript_only=True)
+def _frontmatter_schema(markdown_file, fix):
+    """Manuscript frontmatter matches the frontmatter schema."""
+    try:
+        parsed_yaml = load_yaml(markdown_file.yaml)
+    except YAMLError as e:
+        mark = getattr(e, "problem_mark", None)
+        if mark is None:
+            return [(1, 1, f"yaml is broken: {e}")]
+        return [(mark.line + 2, mark.column + 1, f"yaml is broken: {getattr(e, 'problem', e)}")]
+    if not isinstance(parsed_yaml, dict):
+        return [(1, 1, "frontmatter is missing or isn't a mapping")]
+    if fix:
+        parsed_yaml = fix_frontmatter(parsed_yaml)
+    markdown_file.parsed_yaml = parsed_yaml
+    if FRONTMATTER_VALIDATOR.validate(parsed_yaml):
+        return []
+    return [(1, 1, f"{field}: {errors}") for field, errors in FRONTMATTER_VALIDATOR.errors.items()]
+
+
+# Engine {{{1
+@timed()
+def lint_file(path, fix=False):
+    """Lint the file at `path`, fixing what we can if `fix`.
+
+    Returns a list of Diagnostics for the problems that remain.
+    """
+    path = str(path)
+    with open(path, encoding="utf-8") as fh:
+        contents = fh.read()
+    markdown_file = get_markdown_file(path, contents)
+    is_manuscript = markdown_file.is_manuscript
+    diagnostics = []
+
+    for rule in FILE_RULES.values():
+        if rule.manuscript_only and not is_manuscript:
+            continue
+        for line_num, column, message in rule.func(markdown_file, fix):
+            diagnostics.append(Diagnostic(path, line_num, column, rule.rule_id, message))
+
+    line_rules = [rule for rule in LINE_RULES.values() if is_manuscript or not rule.manuscript_only]
+    body = markdown_file.body
+    frontmatter = contents[: len(contents) - len(body)]
+    # Report file line numbers, not body line numbers.
+    offset = frontmatter.count("\n")
+    fixed_lines = []
+    body_changed = False
+    for line_num, line in enumerate(body.splitlines(), start=offset + 1):
+        for rule in line_rules:
+            finding = rule.func(line)
+            if finding is None:
+                continue
+            if not fix:
+                diagnostics.append(
+                    Diagnostic(path, line_num, finding.column, rule.rule_id, finding.message)
+                )
+                continue
+            body_changed = True
+            line = finding.fix
+            if line is None:
+                break
+        if line is not None:
+            fixed_lines.append(line)
+
+    if fix and (body_changed or is_manuscript):
+        if body_changed:
+            markdown_file.body = "".join(f"{line}\n" for line in fixed_lines)
+        if offset == 0:
+            write_to_file(path, markdown_file.body)
+        elif isinstance(markdown_file.parsed_yaml, dict):
+            write_markdown_file(path, markdown_file)
+        else:
+            # We can't rewrite frontmatter that isn't a mapping, so keep it as is.
+            write_to_file(path, f"{frontmatter}{markdown_file.body}")
+    diagnostics.sort(key=lambda d: (d.line, d.column))
+    return diagnostics
+
+
+def _lint_file_star(item):
+    """Unpack the arguments to `lint_file` for `Executor.map`."""
+    return lint_file(*item)
+
+
+def _file_stamp(path):
+    """Return the `[mtime_ns, size]` of `path`, to tell whether it changed."""
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+@timed()
+def lint_files(paths, fix=False, jobs=None, cache=None):
+    """Lint `paths`, in parallel if there are enough of them.
+
+    `jobs` is the number of worker processes; it defaults to the number of CPUs, and 1 lints in
+    this process. If `cache` is a dict from `load_lint_cache`, reuse the diagnostics of any file
+    that hasn't changed since it was cached, and cache the rest. Returns a list of Diagnostics, in
+    `paths` order.
+    """
+    diagnostics = {}
+    stale = []
+    for path in paths:
+        if cache is not None and not fix:
+            entry = cache.get(os.path.abspath(path))
+            if entry is not None and entry["stamp"] == _file_stamp(path):
+                diagnostics[path] = [Diagnostic(str(path), *item) for item in entry["diagnostics"]]
+                continue
+        stale.append(path)
+    count("lint cache hits", len(paths) - len(stale))
+
+    items = [(path, fix) for path in stale]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(items) < MIN_PARALLEL_FILES:
+        results = list(map(_lint_file_star, items))
+    else:
+        chunksize = max(1, len(items) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_lint_file_star, items, chunksize=chunksize))
+
+    for path, result in zip(stale, results):
+        diagnostics[path] = result
+        if cache is not None:
+            cache[os.path.abspath(path)] = {
+                "stamp": _file_stamp(path),
+                "diagnostics": [list(diagnostic[1:]) for diagnostic in result],
+            }
+    return [diagnostic for path in paths for diagnostic in diagnostics[path]]
+
+
+# Cache {{{1
+def _cache_version():
+    """Return the cache version: the cache format, plus the rule ids."""
+    return [LINT_CACHE_VERSION, sorted([*FILE_RULES, *LINE_RULES])]
+
+
+def load_lint_cache(path):
+    """Return the cached diagnostics at `path`, keyed by absolute file path.
+
+    Return an empty cache if it's missing, broken, or from a different set of rules.
+    """
+    try:
+        with open(path, encoding="utf-8") as fh:
+            contents = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(contents, dict) or contents.get("version") != _cache_version():
+        return {}
+    return contents.get("files", {})
+
+
+def save_lint_cache(path, cache):
+    """Write `cache` to `path`, dropping the entries for files that no longer exist."""
+    files = {key: value for key, value in cache.items() if os.path.exists(key)}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump({"version": _cache_version(), "files": files}, fh)
+    os.replace(tmp_path, path)
+
+
+# Changed files {{{1
+def _git_status_paths(repo):
+    """Return the modified, added, renamed and untracked paths, from a single `git status`."""
+    entries = iter(repo.git.status("--porcelain", "-z", "--untracked-files=all").split("\0"))
+    paths = []
+    for entry in entries:
+        if not entry:
+            continue
+        status, path = entry[:2], entry[3:]
+        if status[0] in "RC":
+            # The original path of a rename or copy follows the new one.
+            next(entries, None)
+        if "D" not in status:
+            paths.append(path)
+    return paths
+
+
+def _is_lintable(path, roots):
+    """Whether `find_markdown_files(roots)` would find `path`."""
+    if path.suffix != ".md" or not path.is_file():
+        return False
+    for root in roots:
+        if root == path:
+            return True
+        if root in path.parents:
+            parts = path.relative_to(root).parts
+            return not any(part.startswith("_") or part in (".git", ".obsidian") for part in parts)
+    return False
+
+
+@timed()
+def get_changed_files(paths, since=None):
+    """Return the markdown files under `paths` that changed.
+
+    These are the modified, added and untracked files in `git status`, plus, if `since` is set,
+    every file changed since the revision `since`.
+    """
+    repo = Repo(Path("."), search_parent_directories=True)
+    git_root = Path(repo.working_tree_dir).resolve()
+    changed = set(_git_status_paths(repo))
+    if since is not None:
+        diff = repo.git.diff("--name-only", "-z", "--diff-filter=d", since)
+        changed.update(path for path in diff.split("\0") if path)
+    roots = [Path(path).resolve() for path in paths]
+    files = []
+    for relpath in sorted(changed):
+        path = git_root / relpath
+        if _is_lintable(path, roots):
+            files.append(os.path.relpath(path))
+    return files
+
+
+# Output {{{1
+def _sarif_artifact_location(path):
+    """Return the SARIF artifactLocation of `path`.
+
+    Relative paths are relative URIs against `%SRCROOT%`, the current directory.
+    """
+    path = Path(path)
+    if path.is_absolute():
+        return {"uri": path.as_uri()}
+    return {"uri": quote(path.as_posix()), "uriBaseId": "%SRCROOT%"}
+
+
+def _sarif(diagnostics):
+    """Return the diagnostics as a SARIF 2.1.0 log."""
+    rules = {**FILE_RULES, **LINE_RULES}
+    return {
+        "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+        "version": "2.1.0",
+        "runs": [
+            {
+                "tool": {
+                    "driver": {
+                        "name": "markdown-novel-tools",
+                        "rules": [
+                            {"id": rule.rule_id, "shortDescription": {"text": rule.description}}
+                            for rule in rules.values()
+                        ],
+                    }
+                },
+                "originalUriBaseIds": {"%SRCROOT%": {"uri": f"{Path.cwd().as_uri()}/"}},
+                "results": [
+                    {
+                        "ruleId": diagnostic.rule,
+                        "level": "error",
+                        "message": {"text": diagnostic.message},
+                        "locations": [
+                            {
+                                "physicalLocation": {
+                                    "artifactLocation": _sarif_artifact_location(diagnostic.path),
+                                    "region": {
+                                        "startLine": diagnostic.line,
+                                        "startColumn": diagnostic.column,
+                                    },
+                                }
+                            }
+                        ],
+                    }
+                    for diagnostic in diagnostics
+                ],
+            }
+        ],
+    }
+
+
+def format_diagnostics(diagnostics, format_="text"):
+    """Return the diagnostics as a string in `format_`: text, json, or sarif."""
+    if format_ == "json":
+        return json.dumps([diagnostic._asdict() for diagnostic in diagnostics], indent=2)
+    if format_ == "sarif":
+        return json.dumps(_sarif(diagnostics), indent=2)
+    return "\n".join(f"{d.path}:{d.line}:{d.column}: {d.rule} {d.message}" for d in diagnostics)
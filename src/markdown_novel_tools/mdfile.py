@@ -2,18 +2,29 @@
 """Deal with individual markdown files."""
 
 import os
-import re
 import time
-from copy import deepcopy
+from collections import Counter
 from pathlib import Path
-from pprint import pprint
 
-import yaml
 from cerberus import Validator
 from git import InvalidGitRepositoryError, Repo
 
-from markdown_novel_tools.constants import ALPHANUM_REGEX, DEBUG, MANUSCRIPT_REGEX
-from markdown_novel_tools.utils import local_time, round_to_one_decimal, unwikilink, yaml_string
+from markdown_novel_tools.constants import (
+    DEBUG,
+    FRONTMATTER_REGEX,
+    MANUSCRIPT_REGEX,
+    MD_SUFFIX_REGEX,
+    SYMBOL_WORD_REGEX,
+)
+from markdown_novel_tools.profiling import PROFILER, count, timed
+from markdown_novel_tools.utils import (
+    count_words,
+    local_time,
+    round_to_one_decimal,
+    unwikilink,
+    yaml_string,
+)
+from markdown_novel_tools.yaml_backend import YAMLError, load_yaml
 
 # Schema {{{1
 FRONTMATTER_SCHEMA = {
@@ -40,132 +51,277 @@ FRONTMATTER_VALIDATOR = Validator(FRONTMATTER_SCHEMA)
 
 
 # MarkdownFile {{{1
-class MarkdownFile:
-    """Object for a markdown file."""
+_UNPARSED = object()
+
 
-    manuscript_info = None
-    yaml = ""
-    parsed_yaml = None
-    error = None
+class MarkdownFile:
+    """Object for a markdown file.
+
+    Everything past the path is computed lazily and memoized, so each caller only pays for what it
+    reads: `yaml` and `body` split the contents, `parsed_yaml` parses the frontmatter, and
+    `manuscript_info` adds the word counts.
+    """
+
+    __slots__ = (
+        "path",
+        "hack_yaml",
+        "_contents",
+        "_yaml",
+        "_body",
+        "_parsed_yaml",
+        "_error",
+        "_word_count",
+        "_manuscript_info",
+    )
 
     def __init__(self, path, contents, hack_yaml):
         self.path = Path(path)
-        self.manuscript_info = {
-            "manuscript_words": 0,
-            "total_words": 0,
-            "is_manuscript": "manuscript" in self.path.parts,
-        }
-        self.manuscript_info["title"] = re.sub(r"""\.md$""", "", os.path.basename(path))
         self.hack_yaml = hack_yaml
+        self._contents = contents
+        self._yaml = None
+        self._body = None
+        self._parsed_yaml = _UNPARSED
+        self._error = None
+        self._word_count = None
+        self._manuscript_info = None
+
+    def _split(self):
+        """Split the contents into frontmatter and body, once."""
+        if self._body is None:
+            self._yaml, self._body = get_frontmatter_and_body(
+                self._contents, hack_yaml=self.hack_yaml
+            )
+            self._contents = None
 
-        if self.manuscript_info["is_manuscript"]:
-            m = MANUSCRIPT_REGEX.match(self.manuscript_info["title"])
-            if m:
-                for attr in ("book_num", "chapter_num", "scene_num"):
-                    self.manuscript_info[attr] = m[attr]
+    @property
+    def title(self):
+        """The filename without the `.md` suffix."""
+        return MD_SUFFIX_REGEX.sub("", self.path.name)
 
-        if DEBUG:
-            print(f"{path}: ", end="")
+    @property
+    def is_manuscript(self):
+        """Whether this file lives in the manuscript."""
+        return "manuscript" in self.path.parts
 
-        self.yaml, self.body = get_frontmatter_and_body(contents, hack_yaml=self.hack_yaml)
-        self.count_words(self.body)
-        self.parse_yaml()
+    @property
+    def yaml(self):
+        """The frontmatter text."""
+        self._split()
+        return self._yaml
 
-        if DEBUG:
-            pprint(vars(self))
+    @property
+    def body(self):
+        """The body text, after the frontmatter."""
+        self._split()
+        return self._body
+
+    @body.setter
+    def body(self, body):
+        self._split()
+        self._body = body
+        self._word_count = None
+        self._manuscript_info = None
 
-    def count_words(self, body):
-        """Count the words in a markdown file, skipping the header and any
-        symbol-only lines.
+    @property
+    def parsed_yaml(self):
+        """The parsed frontmatter, or None if it's broken."""
+        if self._parsed_yaml is _UNPARSED:
+            self.parse_yaml()
+        return self._parsed_yaml
 
-        """
-        for line in body.splitlines():
-            for word in line.split():
-                if ALPHANUM_REGEX.search(word):
-                    self.manuscript_info["total_words"] += 1
-                    if self.manuscript_info["is_manuscript"]:
-                        self.manuscript_info["manuscript_words"] += 1
-                elif DEBUG:
-                    print(f"skipping {word}")
+    @parsed_yaml.setter
+    def parsed_yaml(self, parsed_yaml):
+        self._parsed_yaml = parsed_yaml
+        self._manuscript_info = None
+
+    @property
+    def error(self):
+        """The yaml parsing error, if any."""
+        if self._parsed_yaml is _UNPARSED:
+            self.parse_yaml()
+        return self._error
+
+    @property
+    def word_count(self):
+        """Count the words in the body, skipping any symbol-only words."""
+        if self._word_count is None:
+            self._word_count = count_words(self.body)
+            if DEBUG:
+                for word in SYMBOL_WORD_REGEX.findall(f" {self.body}"):
+                    print(f"skipping {word.strip()}")
+        return self._word_count
+
+    @property
+    def manuscript_info(self):
+        """The word counts, plus the book, chapter, scene, pov and characters of a scene."""
+        if self._manuscript_info is None:
+            self._manuscript_info = self._get_manuscript_info()
+        return self._manuscript_info
+
+    def _get_manuscript_info(self):
+        """Build the manuscript_info dict."""
+        is_manuscript = self.is_manuscript
+        manuscript_info = {
+            "manuscript_words": self.word_count if is_manuscript else 0,
+            "total_words": self.word_count,
+            "is_manuscript": is_manuscript,
+            "title": self.title,
+        }
+        if is_manuscript:
+            m = MANUSCRIPT_REGEX.match(manuscript_info["title"])
+            if m:
+                for attr in ("book_num", "chapter_num", "scene_num"):
+                    manuscript_info[attr] = m[attr]
+        parsed_yaml = self.parsed_yaml
+        if manuscript_info.get("book_num") and isinstance(parsed_yaml, dict):
+            if parsed_yaml.get("pov"):
+                manuscript_info["pov"] = parsed_yaml["pov"]
+            characters = parsed_yaml.get("characters")
+            if characters:
+                manuscript_info["characters"] = list(characters)
+        return manuscript_info
 
     def parse_yaml(self):
         """Parse the yaml of a scene."""
+        self._parsed_yaml = None
         try:
-            self.parsed_yaml = yaml.safe_load(self.yaml)
-        except yaml.YAMLError as e:
+            self._parsed_yaml = load_yaml(self.yaml)
+        except YAMLError as e:
             print(str(e))
-            self.error = f"### {self.path} yaml is broken.\n{str(e)}\n"
-            return
-        if self.manuscript_info.get("book_num"):
-            if self.parsed_yaml.get("pov"):
-                self.manuscript_info["pov"] = self.parsed_yaml["pov"]
-            for char in self.parsed_yaml.get("characters", []):
-                if self.manuscript_info.get("characters") is None:
-                    self.manuscript_info["characters"] = []
-                self.manuscript_info["characters"].append(char)
+            self._error = f"### {self.path} yaml is broken.\n{str(e)}\n"
 
 
 # Book {{{1
+def _decrement(counter, key):
+    """Decrement `counter[key]`, dropping the key when it reaches zero."""
+    counter[key] -= 1
+    if counter[key] <= 0:
+        del counter[key]
+
+
 class Book:
-    """Object for a book, specified by the first digit in the manuscript file's name."""
+    """Object for a book, specified by the first digit in the manuscript file's name.
 
-    manuscript_words = 0
-    total_words = 0
-    chapters = {}
-    scenes = {}
-    povs = {}
+    Each scene's contribution is remembered, so scenes can be added and removed in O(1) as files
+    change, without rebuilding the rest of the book.
+    """
 
     def __init__(self, book_num):
         self.book_num = book_num
+        self.manuscript_words = 0
+        self.total_words = 0
+        self.chapters = {}
+        self.scenes = {}
+        self.povs = {}
+        # title -> (chapter_num, pov)
+        self._scene_keys = {}
+        # chapter_num -> number of scenes
+        self._chapter_scenes = Counter()
+        # chapter_num -> Counter of characters
+        self._chapter_characters = {}
 
     def add_scene(self, scene):
-        """Add a scene to the book, calculating the stats."""
-        self.scenes[scene.manuscript_info["title"]] = {
-            "manuscript words": scene.manuscript_info["manuscript_words"],
-            "total words": scene.manuscript_info["total_words"],
-        }
+        """Add a scene to the book, calculating the stats.
+
+        If a scene with the same title was already added, it is replaced.
+        """
+        title = scene.manuscript_info["title"]
+        if title in self.scenes:
+            self.remove_scene(title)
+        manuscript_words = scene.manuscript_info["manuscript_words"]
+        total_words = scene.manuscript_info["total_words"]
         chapter_num = scene.manuscript_info["chapter_num"]
-        self.chapters.setdefault(
+        pov = scene.manuscript_info.get("pov")
+        characters = scene.manuscript_info.get("characters")
+
+        self.scenes[title] = {
+            "manuscript words": manuscript_words,
+            "total words": total_words,
+        }
+        if characters:
+            self.scenes[title]["characters"] = characters
+        self._scene_keys[title] = (chapter_num, pov)
+
+        chapter = self.chapters.setdefault(
             chapter_num,
             {
                 "manuscript words": 0,
                 "total words": 0,
             },
         )
-        self.chapters[chapter_num]["manuscript words"] += scene.manuscript_info["manuscript_words"]
-        self.chapters[chapter_num]["total words"] += scene.manuscript_info["total_words"]
-        self.manuscript_words += scene.manuscript_info["manuscript_words"]
-        self.total_words += scene.manuscript_info["total_words"]
-        pov = scene.manuscript_info.get("pov")
+        chapter["manuscript words"] += manuscript_words
+        chapter["total words"] += total_words
+        self._chapter_scenes[chapter_num] += 1
+        if characters:
+            self._chapter_characters.setdefault(chapter_num, Counter()).update(characters)
+
+        self.manuscript_words += manuscript_words
+        self.total_words += total_words
+
         if pov:
-            self.povs.setdefault(
+            pov_stats = self.povs.setdefault(
                 pov,
                 {
                     "scenes": 0,
-                    "chapters": [],
+                    "chapters": Counter(),
                     "populated scenes": 0,
-                    "populated chapters": [],
+                    "populated chapters": Counter(),
                     "manuscript words": 0,
                     "total words": 0,
                 },
             )
-            self.povs[pov]["scenes"] += 1
-            if chapter_num not in self.povs[pov]["chapters"]:
-                self.povs[pov]["chapters"].append(chapter_num)
-            self.povs[pov]["manuscript words"] += scene.manuscript_info["manuscript_words"]
-            self.povs[pov]["total words"] += scene.manuscript_info["total_words"]
-            if scene.manuscript_info["manuscript_words"]:
-                self.povs[pov]["populated scenes"] += 1
-                if chapter_num not in self.povs[pov]["populated chapters"]:
-                    self.povs[pov]["populated chapters"].append(chapter_num)
-        characters = scene.manuscript_info.get("characters")
+            pov_stats["scenes"] += 1
+            pov_stats["chapters"][chapter_num] += 1
+            pov_stats["manuscript words"] += manuscript_words
+            pov_stats["total words"] += total_words
+            if manuscript_words:
+                pov_stats["populated scenes"] += 1
+                pov_stats["populated chapters"][chapter_num] += 1
+
+    def remove_scene(self, title):
+        """Remove a previously added scene from the book, undoing its stats."""
+        scene = self.scenes.pop(title)
+        chapter_num, pov = self._scene_keys.pop(title)
+        manuscript_words = scene["manuscript words"]
+        total_words = scene["total words"]
+        characters = scene.get("characters")
+
+        chapter = self.chapters[chapter_num]
+        chapter["manuscript words"] -= manuscript_words
+        chapter["total words"] -= total_words
         if characters:
-            self.scenes[scene.manuscript_info["title"]]["characters"] = characters
-            # Chapter chars; make sure this is unique
-            chap = self.chapters[chapter_num]
-            chap.setdefault("characters", [])
-            chap["characters"].extend(characters)
-            chap["characters"] = list(set(chap["characters"]))
+            for char in characters:
+                _decrement(self._chapter_characters[chapter_num], char)
+        _decrement(self._chapter_scenes, chapter_num)
+        if chapter_num not in self._chapter_scenes:
+            del self.chapters[chapter_num]
+            self._chapter_characters.pop(chapter_num, None)
+
+        self.manuscript_words -= manuscript_words
+        self.total_words -= total_words
+
+        if pov:
+            pov_stats = self.povs[pov]
+            pov_stats["scenes"] -= 1
+            _decrement(pov_stats["chapters"], chapter_num)
+            pov_stats["manuscript words"] -= manuscript_words
+            pov_stats["total words"] -= total_words
+            if manuscript_words:
+                pov_stats["populated scenes"] -= 1
+                _decrement(pov_stats["populated chapters"], chapter_num)
+            if not pov_stats["scenes"]:
+                del self.povs[pov]
+
+    @property
+    def chapters_with_characters(self):
+        """Get the chapters, with the sorted unique characters in each."""
+        chapters = {}
+        for chapter_num, chapter in self.chapters.items():
+            chapters[chapter_num] = dict(chapter)
+            characters = self._chapter_characters.get(chapter_num)
+            if characters:
+                chapters[chapter_num]["characters"] = sorted(characters)
+        return chapters
 
     @property
     def scene_average(self):
@@ -218,8 +374,12 @@ class Book:
     @property
     def povs_with_average(self):
         """Get the povs with the chapter and scene average words."""
-        povs = deepcopy(self.povs)
-        for _, stats in povs.items():
+        povs = {}
+        for pov, pov_stats in self.povs.items():
+            stats = dict(pov_stats)
+            stats["chapters"] = sorted(pov_stats["chapters"])
+            stats["populated chapters"] = sorted(pov_stats["populated chapters"])
+            povs[pov] = stats
             stats["num_chapters"] = len(stats["chapters"])
             num_populated_chapters = len(stats["populated chapters"])
             if stats["populated scenes"]:
@@ -246,18 +406,40 @@ class Book:
             "total_words": self.total_words,
             "scene_average": self.scene_average,
             "chapter average": self.chapter_average,
-            "chapters": self.chapters,
+            "chapters": self.chapters_with_characters,
             "scenes": self.scenes,
             "povs": self.povs_with_average,
         }
 
 
 # Functions {{{1
-def get_frontmatter_and_body(contents, hack_yaml=False):
-    """Get the frontmatter and body of a markdown file."""
+def get_frontmatter_and_body(contents, hack_yaml=False, legacy=False):
+    """Get the frontmatter and body of a markdown file.
+
+    Only a frontmatter block at the very start of the file counts, so horizontal rules in the body
+    stay in the body. Both are slices of `contents`.
+
+    If `legacy`, every `---` line toggles in and out of the frontmatter, like we used to.
+    """
+    if legacy:
+        return _get_legacy_frontmatter_and_body(contents, hack_yaml=hack_yaml)
+    m = FRONTMATTER_REGEX.match(contents)
+    if m:
+        frontmatter = m["frontmatter"] or ""
+        body = contents[m.end() :]
+    else:
+        frontmatter = ""
+        body = contents
+    if hack_yaml:
+        frontmatter = unwikilink(frontmatter)
+    return frontmatter, body
+
+
+def _get_legacy_frontmatter_and_body(contents, hack_yaml=False):
+    """Get the frontmatter and body, toggling the frontmatter on every `---` line."""
     in_comment = False
-    frontmatter = ""
-    body = ""
+    frontmatter = []
+    body = []
 
     for line in contents.splitlines():
         if line == "---":
@@ -265,19 +447,22 @@ def get_frontmatter_and_body(contents, hack_yaml=False):
             continue
         if in_comment:
             if hack_yaml:
-                frontmatter = f"{frontmatter}{unwikilink(line)}\n"
-            else:
-                frontmatter = f"{frontmatter}{line}\n"
+                line = unwikilink(line)
+            frontmatter.append(f"{line}\n")
         else:
-            body = f"{body}{line}\n"
-    return frontmatter, body
+            body.append(f"{line}\n")
+    return "".join(frontmatter), "".join(body)
 
 
+@timed()
 def get_markdown_file(path, contents=None, hack_yaml=False):
     """Get the markdown file"""
     if contents is None:
         with open(path, encoding="utf-8") as fh:
             contents = fh.read()
+        if PROFILER.enabled:
+            count("files read")
+            count("bytes read", os.path.getsize(path))
     return MarkdownFile(path, contents, hack_yaml)
 
 
@@ -317,6 +502,7 @@ def init_books_stats():
     return books, stats
 
 
+@timed()
 def walk_repo_dir(config):
     """Walk the current directory to find the books, stats, and errors."""
     books, stats = init_books_stats()
@@ -335,6 +521,9 @@ def walk_repo_dir(config):
                 path = os.path.join(root, file_)
                 with open(path, encoding="utf-8") as fh:
                     contents = fh.read()
+                if PROFILER.enabled:
+                    count("files read")
+                    count("bytes read", os.path.getsize(path))
                 error = update_stats(config, path, contents, books, stats)
                 if error:
                     errors += error
@@ -347,6 +536,7 @@ def walk_repo_dir(config):
     return books, stats, errors
 
 
+@timed()
 def walk_previous_revision(config, current_stats):
     """Walk the previous day's git revision to determine how much we've changed today."""
     try:
@@ -372,6 +562,9 @@ def walk_previous_revision(config, current_stats):
     for blob in previous_commit.tree.traverse():
         if blob.name.endswith(".md"):
             contents = blob.data_stream.read().decode("utf-8")
+            if PROFILER.enabled:
+                count("files read")
+                count("bytes read", blob.size)
             update_stats(config, blob.path, contents, books, stats, hack_yaml=True)
     return f"""Previous revision: {previous_commit.hexsha}
 Today:
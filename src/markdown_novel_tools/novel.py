@@ -8,35 +8,60 @@ import pprint
 import re
 import shutil
 import sys
-from copy import deepcopy
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from copy import copy, deepcopy
 from glob import glob
 from pathlib import Path
+from tempfile import TemporaryDirectory
 
-from git import Repo
+from git import GitCommandError, InvalidGitRepositoryError, Repo
 
 from markdown_novel_tools.config import (
     add_config_parser_args,
+    get_cache_dir,
     get_config,
     get_css_path,
     get_markdown_template_choices,
     get_new_config_val,
 )
-from markdown_novel_tools.constants import BEATS_REGEX, LINKS_REGEX, QUESTIONS_REGEX
+from markdown_novel_tools.constants import (
+    BEATS_REGEX,
+    CONVERT_FORMATS,
+    LINKS_REGEX,
+    QUESTIONS_REGEX,
+    SINGLE_CONVERT_FORMATS,
+)
 from markdown_novel_tools.convert import (
+    ChapterCache,
     convert_chapter,
     convert_full,
     convert_simple_pdf,
+    get_naming_context,
     get_output_basestr,
     single_markdown_to_pdf,
 )
-from markdown_novel_tools.frontmatter import fix_frontmatter, frontmatter_check
-from markdown_novel_tools.mdfile import (
-    get_markdown_file,
-    walk_previous_revision,
-    walk_repo_dir,
-    write_markdown_file,
+from markdown_novel_tools.epub import epub_needs_pandoc
+from markdown_novel_tools.lint import (
+    OUTPUT_FORMATS,
+    format_diagnostics,
+    get_changed_files,
+    lint_files,
+    load_lint_cache,
+    save_lint_cache,
+)
+from markdown_novel_tools.mdfile import get_markdown_file, walk_previous_revision, walk_repo_dir
+from markdown_novel_tools.outline import (
+    beats_helper,
+    build_table_from_files,
+    column_regex_filter,
+    get_beats,
+    merge_tables,
 )
-from markdown_novel_tools.outline import beats_helper, get_beats
+from markdown_novel_tools.outline_query import parse_where
+from markdown_novel_tools.pdf_backend import use_pdf_renderer
+from markdown_novel_tools.profiling import add_profile_parser_args, run_func, timed
 from markdown_novel_tools.repo import commits_today, replace
 from markdown_novel_tools.shunn import shunn_docx, shunn_md
 from markdown_novel_tools.utils import find_markdown_files, write_to_file
@@ -57,6 +82,14 @@ def novel_beats(args):
         print("Specify column with `--column` when filtering!", file=sys.stderr)
         sys.exit(1)
 
+    where = None
+    if args.where:
+        try:
+            where = parse_where(args.where)
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+            sys.exit(1)
+
     stdout, stderr = beats_helper(
         args.path,
         column=args.column,
@@ -69,6 +102,10 @@ def novel_beats(args):
         stats=args.stats,
         target_table_num=args.table,
         format_=args.format,
+        stats_only=args.stats_only,
+        where=where,
+        cache_dir=None if args.no_cache else get_cache_dir(args.config, "outline"),
+        natural_sort=args.natural_sort,
     )
     if stdout:
         print(stdout, end="")
@@ -76,16 +113,42 @@ def novel_beats(args):
         print(stderr, file=sys.stderr)
 
 
-def novel_convert(args):
-    """Convert a novel to a different file format."""
-    if args.format in ("pdf", "epub", "chapter-pdf", "shunn-docx", "shunn-md", "simple-pdf"):
-        if not shutil.which("pandoc"):
-            print(f"`{args.format}` format requires `pandoc`! Exiting...", file=sys.stderr)
-            sys.exit(1)
-    if args.format == "epub":
-        if not shutil.which("magick"):
-            print(f"`{args.format}` format requires `imagemagick`! Exiting...", file=sys.stderr)
-            sys.exit(1)
+def _convert_format_list(value):
+    """Parse a comma-separated `--format` list."""
+    formats = []
+    for format_ in value.split(","):
+        format_ = format_.strip()
+        if format_ not in CONVERT_FORMATS:
+            raise argparse.ArgumentTypeError(
+                f"invalid choice: {format_!r} (choose from {', '.join(CONVERT_FORMATS)})"
+            )
+        if format_ not in formats:
+            formats.append(format_)
+    if len(formats) > 1 and set(formats) & set(SINGLE_CONVERT_FORMATS):
+        raise argparse.ArgumentTypeError(
+            f"{', '.join(SINGLE_CONVERT_FORMATS)} can't be combined with other formats"
+        )
+    return formats
+
+
+def _check_convert_requirements(format_, config):
+    """Exit if the tools `format_` needs with the engines in `config` aren't installed.
+
+    `imagemagick` is only needed if the epub cover isn't cached, so `EpubBuilder.cover` checks it.
+    """
+    if format_ in ("pdf", "chapter-pdf", "simple-pdf"):
+        needs_pandoc = not use_pdf_renderer(config)
+    elif format_ == "epub":
+        needs_pandoc = epub_needs_pandoc(config)
+    else:
+        needs_pandoc = format_ in ("shunn-docx", "shunn-md")
+    if needs_pandoc and not shutil.which("pandoc"):
+        print(f"`{format_}` format requires `pandoc`! Exiting...", file=sys.stderr)
+        sys.exit(1)
+
+
+def convert_single_format(args):
+    """Convert a novel to `args.format`."""
     if args.format == "chapter-pdf":
         convert_chapter(args, per_chapter_callback=single_markdown_to_pdf)
     elif args.format == "shunn-docx":
@@ -98,41 +161,74 @@ def novel_convert(args):
         convert_full(args)
 
 
+@timed()
+def convert_multiple_formats(args, formats):
+    """Convert a novel to several formats at once, each into its own artifact subdirectory.
+
+    The manuscript is read and converted once per distinct convert config, the output names are
+    shared, and the external renderers of each format run concurrently.
+    """
+    get_naming_context(args)
+    args.chapter_cache = ChapterCache()
+    format_args = []
+    for format_ in formats:
+        single_args = copy(args)
+        single_args.format = format_
+        single_args.artifact_dir = str(Path(args.artifact_dir) / format_)
+        format_args.append(single_args)
+    failed = []
+    with ThreadPoolExecutor(max_workers=len(formats)) as executor:
+        futures = {
+            executor.submit(convert_single_format, single_args): single_args.format
+            for single_args in format_args
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"`{futures[future]}` failed: {e}", file=sys.stderr)
+                failed.append(futures[future])
+    if failed:
+        sys.exit(1)
+
+
+def novel_convert(args):
+    """Convert a novel to a different file format, or several."""
+    formats = args.format
+    for format_ in formats:
+        _check_convert_requirements(format_, args.config)
+    if len(formats) > 1:
+        convert_multiple_formats(args, formats)
+        return
+    args.format = formats[0]
+    convert_single_format(args)
+
+
 def novel_lint(args):
-    """Get the stats for the manuscript"""
-    files = find_markdown_files(args.path)
-    errors = ""
-    exit_code = 0
-    for path in files:
-        markdown_file = get_markdown_file(path)
-        is_manuscript = markdown_file.manuscript_info["is_manuscript"]
-        line_num = 0
-        body = ""
-        for line in markdown_file.body.splitlines():
-            line_num += 1
-            if "[[[" in line:
-                if args.fix:
-                    line = re.sub(r"\[\[\[+", "[[", line)
-                else:
-                    errors = f"{errors}\n{path} line {line_num}: found [[["
-            if is_manuscript:
-                if re.match(r"^\s*-", line):
-                    if args.fix:
-                        continue
-                    else:
-                        errors = f"{errors}\n{path} line {line_num}: starts with -"
-            body = f"{body}{line}\n"
-        if args.fix:
-            if is_manuscript:
-                markdown_file.parsed_yaml = fix_frontmatter(markdown_file.parsed_yaml)
-            markdown_file.body = body
-            write_markdown_file(path, markdown_file)
-    if not args.fix:
-        exit_code = frontmatter_check(args, strict=False)
-        if errors:
-            print(errors)
-            exit_code = 1
-        sys.exit(exit_code)
+    """Lint the markdown files, in a single pass per file."""
+    paths = args.path or ["."]
+    if args.changed or args.since:
+        try:
+            files = get_changed_files(paths, since=args.since)
+        except InvalidGitRepositoryError:
+            print("`--changed` and `--since` need a git repo!", file=sys.stderr)
+            sys.exit(1)
+        except GitCommandError as e:
+            print(f"Can't get the changed files since {args.since}!\n{e}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        files = find_markdown_files(paths)
+    cache = None
+    if not args.no_cache:
+        cache_path = get_cache_dir(args.config, "lint") / "diagnostics.json"
+        cache = load_lint_cache(cache_path)
+    diagnostics = lint_files(files, fix=args.fix, jobs=args.jobs, cache=cache)
+    if cache is not None:
+        save_lint_cache(cache_path, cache)
+    if diagnostics or args.format != "text":
+        print(format_diagnostics(diagnostics, args.format))
+    if diagnostics:
+        sys.exit(1)
 
 
 def novel_links(args):
@@ -143,7 +239,7 @@ def novel_links(args):
     exit_code = 0
     for path in files:
         markdown_file = get_markdown_file(path)
-        for link in re.findall(LINKS_REGEX, markdown_file.body):
+        for link in LINKS_REGEX.findall(markdown_file.body):
             links.add(link)
     for link in sorted(links, key=str.lower):
         print(link)
@@ -162,7 +258,7 @@ def novel_new(args):
 
 def novel_outline_convert(args):
     """Convert the outline to something shareable."""
-    path = Path(config["outline"]["single"]["primary_outline_file"])
+    path = Path(args.config["outline"]["single"]["primary_outline_file"])
     if "arcs" in path.name:
         print(
             f"WARNING: If {path} is an `arcs` file, you are in danger of scrambling the beat order!",
@@ -179,39 +275,58 @@ def novel_outline_convert(args):
         parent = path.parent
 
     parent.mkdir(parents=True, exist_ok=True)
+    cache_dir = None if args.no_cache else get_cache_dir(args.config, "outline")
 
-    # Arc
-    contents, stats = beats_helper(
-        path,
-        column="Arc",
-        multi_table_output=True,
-        split_columns=["Arc", "Beat"],
-        stats=True,
-        format_="html",
-        beats_type="arcs",
-    )
-    write_to_file(parent / f"{output_basestr}-arcs.html", contents)
-
-    # Scene
-    contents, stats = beats_helper(
-        path,
-        column="Scene",
-        multi_table_output=True,
-        stats=True,
-        format_="html",
-        beats_type="scenes",
-    )
-    write_to_file(parent / f"{output_basestr}-scenes.html", contents)
-
-    if args.format == "pdf":
-        for base_name in (f"{output_basestr}-arcs", f"{output_basestr}-scenes"):
-            single_markdown_to_pdf(
-                args,
-                base_name,
-                parent / f"{base_name}.html",
-                artifact_dir=parent,
-                css_path=get_css_path(args.config, variant="misc_pdf_css_path"),
+    # Parse once, then group the lines by Arc and by Scene
+    table = build_table_from_files(path, cache_dir=cache_dir)
+    if table is None:
+        print("No table found!", file=sys.stderr)
+        sys.exit(1)
+    views = {
+        "arcs": table.regroup(column="Arc", split_columns=["Arc", "Beat"]),
+        "scenes": table.regroup(column="Scene"),
+    }
+
+    with ExitStack() as stack:
+        html_dir = parent
+        if args.format == "pdf" and args.no_html:
+            html_dir = Path(stack.enter_context(TemporaryDirectory()))
+        html_paths = {}
+        for beats_type, view in views.items():
+            contents, _ = get_beats(
+                view, multi_table_output=True, format_="html", beats_type=beats_type
             )
+            html_paths[beats_type] = html_dir / f"{output_basestr}-{beats_type}.html"
+            write_to_file(html_paths[beats_type], contents)
+
+        if args.format == "pdf":
+            css_path = get_css_path(args.config, variant="misc_pdf_css_path")
+            pdf_names = {beats_type: f"{output_basestr}-{beats_type}" for beats_type in html_paths}
+            if use_pdf_renderer(args.config):
+                # The in-process renderer renders one pdf at a time, so threads wouldn't help.
+                for beats_type, html_path in html_paths.items():
+                    single_markdown_to_pdf(
+                        args,
+                        pdf_names[beats_type],
+                        html_path,
+                        artifact_dir=parent,
+                        css_path=css_path,
+                    )
+            else:
+                with ThreadPoolExecutor(max_workers=len(html_paths)) as executor:
+                    futures = [
+                        executor.submit(
+                            single_markdown_to_pdf,
+                            args,
+                            pdf_names[beats_type],
+                            html_path,
+                            artifact_dir=parent,
+                            css_path=css_path,
+                        )
+                        for beats_type, html_path in html_paths.items()
+                    ]
+                    for future in futures:
+                        future.result()
 
 
 def novel_stats(args):
@@ -244,37 +359,47 @@ Total words: {stats['total']['words']}
         sys.exit(len(errors))
 
 
-def arc_grep(beats_contents, regex):
-    """Grep through the contents of the arc"""
-    parsed_contents = ""
-    in_table = False
-    table_contents = ""
-    for line in beats_contents.splitlines():
-        if line.startswith("|"):
-            if not in_table:
-                in_table = True
-            elif not line.startswith("|-") and not re.search(
-                regex,
-                line,
-            ):
-                continue
-            table_contents = f"{table_contents}{line}\n"
-        else:
-            if in_table:
-                if table_contents.count("\n") > 2:
-                    parsed_contents = f"{parsed_contents}{table_contents}"
-                parsed_contents = f"{parsed_contents}\n"
-                in_table = False
-                table_contents = ""
-            else:
-                parsed_contents = f"{parsed_contents}{line}\n"
-    if table_contents.count("\n") > 2:
-        parsed_contents = f"{parsed_contents}{table_contents}"
-    return parsed_contents
+# The primary sync outline column, by `primary_outline_type`
+PRIMARY_OUTLINE_COLUMNS = {"scenes": "Scene", "povs": "POV", "full": None}
+
+# The outlines rendered from the primary one: (outline_type, table kwargs, get_beats kwargs)
+SYNC_VIEWS = (
+    ("povs", {"column": "POV"}, {}),
+    ("arcs", {"column": "Arc", "split_columns": ["Arc", "Beat"]}, {}),
+    ("scenes", {"column": "Scene"}, {}),
+    (
+        "questions",
+        {"column": "Arc", "split_columns": ["Arc", "Beat"], "also_split_by_slash": True},
+        {"row_filter": column_regex_filter(QUESTIONS_REGEX)},
+    ),
+    (
+        "beats",
+        {"column": "Arc", "split_columns": ["Arc", "Beat"], "also_split_by_slash": True},
+        {"row_filter": column_regex_filter(BEATS_REGEX)},
+    ),
+)
+
+# The parsed tables of a synced outline set, by outline_type, to merge into the series
+SyncSet = namedtuple("SyncSet", ["paths", "primary_outline_type", "tables"])
+
+
+def _get_sync_table(table, path, **kwargs):
+    """Return `table`, or parse it from `path` if it's None."""
+    if table is None:
+        table = build_table_from_files(path, **deepcopy(kwargs))
+    if table is None:
+        print("No table found!", file=sys.stderr)
+        sys.exit(1)
+    return table
 
 
-def create_single_sync_set(paths, parent, primary_outline_type, output_name):
-    """Create the different output_paths outlines, using `paths` as the source, for a single book or series."""
+@timed()
+def create_single_sync_set(paths, parent, primary_outline_type, output_name, book_sets=None):
+    """Create the different output_paths outlines, using `paths` as the source, for a single book or series.
+
+    If `book_sets` is a list of each book's SyncSet, covering `paths` with the same
+    `primary_outline_type`, merge their tables rather than reparsing. Returns our SyncSet.
+    """
     output_paths = {
         "full": parent / output_name.format(outline_type="full"),
         "scenes": parent / output_name.format(outline_type="scenes"),
@@ -286,93 +411,66 @@ def create_single_sync_set(paths, parent, primary_outline_type, output_name):
 
     parent.mkdir(parents=True, exist_ok=True)
 
-    match primary_outline_type:
-        case "scenes":
-            contents, stats = beats_helper(paths, column="Scene", file_headers=True, stats=True)
-        case "povs":
-            contents, stats = beats_helper(paths, column="POV", file_headers=True, stats=True)
-        case "full":
-            contents, stats = beats_helper(paths, file_headers=True, stats=True)
-        case _:
-            raise KeyError(f"Invalid primary_outline_type {primary_outline_type}!")
+    if primary_outline_type not in PRIMARY_OUTLINE_COLUMNS:
+        raise KeyError(f"Invalid primary_outline_type {primary_outline_type}!")
+    if book_sets and (
+        [Path(path).resolve() for book_set in book_sets for path in book_set.paths]
+        != [Path(path).resolve() for path in paths]
+        or any(book_set.primary_outline_type != primary_outline_type for book_set in book_sets)
+    ):
+        book_sets = None
+
+    def get_table(outline_type, path, **kwargs):
+        merged = None
+        if book_sets:
+            merged = merge_tables(
+                [book_set.tables[outline_type] for book_set in book_sets],
+                sort_column=sort_column,
+            )
+        return _get_sync_table(merged, path, **kwargs)
 
+    sort_column = None
+    tables = {}
+    tables["full"] = get_table("full", paths, column=PRIMARY_OUTLINE_COLUMNS[primary_outline_type])
+    contents, stats = get_beats(tables["full"], file_headers=True, stats=True)
     write_to_file(output_paths["full"], contents)
     print(f"{stats}\n", file=sys.stderr)
 
-    # POVS
-    contents, stats = beats_helper(
-        output_paths["full"],
-        column="POV",
-        file_headers=True,
-        multi_table_output=True,
-        stats=True,
-        beats_type="povs",
-    )
-    write_to_file(output_paths["povs"], contents)
-    print(f"{stats}\n", file=sys.stderr)
-
-    # Arc
-    contents, stats = beats_helper(
-        output_paths["full"],
-        column="Arc",
-        file_headers=True,
-        multi_table_output=True,
-        split_columns=["Arc", "Beat"],
-        stats=True,
-        beats_type="arcs",
-    )
-    write_to_file(output_paths["arcs"], contents)
-    print(f"{stats}\n", file=sys.stderr)
-
-    # Scene
-    contents, stats = beats_helper(
-        output_paths["full"],
-        column="Scene",
-        file_headers=True,
-        multi_table_output=True,
-        stats=True,
-        beats_type="scenes",
-    )
-    write_to_file(output_paths["scenes"], contents)
-    print(f"{stats}\n", file=sys.stderr)
-
-    # Questions - regex is hacky but I don't have a way to split and filter by different columns
-    arc_contents, stats = beats_helper(
-        output_paths["full"],
-        column="Arc",
-        file_headers=True,
-        multi_table_output=True,
-        split_columns=["Arc", "Beat"],
-        also_split_by_slash=True,
-        stats=True,
-        beats_type="questions",
-    )
-    parsed_contents = arc_grep(arc_contents, QUESTIONS_REGEX)
-    write_to_file(output_paths["questions"], parsed_contents)
-    print(f"{stats}\n", file=sys.stderr)
-
-    # Beats - regex is hacky but I don't have a way to split and filter by different columns
-    arc_contents, stats = beats_helper(
-        output_paths["full"],
-        column="Arc",
-        file_headers=True,
-        multi_table_output=True,
-        split_columns=["Arc", "Beat"],
-        also_split_by_slash=True,
-        stats=True,
-        beats_type="beats",
-    )
-    parsed_contents = arc_grep(arc_contents, BEATS_REGEX)
-    write_to_file(output_paths["beats"], parsed_contents)
-    print(f"{stats}\n", file=sys.stderr)
-
-
-def run_single_sync(config, book_num=None, path=None, artifact_dir=None, primary_outline_type=None):
+    # The other outlines are parsed from the full outline, so their lines are in its order.
+    if tables["full"].column:
+        sort_column = tables["full"].line_obj._fields[tables["full"].column]
+    for outline_type, table_kwargs, beats_kwargs in SYNC_VIEWS:
+        tables[outline_type] = get_table(outline_type, output_paths["full"], **table_kwargs)
+        contents, stats = get_beats(
+            tables[outline_type],
+            file_headers=True,
+            multi_table_output=True,
+            stats=True,
+            beats_type=outline_type,
+            **beats_kwargs,
+        )
+        write_to_file(output_paths[outline_type], contents)
+        print(f"{stats}\n", file=sys.stderr)
+    return SyncSet(paths, primary_outline_type, tables)
+
+
+@timed()
+def run_single_sync(
+    config,
+    book_num=None,
+    path=None,
+    artifact_dir=None,
+    primary_outline_type=None,
+    book_sets=None,
+):
     """Sync the outline files for a single book, or combine the existing book outlines into a single series.
 
     Note, if we're running run_single_sync for a series, we will not pick up new outline changes in each book,
     unless they're synced to each book's primary outline files. If we want to sync those first, use the
-    `--all` option to call `sync_each_book_in_a_series` first.
+    `--all` option to call `sync_each_book_in_a_series` first, and pass its `book_sets` to merge
+    the books' parsed outlines instead of reparsing them.
+
+    Returns the SyncSet.
     """
     if book_num:
         config_key = "single"
@@ -386,7 +484,7 @@ def run_single_sync(config, book_num=None, path=None, artifact_dir=None, primary
     elif book_num:
         paths = [Path(config["outline"]["single"]["primary_outline_file"])]
     else:
-        paths = [Path(p) for p in glob(config["outline"]["series"]["source_outline_glob"])]
+        paths = [Path(p) for p in sorted(glob(config["outline"]["series"]["source_outline_glob"]))]
 
     if artifact_dir:
         parent = Path(artifact_dir)
@@ -398,11 +496,18 @@ def run_single_sync(config, book_num=None, path=None, artifact_dir=None, primary
     )
     output_name = config["outline"][config_key]["output_name"]
 
-    create_single_sync_set(paths, parent, primary_outline_type, output_name)
+    return create_single_sync_set(
+        paths, parent, primary_outline_type, output_name, book_sets=book_sets
+    )
 
 
+@timed()
 def sync_each_book_in_a_series(config, **kwargs):
-    """Sync the outline of each book in a series. This allows us to sync the latest changes into the series outline."""
+    """Sync the outline of each book in a series. This allows us to sync the latest changes into the series outline.
+
+    Returns the list of each book's SyncSet.
+    """
+    book_sets = []
     path_names = sorted(glob(config["outline"]["series"]["source_outline_glob"]))
     for path_name in path_names:
         single_kwargs = deepcopy(kwargs)
@@ -412,7 +517,8 @@ def sync_each_book_in_a_series(config, **kwargs):
             single_kwargs["book_num"] = m["book_num"]
             repl_dict = {"book_num": m["book_num"], "outline_type": "{outline_type}"}
             single_config = get_new_config_val(single_config, {}, repl_dict=repl_dict)
-            run_single_sync(single_config, **single_kwargs)
+            book_sets.append(run_single_sync(single_config, **single_kwargs))
+    return book_sets
 
 
 def novel_sync(args):
@@ -425,14 +531,15 @@ def novel_sync(args):
         "primary_outline_type": args.primary_outline_type,
     }
 
+    book_sets = None
     if args.all:
         if args.config["book_num"]:
             print(f"book_num is {args.config['book_num']}; --all doesn't work for a single book!")
             raise SystemExit(1)
         else:
-            sync_each_book_in_a_series(args.config, **kwargs)
+            book_sets = sync_each_book_in_a_series(args.config, **kwargs)
 
-    run_single_sync(args.config, **kwargs)
+    run_single_sync(args.config, book_sets=book_sets, **kwargs)
 
 
 def novel_sync_all(args):
@@ -443,8 +550,8 @@ def novel_sync_all(args):
         "primary_outline_type": args.primary_outline_type,
     }
 
-    sync_each_book_in_a_series(args.config, **kwargs)
-    run_single_sync(args.config, **kwargs)
+    book_sets = sync_each_book_in_a_series(args.config, **kwargs)
+    run_single_sync(args.config, book_sets=book_sets, **kwargs)
 
 
 def novel_today(args):
@@ -466,6 +573,7 @@ def novel_parser():
     )  # these args will be swallowed by the config_parser, but add for --help
     parser.set_defaults(config=config)
     parser.add_argument("-v", "--verbose", help="Verbose logging.", action="store_true")
+    add_profile_parser_args(parser)
     subparsers = parser.add_subparsers()
 
     # novel beats
@@ -481,6 +589,11 @@ def novel_parser():
         nargs="+",
         help="Only print the lines where the column matches this value.",
     )
+    beats_parser.add_argument(
+        "-w",
+        "--where",
+        help="Only print the lines matching a query, e.g. `Arc=Judas and POV in (Neo, Trinity) and Scene=10..20`.",
+    )
     beats_parser.add_argument(
         "-o",
         "--order",
@@ -495,6 +608,11 @@ def novel_parser():
     beats_parser.add_argument(
         "-s", "--stats", action="store_true", help="Display stats at the end."
     )
+    beats_parser.add_argument(
+        "--stats-only",
+        action="store_true",
+        help="Only count the beats and display the stats, without building the output.",
+    )
     beats_parser.add_argument(
         "--format",
         choices=["yaml", "markdown", "html"],
@@ -515,6 +633,14 @@ def novel_parser():
         action="store_true",
         help="When sorting by column, split each value into its own table.",
     )
+    beats_parser.add_argument(
+        "--natural-sort",
+        action="store_true",
+        help="Sort the column values numerically, so scene 2.1 comes before 10.1.",
+    )
+    beats_parser.add_argument(
+        "--no-cache", action="store_true", help="Don't read or write the parsed outline cache."
+    )
     beats_parser.add_argument("path", nargs="?")
     beats_parser.set_defaults(func=novel_beats)
 
@@ -557,10 +683,17 @@ def novel_parser():
     convert_parser.set_defaults(require_book_num=True)
     convert_parser.add_argument(
         "--format",
-        choices=("pdf", "chapter-pdf", "shunn-docx", "shunn-md", "text", "epub", "simple-pdf"),
-        default="text",
+        type=_convert_format_list,
+        default=["text"],
+        help=f"One or more comma-separated formats: {', '.join(CONVERT_FORMATS)}. Multiple formats "
+        "are built concurrently, each into its own subdirectory of the artifact dir.",
     )
     convert_parser.add_argument("--subtitle", default="")
+    convert_parser.add_argument(
+        "--split-scenes",
+        action="store_true",
+        help="shunn-md: also split each chapter into scene files at the scene markers.",
+    )
     convert_parser.add_argument("--clean", action="store_true")
     convert_parser.add_argument("--artifact-dir", default="_output")
     convert_parser.add_argument("filename", nargs="+")
@@ -571,7 +704,23 @@ def novel_parser():
         "lint", help="Check the manuscript files for syntax correctness."
     )
     lint_parser.add_argument("-f", "--fix", action="store_true")
-    lint_parser.add_argument("path")
+    lint_parser.add_argument("--format", choices=OUTPUT_FORMATS, default="text")
+    lint_parser.add_argument(
+        "-j", "--jobs", type=int, help="Worker processes. Defaults to the number of CPUs."
+    )
+    changed_group = lint_parser.add_mutually_exclusive_group()
+    changed_group.add_argument(
+        "--changed",
+        action="store_true",
+        help="Only lint the modified, added and untracked files in git status.",
+    )
+    changed_group.add_argument(
+        "--since", metavar="REV", help="Only lint the files changed since git revision REV."
+    )
+    lint_parser.add_argument(
+        "--no-cache", action="store_true", help="Don't read or write the diagnostics cache."
+    )
+    lint_parser.add_argument("path", nargs="*", help="Defaults to the current directory.")
     lint_parser.set_defaults(func=novel_lint)
 
     # novel links
@@ -604,6 +753,14 @@ def novel_parser():
     outline_convert_parser.add_argument("--subtitle", default="")
     outline_convert_parser.add_argument("--clean", action="store_true")
     outline_convert_parser.add_argument("--artifact-dir", default="_output")
+    outline_convert_parser.add_argument(
+        "--no-html",
+        action="store_true",
+        help="With --format pdf, don't keep the intermediate html files.",
+    )
+    outline_convert_parser.add_argument(
+        "--no-cache", action="store_true", help="Don't read or write the parsed outline cache."
+    )
     outline_convert_parser.set_defaults(func=novel_outline_convert)
 
     # novel replace
@@ -649,4 +806,4 @@ def novel_tool():
     if not hasattr(args, "func"):
         print(parser.format_help())
         raise SystemExit(1)
-    args.func(args)
+    run_func(args)
@@ -5,25 +5,51 @@ Allows for filtering by and reordering of columns.
 Currently assumes that all tables in a file are formatted the same.
 """
 
-import re
+import hashlib
+import heapq
+import os
+import pickle
 import sys
+from bisect import insort
 from collections import namedtuple
-from itertools import zip_longest
+from itertools import chain, groupby, product, zip_longest
+from math import prod
 from urllib.parse import quote
 
 from markdown_novel_tools.constants import (
+    DIGITS_REGEX,
+    OUTLINE_CACHE_MAX_BYTES,
     OUTLINE_HTML_HEADER,
+    SPACES_REGEX,
     SPECIAL_CHAR_REGEX,
     TABLE_DIVIDER_REGEX,
+    TABLE_HEADER_CHAR_REGEX,
 )
+from markdown_novel_tools.outline_query import where_columns, where_filter
+from markdown_novel_tools.profiling import PROFILER, count, timed
 from markdown_novel_tools.utils import split_by_char, to_list
 
+# Bump this when the Table or its snapshot format changes.
+OUTLINE_SNAPSHOT_VERSION = 2
+
 
 class Table:
     """Table object."""
 
-    def __init__(self, line, column=None, order=None, split_columns=None):
-        """Init Table object."""
+    def __init__(
+        self,
+        line,
+        column=None,
+        order=None,
+        split_columns=None,
+        count_only=False,
+        natural_sort=False,
+    ):
+        """Init Table object.
+
+        The groups in `parsed_lines` are kept in order in `group_keys`: lexically, or by
+        `natural_sort_key` if `natural_sort`.
+        """
         parts = get_line_parts(line)
         self.line_obj = namedtuple("Line", parts)
         self.max_width = [len(x) for x in parts]
@@ -38,8 +64,11 @@ class Table:
                 split_columns[i] = self.get_column(val)
             self.split_columns = tuple(split_columns)
         self.parsed_lines = {}
+        self.group_keys = []
+        self.natural_sort = natural_sort
         self.line_count = 0
         self.column_values = set()
+        self.count_only = count_only
 
     def get_column(self, column):
         """Get the column name, given either an int or a column name"""
@@ -98,77 +127,191 @@ class Table:
             ]
 
         So the first value of column 2 goes with the first value of column 3, the second of each, and so on. When one column runs out of values, use ""
+
+        If self.count_only, only count the lines and track the column values, without keeping
+        the lines.
         """
-        orig_parts = get_line_parts(line, self.split_columns)
-        if self.split_columns:
-            splits = dict()
-            additional_lines = []
-            for column_key in self.split_columns:
-                splits[column_key] = orig_parts[column_key]
-            for partial_parts in zip_longest(*list(splits.values()), fillvalue=""):
-                new_parts = orig_parts[:]
-                comma_zipped_lines = []
-                for column_key, val in zip(self.split_columns, partial_parts):
-                    new_parts[column_key] = val
-                comma_zipped_lines.append(new_parts)
-                additional_lines.extend(
-                    _help_add_line(
-                        comma_zipped_lines, list(self.split_columns), also_split_by_slash
-                    )
-                )
-            for line in additional_lines:
-                self.do_add_line(line)
-        else:
-            self.do_add_line(orig_parts)
+        self.add_parts(get_line_parts(line, self.split_columns), also_split_by_slash)
+
+    def add_parts(self, parts, also_split_by_slash=False):
+        """Add the line or lines for `parts`, from `get_line_parts`; see `add_line`."""
+        if self.count_only:
+            self.line_count += count_split_parts(parts, self.split_columns, also_split_by_slash)
+            if self.column:
+                for row in iter_split_parts(parts, self.split_columns, also_split_by_slash):
+                    self.column_values.add(row[self.column])
+            return
+        for row in iter_split_parts(parts, self.split_columns, also_split_by_slash):
+            self.do_add_line(row)
 
     def do_add_line(self, parts):
         """Add a line"""
-        line_obj = self.line_obj(*parts)
+        line_obj = self.line_obj._make(parts)
         column_name = None
         if self.column:
             column_name = parts[self.column]
             self.column_values.add(column_name)
-        self.parsed_lines.setdefault(column_name, []).append(line_obj)
+        lines = self.parsed_lines.get(column_name)
+        if lines is None:
+            lines = self.parsed_lines[column_name] = []
+            insort(self.group_keys, column_name, key=self.group_sort_key)
+        lines.append(line_obj)
 
         self.update_max_width([len(x) for x in parts])
         self.line_count += 1
 
+    def regroup(self, column=None, split_columns=None, also_split_by_slash=False):
+        """Return a new Table of our lines, grouped by `column` and split by `split_columns`.
+
+        This builds the same table as parsing our source again with these options, as long
+        as our own lines are in source order, e.g. because we weren't grouped or split.
+        """
+        header = f"| {' | '.join(self.line_obj._fields)} |"
+        table = Table(
+            header,
+            column=column,
+            order=self.order,
+            split_columns=None if split_columns is None else list(split_columns),
+            natural_sort=self.natural_sort,
+        )
+        split_columns = table.split_columns or ()
+        for _, lines in self.sorted_groups():
+            for line in lines:
+                parts = list(line)
+                for column_key in split_columns:
+                    parts[column_key] = [x.strip() for x in parts[column_key].split(",")]
+                table.add_parts(parts, also_split_by_slash)
+        return table
+
+    @property
+    def group_sort_key(self):
+        """Return the sort key function for the group keys, or None for lexical order."""
+        return natural_sort_key if self.natural_sort else None
+
+    def sorted_groups(self):
+        """Yield each (column value, lines) group, in order."""
+        for key in self.group_keys:
+            yield key, self.parsed_lines[key]
+
     def update_max_width(self, widths):
         """Update self.max_width with any wider width"""
-        for count, value in enumerate(widths):
-            if value > self.max_width[count]:
-                self.max_width[count] = value
+        for index, value in enumerate(widths):
+            if value > self.max_width[index]:
+                self.max_width[index] = value
 
+    def to_snapshot(self):
+        """Return the table as a dict of builtin types, with the lines stored by column.
 
-def _help_add_line(lines, split_columns, also_split_by_slash):
-    """Take a list of comma-split line parts, and further split them by slash.
+        `groups` is a list of (column value, number of lines) in `parsed_lines` order, so the
+        lines can be split back into their groups.
+        """
+        groups = []
+        rows = []
+        for key, lines in self.parsed_lines.items():
+            groups.append((key, len(lines)))
+            rows.extend(lines)
+        return {
+            "version": OUTLINE_SNAPSHOT_VERSION,
+            "fields": self.line_obj._fields,
+            "order": self.order,
+            "column": self.column,
+            "split_columns": self.split_columns,
+            "max_width": self.max_width,
+            "line_count": self.line_count,
+            "column_values": self.column_values,
+            "count_only": self.count_only,
+            "natural_sort": self.natural_sort,
+            "group_keys": self.group_keys,
+            "groups": groups,
+            "columns": tuple(zip(*rows)) if rows else (),
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Return a Table from `to_snapshot` output, without reparsing the outline."""
+        table = cls.__new__(cls)
+        table.line_obj = namedtuple("Line", snapshot["fields"])
+        table.order = snapshot["order"]
+        table.column = snapshot["column"]
+        table.split_columns = snapshot["split_columns"]
+        table.max_width = snapshot["max_width"]
+        table.line_count = snapshot["line_count"]
+        table.column_values = snapshot["column_values"]
+        table.count_only = snapshot["count_only"]
+        table.natural_sort = snapshot["natural_sort"]
+        table.group_keys = snapshot["group_keys"]
+        rows = map(table.line_obj._make, zip(*snapshot["columns"]))
+        table.parsed_lines = {
+            key: [next(rows) for _ in range(num_lines)] for key, num_lines in snapshot["groups"]
+        }
+        return table
+
+
+def natural_sort_key(value):
+    """Return a sort key that orders the runs of digits in `value` numerically.
+
+    So scene `2.1` sorts before `10.1`. Values that only differ in zero padding fall back to
+    lexical order.
+    """
+    if value is None:
+        return ((), "")
+    parts = tuple(
+        (0, int(part)) if part.isdigit() else (1, part)
+        for part in DIGITS_REGEX.split(value)
+        if part
+    )
+    return (parts, value)
 
-    if lines is
 
-        ["one", "two", "three/four"]
+def _iter_split_values(parts, split_columns, also_split_by_slash):
+    """Yield a tuple of the `split_columns` values for each line that `parts` expands to.
 
-    and split_columns is 2, then return
+    The comma-split values are zipped together, padded with "". If `also_split_by_slash`, each
+    zipped set is then expanded into every combination of its slash-split values, in
+    `split_columns` order.
+    """
+    for values in zip_longest(*(parts[column_key] for column_key in split_columns), fillvalue=""):
+        if also_split_by_slash:
+            yield from product(*(value.split("/") for value in values))
+        else:
+            yield values
+
+
+def iter_split_parts(parts, split_columns, also_split_by_slash=False):
+    """Lazily yield the line parts for each line that `parts` expands to.
+
+    if parts is
+
+        ["one", "two", ["three/four"]]
+
+    and split_columns is (2,) with also_split_by_slash, then yield
 
-        [
-            ["one", "two", "three"],
-            ["one", "two", "four"],
-        ]
+        ("one", "two", "three")
+        ("one", "two", "four")
 
-    if not split_columns, or if the split column(s) have no / characters, then return the original lines.
+    if not split_columns, yield the original parts.
     """
-    if split_columns and also_split_by_slash:
-        new_lines = []
-        column_key = split_columns.pop(0)
-        for line_parts in lines:
-            if "/" in line_parts[column_key]:
-                for slash_split_part in line_parts[column_key].split("/"):
-                    new_parts = line_parts[:]
-                    new_parts[column_key] = slash_split_part
-                    new_lines.append(new_parts)
-            else:
-                new_lines = lines
-        lines = _help_add_line(new_lines, split_columns, also_split_by_slash)
-    return lines
+    if not split_columns:
+        yield parts
+        return
+    positions = {column_key: i for i, column_key in enumerate(split_columns)}
+    for values in _iter_split_values(parts, split_columns, also_split_by_slash):
+        yield tuple(
+            values[positions[i]] if i in positions else part for i, part in enumerate(parts)
+        )
+
+
+def count_split_parts(parts, split_columns, also_split_by_slash=False):
+    """Return the number of lines `iter_split_parts` would yield, without building them."""
+    if not split_columns:
+        return 1
+    columns = [parts[column_key] for column_key in split_columns]
+    if not also_split_by_slash:
+        return max(len(values) for values in columns)
+    return sum(
+        prod(value.count("/") + 1 for value in values)
+        for values in zip_longest(*columns, fillvalue="")
+    )
 
 
 def _outline_to_yaml(line):
@@ -176,6 +319,7 @@ def _outline_to_yaml(line):
     return line.strip('"').replace("[[", "").replace("]]", "").replace('"', "").replace(":", " -")
 
 
+@timed()
 def beats_helper(
     paths,
     column=None,
@@ -189,8 +333,17 @@ def beats_helper(
     target_table_num=None,
     format_=None,
     beats_type="outline",
+    row_filter=None,
+    stats_only=False,
+    where=None,
+    cache_dir=None,
+    natural_sort=False,
 ):
-    """Shared logic from novel_beats and novel_sync"""
+    """Shared logic from novel_beats and novel_sync
+
+    `where` is a query tree from `outline_query.parse_where`; only the lines matching it, and
+    `row_filter` if set, are rendered.
+    """
     table = build_table_from_files(
         paths,
         column=column,
@@ -198,8 +351,16 @@ def beats_helper(
         split_columns=split_columns,
         also_split_by_slash=also_split_by_slash,
         target_table_num=target_table_num,
+        count_only=stats_only and where is None,
+        cache_dir=cache_dir,
+        natural_sort=natural_sort,
     )
 
+    if table and where is not None:
+        table.verify_field_names(where_columns(where), "where")
+        row_filter = _and_filters(where_filter(table, where), row_filter)
+    if table and stats_only:
+        return "", get_table_stats(table, filter_=filter_, row_filter=row_filter)
     if table:
         return get_beats(
             table,
@@ -209,6 +370,7 @@ def beats_helper(
             stats=stats,
             format_=format_,
             beats_type=beats_type,
+            row_filter=row_filter,
         )
     else:
         print("No table found!", file=sys.stderr)
@@ -256,6 +418,7 @@ aliases: []
 """
 
 
+@timed()
 def get_beats(
     table,
     filter_=None,
@@ -264,8 +427,13 @@ def get_beats(
     stats=False,
     format_=None,
     beats_type="outline",
+    row_filter=None,
 ):
-    """Return the output."""
+    """Return the output.
+
+    If `row_filter` is set, only render the lines it returns True for, and skip the tables left
+    with no lines.
+    """
     stdout = ""
     stderr = ""
     if file_headers:
@@ -273,34 +441,49 @@ def get_beats(
         stdout += get_outline_file_header(beats_type)
 
     if format_ == "yaml":
-        stdout = f"{stdout}{get_yaml_from_table(table, filter_=filter_)}"
+        stdout = f"{stdout}{get_yaml_from_table(table, filter_=filter_, row_filter=row_filter)}"
     elif format_ is None or format_ == "markdown":
-        stdout = f"{stdout}{get_markdown_from_table(table, filter_=filter_, multi_table=multi_table_output)}"
+        stdout = f"{stdout}{get_markdown_from_table(table, filter_=filter_, multi_table=multi_table_output, row_filter=row_filter)}"
     elif format_ == "html":
         # No markdown file headers in html
-        stdout = get_html_from_table(table, filter_=filter_, multi_table=multi_table_output)
+        stdout = get_html_from_table(
+            table, filter_=filter_, multi_table=multi_table_output, row_filter=row_filter
+        )
     else:
         raise Exception(f"Unknown format {format_}!")
 
     if stats:
-        line_count = table.line_count
-        if table.column_values:
-            values = set()
-            if filter_:
-                line_count = 0
-                for val in table.column_values:
-                    for split_by_slash in split_by_char(val, "/"):
-                        if split_by_slash in filter_:
-                            values.add(split_by_slash)
-                            line_count += 1
-                values = list(values)
-            else:
-                values = table.column_values
-            stderr = f"{stderr}Num values: {len(values)} {sorted(values)}\n"
-        stderr = f"{stderr}Num beats: {line_count}"
+        stderr = get_table_stats(table, filter_=filter_, row_filter=row_filter)
     return stdout, stderr
 
 
+def get_table_stats(table, filter_=None, row_filter=None):
+    """Return the stats for the table.
+
+    If `row_filter` is set, also count the lines it keeps.
+    """
+    stderr = ""
+    line_count = table.line_count
+    if table.column_values:
+        values = table.column_values
+        if filter_:
+            filter_set = set(filter_)
+            parts = [
+                part for val in table.column_values for part in val.split("/") if part in filter_set
+            ]
+            line_count = len(parts)
+            values = set(parts)
+        stderr = f"{stderr}Num values: {len(values)} {sorted(values, key=table.group_sort_key)}\n"
+    stderr = f"{stderr}Num beats: {line_count}"
+    if row_filter is not None:
+        matches = sum(
+            1 for lines in table.parsed_lines.values() for line in lines if row_filter(line)
+        )
+        stderr = f"{stderr}\nNum matches: {matches}"
+    return stderr
+
+
+@timed()
 def build_table_from_files(
     paths,
     column=None,
@@ -308,12 +491,59 @@ def build_table_from_files(
     split_columns=None,
     also_split_by_slash=False,
     target_table_num=None,
+    count_only=False,
+    cache_dir=None,
+    natural_sort=False,
 ):
-    """Parse the given filehandle's table(s)."""
+    """Parse the given filehandle's table(s).
+
+    If `count_only`, only count the lines rather than keeping them; see `Table.add_line`.
+    If `natural_sort`, order the groups by `natural_sort_key`.
+
+    If `cache_dir` is set, load the table from a snapshot of an earlier parse of the same file
+    contents and options, or save a snapshot after parsing.
+    """
     if not isinstance(paths, list):
         paths = [paths]
+    options = {
+        "column": column,
+        "order": order,
+        "split_columns": split_columns,
+        "also_split_by_slash": also_split_by_slash,
+        "target_table_num": target_table_num,
+        "count_only": count_only,
+        "natural_sort": natural_sort,
+    }
+    if cache_dir is None:
+        return _parse_table_from_files(paths, **options)
+    key = get_table_cache_key(paths, **options)
+    table = load_table_snapshot(cache_dir, key)
+    if table is not None:
+        count("outline cache hits")
+        return table
+    count("outline cache misses")
+    table = _parse_table_from_files(paths, **options)
+    if table is not None:
+        save_table_snapshot(cache_dir, key, table)
+    return table
+
+
+def _parse_table_from_files(
+    paths,
+    column,
+    order,
+    split_columns,
+    also_split_by_slash,
+    target_table_num,
+    count_only,
+    natural_sort,
+):
+    """Parse the table(s) in `paths`; see `build_table_from_files`."""
     table = None
     for path in paths:
+        if PROFILER.enabled:
+            count("files read")
+            count("bytes read", os.path.getsize(path))
         in_table = False
         cur_table_num = 0
         line_num = 0
@@ -332,6 +562,8 @@ def build_table_from_files(
                                 column=column,
                                 order=order,
                                 split_columns=split_columns,
+                                count_only=count_only,
+                                natural_sort=natural_sort,
                             )
                         else:
                             table.verify_header(line, line_num)
@@ -345,12 +577,117 @@ def build_table_from_files(
                     continue
                 if table is not None:
                     table.add_line(line, also_split_by_slash=also_split_by_slash)
+    if table is not None:
+        count("rows parsed", table.line_count)
+    return table
+
+
+@timed()
+def merge_tables(tables, sort_column=None):
+    """Merge tables parsed from separate files into the table parsing them in order would build.
+
+    The tables must have been parsed with the same options. The groups are k-way merged in
+    sorted order. If `sort_column` is set, each table's group lines must already be sorted by
+    it, e.g. because they were parsed from a file rendered grouped by `sort_column`, and the
+    lines are k-way merged by it too; ties, and everything if `sort_column` is None, keep the
+    order of `tables`. The column widths are combined rather than recomputed.
+    """
+    first = tables[0]
+    for table in tables[1:]:
+        if table.line_obj._fields != first.line_obj._fields:
+            raise ValueError(
+                f"Can't merge tables with fields {first.line_obj._fields} and {table.line_obj._fields}!"
+            )
+    merged = Table.__new__(Table)
+    merged.line_obj = first.line_obj
+    merged.order = first.order
+    merged.column = first.column
+    merged.split_columns = first.split_columns
+    merged.count_only = first.count_only
+    merged.natural_sort = first.natural_sort
+    merged.max_width = [max(widths) for widths in zip(*(table.max_width for table in tables))]
+    merged.line_count = sum(table.line_count for table in tables)
+    merged.column_values = set().union(*(table.column_values for table in tables))
+    merged.parsed_lines = {}
+    sort_key = merged.group_sort_key
+    keys = heapq.merge(*(table.group_keys for table in tables), key=sort_key)
+    merged.group_keys = [key for key, _ in groupby(keys)]
+
+    def line_key(line):
+        value = getattr(line, sort_column)
+        return value if sort_key is None else sort_key(value)
+
+    for key in merged.group_keys:
+        groups = [table.parsed_lines[key] for table in tables if key in table.parsed_lines]
+        if sort_column is None or len(groups) == 1:
+            lines = chain.from_iterable(groups)
+        else:
+            lines = heapq.merge(*groups, key=line_key)
+        merged.parsed_lines[key] = list(lines)
+    return merged
+
+
+def get_table_cache_key(paths, **kwargs):
+    """Return the snapshot cache key for parsing `paths` with the `build_table_from_files` kwargs."""
+    hasher = hashlib.sha256(f"{OUTLINE_SNAPSHOT_VERSION}\0".encode())
+    for path in paths:
+        with open(path, "rb") as fh:
+            hasher.update(hashlib.sha256(fh.read()).digest())
+    kwargs["also_split_by_slash"] = bool(kwargs.get("also_split_by_slash"))
+    for option in ("order", "split_columns"):
+        if kwargs.get(option) is not None:
+            kwargs[option] = [str(value) for value in kwargs[option]]
+    hasher.update(repr(sorted(kwargs.items())).encode())
+    return hasher.hexdigest()
+
+
+def load_table_snapshot(cache_dir, key):
+    """Return the Table saved under `key` in `cache_dir`, or None if it's missing or broken.
+
+    Loading a snapshot marks it as recently used.
+    """
+    path = os.path.join(cache_dir, f"{key}.pickle")
+    try:
+        with open(path, "rb") as fh:
+            snapshot = pickle.load(fh)
+        if snapshot.get("version") != OUTLINE_SNAPSHOT_VERSION:
+            return None
+        table = Table.from_snapshot(snapshot)
+        os.utime(path)
+    except (OSError, EOFError, pickle.PickleError, AttributeError, KeyError, TypeError, ValueError):
+        return None
     return table
 
 
+def save_table_snapshot(cache_dir, key, table, max_bytes=OUTLINE_CACHE_MAX_BYTES):
+    """Save `table` under `key` in `cache_dir`, then evict the least recently used snapshots."""
+    path = os.path.join(cache_dir, f"{key}.pickle")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as fh:
+        pickle.dump(table.to_snapshot(), fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    evict_table_snapshots(cache_dir, max_bytes)
+
+
+def evict_table_snapshots(cache_dir, max_bytes=OUTLINE_CACHE_MAX_BYTES):
+    """Delete the least recently used snapshots in `cache_dir` until they total `max_bytes` or less."""
+    snapshots = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".pickle"):
+            stat = entry.stat()
+            snapshots.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in snapshots)
+    for _, size, path in sorted(snapshots):
+        if total <= max_bytes:
+            break
+        count("outline cache evictions")
+        os.remove(path)
+        total -= size
+
+
 def get_markdown_table_header(header):
     """Return the table header and divider line"""
-    return f'{header}\n{re.sub(r"""[^+|]""", "-", header)}'
+    return f'{header}\n{TABLE_HEADER_CHAR_REGEX.sub("-", header)}'
 
 
 def header_text_to_header_anchor(header_text):
@@ -362,86 +699,160 @@ def header_text_to_header_anchor(header_text):
     - Two or more hyphens in a row are converted to one.
     - If a header with the same ID has already been generated, a unique incrementing number is appended, starting at 1.
     """
-    anchor = header_text.lower()
-    anchor = re.sub(SPECIAL_CHAR_REGEX, "", anchor)
-    anchor = anchor.replace(" ", "-")
-    anchor = re.sub("-+", "-", anchor)
-    return anchor
+    # SPECIAL_CHAR_REGEX removes any existing hyphens, so each run of spaces becomes one hyphen.
+    anchor = SPECIAL_CHAR_REGEX.sub("", header_text.lower())
+    return SPACES_REGEX.sub("-", anchor)
+
+
+def column_regex_filter(regex, columns=("Arc", "Beat")):
+    """Return a row filter for the lines where `regex` matches the value of any of `columns`."""
+
+    def row_filter(line):
+        return any(regex.search(getattr(line, column, "")) for column in columns)
+
+    return row_filter
 
 
-def get_markdown_from_table(table, filter_=None, multi_table=False):
+def _and_filters(first, second):
+    """Return a row filter for the lines both `first` and `second`, if set, keep."""
+    if second is None:
+        return first
+    return lambda line: first(line) and second(line)
+
+
+def _group_filter(filter_):
+    """Return a function telling if a group key, or one of its `/`-split parts, is in `filter_`.
+
+    Returns None if there's no `filter_`.
+    """
+    if not filter_:
+        return None
+    filter_set = set(filter_)
+    return lambda key: key in filter_set or not filter_set.isdisjoint(key.split("/"))
+
+
+def _filter_groups(table, filter_):
+    """Yield the table's (column value, lines) groups that match `filter_`, in order."""
+    group_filter = _group_filter(filter_)
+    for key, lines in table.sorted_groups():
+        if group_filter is None or group_filter(key):
+            yield key, lines
+
+
+def _filter_rows(lines, row_filter):
+    """Return the `lines` that `row_filter` keeps."""
+    if row_filter is None:
+        return lines
+    return [line for line in lines if row_filter(line)]
+
+
+@timed()
+def get_markdown_from_table(table, filter_=None, multi_table=False, row_filter=None):
     """Return all the appropriate lines in markdown format."""
     widths = dict(zip(list(table.line_obj._fields), table.max_width))
     header = "|"
     for o in table.order:
         header += f" {{:<{widths[o]}}} |".format(o)
-    toc = ""
-    body = ""
-    if not multi_table:
-        body = f"{body}{get_markdown_table_header(header)}\n"
-    for k, v in sorted(table.parsed_lines.items()):
-        if filter_:
-            filter_key = split_by_char(k, "/")
-            filter_key.append(k)
-            if set(filter_key).isdisjoint(set(filter_)):
-                continue
+    table_header = f"{get_markdown_table_header(header)}\n"
+    toc = []
+    body = []
+    for k, v in _filter_groups(table, filter_):
+        v = _filter_rows(v, row_filter)
         if multi_table:
             k = k or "None"
-            body = f"{body}\n## {k}\n{get_markdown_table_header(header)}\n"
-            toc = (
-                f"{toc}- {k} [github](#{header_text_to_header_anchor(k)}) [obsidian](#{quote(k)})\n"
+            body.append(f"\n## {k}\n")
+            toc.append(
+                f"- {k} [github](#{header_text_to_header_anchor(k)}) [obsidian](#{quote(k)})\n"
             )
+            if v or row_filter is None:
+                body.append(table_header)
         for line in v:
             output = "|"
             for o in table.order:
                 output += f" {{:<{widths[o]}}} |".format(getattr(line, o))
-            body = f"{body}{output}\n"
-    return f"{toc}{body}"
+            body.append(f"{output}\n")
+    if not multi_table and (body or row_filter is None):
+        body.insert(0, table_header)
+    return "".join(toc + body)
+
+
+def _line_to_yaml(line):
+    """Return a table line as a yaml list item."""
+    output = _outline_to_yaml(line.Description)
+    if line.Beat:
+        arcs = line.Arc.split(",")
+        beats = line.Beat.split(",")
+        arc_beats = []
+        for arc_beats_tuple in zip_longest(arcs, beats, fillvalue=""):
+            arc_beats.append(" ".join(arc_beats_tuple).strip())
+        return f"""- {output} ({", ".join(arc_beats)})\n"""
+    return f"- {output} ({line.Arc})\n"
+
+
+@timed()
+def get_yaml_from_table(table, filter_=None, row_filter=None):
+    """Return all the appropriate lines in yaml format."""
+    yaml_output = []
+    for _, v in _filter_groups(table, filter_):
+        for line in _filter_rows(v, row_filter):
+            yaml_output.append(_line_to_yaml(line))
+    return "".join(yaml_output)
 
 
-def get_yaml_from_table(table, filter_=None):
-    """Return all the appropriate lines in yaml format."""
-    yaml_output = ""
-    for k, v in sorted(table.parsed_lines.items()):
-        if filter_ and set(split_by_char(k, "/")).isdisjoint(set(filter_)):
-            continue
-        for line in v:
-            output = _outline_to_yaml(line.Description)
-            if line.Beat:
-                arcs = line.Arc.split(",")
-                beats = line.Beat.split(",")
-                arc_beats = []
-                for arc_beats_tuple in zip_longest(arcs, beats, fillvalue=""):
-                    arc_beats.append(" ".join(arc_beats_tuple).strip())
-                output = f"""- {output} ({", ".join(arc_beats)})\n"""
-            else:
-                output = f"- {output} ({line.Arc})\n"
-            yaml_output = f"{yaml_output}{output}"
-    return yaml_output
-
-
-def get_html_from_table(table, filter_=None, multi_table=False):
+@timed()
+def get_yaml_by_scene(table):
+    """Render every key's lines in yaml format once, for repeated `get_scene_yaml` lookups.
+
+    Returns a tuple of a dict of key to its (group position, yaml), and a dict of each `/`-split
+    part of a key to the keys containing it.
+    """
+    yaml_by_key = {}
+    keys_by_part = {}
+    for position, (k, v) in enumerate(table.sorted_groups()):
+        yaml_by_key[k] = (position, "".join(_line_to_yaml(line) for line in v))
+        for part in split_by_char(k, "/"):
+            keys_by_part.setdefault(part, []).append(k)
+    return yaml_by_key, keys_by_part
+
+
+def get_scene_yaml(yaml_by_scene, filter_):
+    """Return the same yaml as `get_yaml_from_table(table, filter_)`, from `get_yaml_by_scene`.
+
+    Returns None if no key matches `filter_`.
+    """
+    yaml_by_key, keys_by_part = yaml_by_scene
+    keys = set()
+    for part in filter_:
+        keys.update(keys_by_part.get(part, []))
+    if not keys:
+        return None
+    return "".join(yaml_by_key[k][1] for k in sorted(keys, key=lambda k: yaml_by_key[k][0]))
+
+
+@timed()
+def get_html_from_table(table, filter_=None, multi_table=False, row_filter=None):
     """Return all the appropriate lines in html format."""
     table_header = "<table><tr>\n"
     for o in table.order:
         table_header = f"{table_header}  <th>{o}</th>\n"
     table_header = f"{table_header}</tr>"
-    body = OUTLINE_HTML_HEADER
+    body = [OUTLINE_HTML_HEADER]
     if not multi_table:
-        body = f"{body}{table_header}\n"
-    for k, v in sorted(table.parsed_lines.items()):
-        if filter_:
-            filter_key = split_by_char(k, "/")
-            if set(filter_key).isdisjoint(set(filter_)):
-                continue
+        body.append(f"{table_header}\n")
+    for k, v in _filter_groups(table, filter_):
+        v = _filter_rows(v, row_filter)
+        if multi_table:
+            body.append(f"\n<h2>{k}</h2>\n")
+        if not v and row_filter is not None:
+            continue
         if multi_table:
-            body = f"{body}\n<h2>{k}</h2>\n{table_header}\n"
+            body.append(f"{table_header}\n")
 
         for line in v:
             output = "<tr>\n"
             for o in table.order:
-                output = f"{output}  <td>{re.sub(r' - ', '&mdash;', getattr(line, o))}</td>\n"
-            body = f"{body}{output}</tr>\n"
-        body = f"{body}</table>\n"
-    body = f"{body}</body></html>\n"
-    return body
+                output = f"{output}  <td>{getattr(line, o).replace(' - ', '&mdash;')}</td>\n"
+            body.append(f"{output}</tr>\n")
+        body.append("</table>\n")
+    body.append("</body></html>\n")
+    return "".join(body)
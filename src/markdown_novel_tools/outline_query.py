@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Query a parsed outline table with a `novel beats --where` expression.
+
+Queries are boolean expressions of column tests:
+
+    Arc=Judas and POV=Trinity
+    POV in (Neo, Trinity) and Scene=10..20
+    Beat~="^(Hook|Pinch)" and not Arc="The One"
+
+`Column=value` matches the value, or any of its `/`-separated parts, like `--filter` does.
+`Column in (a, b)` matches any of the values. `Column=low..high` matches the scene numbers between
+`low` and `high`, inclusive, where each bound is a chapter (`10`) or a chapter and scene (`10.2`).
+`Column~=regex` searches the value with a regex. Values with spaces or special characters need
+quotes.
+
+Each test runs once per distinct value in its column, not once per row. The grouped `--column`
+is answered straight from the table's groups; other columns get a value index built on first use.
+"""
+
+import re
+
+from markdown_novel_tools.constants import OUTLINE_SCENE_REGEX, WHERE_RANGE_REGEX, WHERE_TOKEN_REGEX
+from markdown_novel_tools.profiling import count, timed
+from markdown_novel_tools.utils import split_by_char
+
+
+# Parse {{{1
+def _tokenize(query):
+    """Split `query` into (kind, text) tokens."""
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        m = WHERE_TOKEN_REGEX.match(query, position)
+        if m is None:
+            raise ValueError(f"Can't parse query at {query[position:]!r}")
+        kind = m.lastgroup
+        text = m[kind]
+        if kind == "paren":
+            kind = text
+        elif kind == "word" and text.lower() in ("and", "or", "not", "in"):
+            kind = text.lower()
+        tokens.append((kind, text))
+        position = m.end()
+    return tokens
+
+
+def _scene_key(value):
+    """Return a scene number like `01.02` or `1.01.02` as a (chapter, scene) tuple, or None."""
+    m = OUTLINE_SCENE_REGEX.match(value)
+    if m is None:
+        return None
+    return (int(m["chapter_num"]), int(m["scene_num"]))
+
+
+def _range_key(value):
+    """Return a range bound like `10` or `10.2` as a tuple of ints."""
+    return tuple(int(part) for part in value.split("."))
+
+
+def _unquote(kind, text):
+    """Strip the quotes off a quoted token."""
+    return text[1:-1] if kind == "quoted" else text
+
+
+def parse_where(query):
+    """Parse `query` into a tree of tuples.
+
+    Nodes are `("or", left, right)`, `("and", left, right)`, `("not", node)`, `("eq", column,
+    value)`, `("in", column, values)`, `("range", column, low, high)` and `("regex", column,
+    compiled_regex)`.
+    """
+    tokens = _tokenize(query)
+    position = 0
+
+    def peek():
+        return tokens[position][0] if position < len(tokens) else None
+
+    def take(*kinds):
+        nonlocal position
+        if peek() not in kinds:
+            found = tokens[position][1] if position < len(tokens) else "the end of the query"
+            raise ValueError(f"Expected {' or '.join(kinds)} but found {found!r} in {query!r}")
+        position += 1
+        return tokens[position - 1]
+
+    def parse_or():
+        node = parse_and()
+        while peek() == "or":
+            take("or")
+            node = ("or", node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_not()
+        while peek() == "and":
+            take("and")
+            node = ("and", node, parse_not())
+        return node
+
+    def parse_not():
+        if peek() == "not":
+            take("not")
+            return ("not", parse_not())
+        if peek() == "(":
+            take("(")
+            node = parse_or()
+            take(")")
+            return node
+        column = take("word")[1]
+        if peek() == "in":
+            take("in")
+            take("(")
+            values = [take("word", "quoted")]
+            while peek() == ",":
+                take(",")
+                values.append(take("word", "quoted"))
+            take(")")
+            return ("in", column, tuple(_unquote(kind, text) for kind, text in values))
+        operator = take("op")[1]
+        kind, text = take("word", "quoted")
+        if operator == "~=":
+            try:
+                return ("regex", column, re.compile(_unquote(kind, text)))
+            except re.error as e:
+                raise ValueError(f"Bad regex {text!r} in {query!r}: {e}") from e
+        m = WHERE_RANGE_REGEX.match(text) if kind == "word" else None
+        if m is not None:
+            return ("range", column, _range_key(m["low"]), _range_key(m["high"]))
+        return ("eq", column, _unquote(kind, text))
+
+    if not tokens:
+        raise ValueError("Empty query!")
+    tree = parse_or()
+    if position != len(tokens):
+        raise ValueError(f"Unexpected {tokens[position][1]!r} in {query!r}")
+    return tree
+
+
+def where_columns(tree):
+    """Return the columns a parsed query tree tests, in order."""
+    if tree[0] in ("or", "and"):
+        columns = where_columns(tree[1])
+        return columns + [column for column in where_columns(tree[2]) if column not in columns]
+    if tree[0] == "not":
+        return where_columns(tree[1])
+    return [tree[1]]
+
+
+# Evaluate {{{1
+def _matches(tree, value):
+    """Return True if the column test `tree` matches the column `value`."""
+    kind = tree[0]
+    if kind == "eq":
+        return value == tree[2] or tree[2] in split_by_char(value, "/")
+    if kind == "in":
+        parts = split_by_char(value, "/")
+        return any(value == expected or expected in parts for expected in tree[2])
+    if kind == "range":
+        key = _scene_key(value)
+        if key is None:
+            return False
+        low, high = tree[2], tree[3]
+        return low <= key[: len(low)] and key[: len(high)] <= high
+    return tree[2].search(value) is not None
+
+
+def _value_index(table, column, indexes):
+    """Return a dict of each value of `column` to the table lines with that value."""
+    if column not in indexes:
+        if table.column and table.line_obj._fields[table.column] == column:
+            indexes[column] = table.parsed_lines
+        else:
+            index = {}
+            for lines in table.parsed_lines.values():
+                for line in lines:
+                    index.setdefault(getattr(line, column), []).append(line)
+            count("where rows indexed", table.line_count)
+            indexes[column] = index
+    return indexes[column]
+
+
+def _evaluate(table, tree, indexes, universe):
+    """Return the ids of the table lines matching the query node `tree`."""
+    kind = tree[0]
+    if kind == "or":
+        return _evaluate(table, tree[1], indexes, universe) | _evaluate(
+            table, tree[2], indexes, universe
+        )
+    if kind == "and":
+        left = _evaluate(table, tree[1], indexes, universe)
+        if not left:
+            return left
+        return left & _evaluate(table, tree[2], indexes, universe)
+    if kind == "not":
+        return universe() - _evaluate(table, tree[1], indexes, universe)
+    matches = set()
+    index = _value_index(table, tree[1], indexes)
+    count("where values tested", len(index))
+    for value, lines in index.items():
+        if _matches(tree, value):
+            matches.update(id(line) for line in lines)
+    return matches
+
+
+@timed()
+def where_filter(table, tree):
+    """Return a row filter for the lines of `table` matching the parsed query `tree`.
+
+    Lines are matched by identity, so the filter only applies to this table's own lines.
+    """
+    all_ids = None
+
+    def universe():
+        nonlocal all_ids
+        if all_ids is None:
+            all_ids = {id(line) for lines in table.parsed_lines.values() for line in lines}
+        return all_ids
+
+    selected = _evaluate(table, tree, {}, universe)
+
+    def row_filter(line):
+        return id(line) in selected
+
+    return row_filter
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""markdown-novel-tools pandoc worker.
+
+Send many small pandoc conversions, like the epub chapters when Python-Markdown isn't installed,
+to one long-lived `pandoc-server` on a local port, instead of starting a new pandoc process for
+each. The server is started on first use and stopped at exit. If it isn't installed, won't start,
+or can't handle a conversion, we fall back to a one-shot `pandoc` subprocess.
+
+Whole-book conversions still run `pandoc` directly: starting the server would cost as much, and
+`pandoc-server` can't read the stylesheets and images they need from disk, or run a pdf engine.
+"""
+
+import atexit
+import base64
+import json
+import shutil
+import socket
+import subprocess
+import threading
+import time
+import urllib.request
+
+from markdown_novel_tools.constants import (
+    PANDOC_BINARY_FORMATS,
+    PANDOC_SERVER_START_TIMEOUT,
+    PANDOC_SERVER_TIMEOUT,
+)
+from markdown_novel_tools.profiling import count, span, timed
+
+
+def _b64encode(contents):
+    """Return the bytes `contents` as a base64 str."""
+    return base64.b64encode(contents).decode("ascii")
+
+
+def pandoc_option_args(options):
+    """Return the pandoc command line args for the pandoc-server `options` dict.
+
+    True is a bare flag, False and None are skipped, and each item of a list is its own arg.
+    """
+    args = []
+    for key, value in (options or {}).items():
+        if value is True:
+            args.append(f"--{key}")
+        elif isinstance(value, (list, tuple)):
+            args.extend(f"--{key}={item}" for item in value)
+        elif value is not None and value is not False:
+            args.append(f"--{key}={value}")
+    return args
+
+
+class PandocServer:
+    """A `pandoc-server` process listening on a local port."""
+
+    def __init__(self, cmd):
+        self.cmd = list(cmd)
+        self.port = None
+        self._proc = None
+
+    @property
+    def running(self):
+        """True if the server process is still alive."""
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self, timeout=PANDOC_SERVER_START_TIMEOUT):
+        """Start the server, and return True once it's listening, or False if it never does."""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        cmd = [*self.cmd, "--port", str(self.port), "--timeout", str(PANDOC_SERVER_TIMEOUT)]
+        with span("pandoc-server start"):
+            count("subprocesses")
+            try:
+                self._proc = subprocess.Popen(
+                    cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+            except OSError:
+                return False
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline and self.running:
+                try:
+                    with socket.create_connection(("127.0.0.1", self.port), timeout=0.1):
+                        return True
+                except OSError:
+                    time.sleep(0.02)
+        self.stop()
+        return False
+
+    def stop(self):
+        """Stop the server, if it's running."""
+        if self.running:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+                self._proc.wait()
+        self._proc = None
+
+    @timed("pandoc_backend.server_convert")
+    def convert(self, text, from_, to, options=None):
+        """Convert `text` from `from_` to `to`, and return the output.
+
+        `text` and the output are bytes for binary formats, like docx and epub. `options` are
+        pandoc-server options, like `{"columns": 80}`.
+        """
+        payload = dict(options or {})
+        payload["from"] = from_
+        payload["to"] = to
+        payload["text"] = _b64encode(text) if from_ in PANDOC_BINARY_FORMATS else text
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{self.port}/",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json", "Accept": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=PANDOC_SERVER_TIMEOUT) as response:
+            result = json.loads(response.read())
+        count("pandoc server conversions")
+        if result.get("base64"):
+            return base64.b64decode(result["output"])
+        # Unlike pandoc, pandoc-server leaves off the final newline.
+        output = result["output"]
+        return output if output.endswith("\n") else f"{output}\n"
+
+
+def pandoc_server_cmd():
+    """Return the command that starts `pandoc-server`, or None if pandoc isn't installed."""
+    if shutil.which("pandoc-server"):
+        return ["pandoc-server"]
+    if shutil.which("pandoc"):
+        # pandoc 3 runs as a server when its first argument is `server`.
+        return ["pandoc", "server"]
+    return None
+
+
+def use_pandoc_server(config):
+    """Return True if pandoc should run as a server, per `convert.pandoc_engine` in `config`.
+
+    `auto` uses the server when it starts; `subprocess` always runs pandoc per document.
+    """
+    engine = config["convert"].get("pandoc_engine", "auto")
+    if engine not in ("auto", "subprocess"):
+        raise ValueError(f"Unknown convert.pandoc_engine {engine}!")
+    return engine == "auto"
+
+
+# False once starting the server has failed, so we only try once.
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_pandoc_server(config):
+    """Return the shared, running PandocServer, starting it on first use.
+
+    Returns None if `config` doesn't want one, or it isn't available.
+    """
+    global _server
+    if not use_pandoc_server(config):
+        return None
+    with _server_lock:
+        if _server is None:
+            cmd = pandoc_server_cmd()
+            server = PandocServer(cmd) if cmd else None
+            if server is not None and server.start():
+                atexit.register(server.stop)
+                _server = server
+            else:
+                _server = False
+        if _server is False or not _server.running:
+            return None
+        return _server
+
+
+def run_pandoc(text, from_, to, options=None):
+    """Convert `text` from `from_` to `to` with a one-shot `pandoc` process, and return the output.
+
+    Takes and returns the same types as PandocServer.convert.
+    """
+    cmd = ["pandoc", f"--from={from_}", f"--to={to}", *pandoc_option_args(options)]
+    with span("subprocess pandoc"):
+        count("subprocesses")
+        result = subprocess.run(
+            cmd,
+            input=text if from_ in PANDOC_BINARY_FORMATS else text.encode("utf-8"),
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+    if to in PANDOC_BINARY_FORMATS:
+        return result.stdout
+    return result.stdout.decode("utf-8")
+
+
+def pandoc_convert(config, text, from_, to, options=None):
+    """Convert `text` from `from_` to `to` through the pandoc server, or a one-shot pandoc.
+
+    See PandocServer.convert for the arguments.
+    """
+    server = get_pandoc_server(config)
+    if server is not None:
+        try:
+            return server.convert(text, from_, to, options=options)
+        except (OSError, ValueError, KeyError):
+            # Connection and http errors are OSErrors; a bad reply is a ValueError or KeyError.
+            # Either way, pandoc itself will do the conversion, or report the error properly.
+            count("pandoc server fallbacks")
+    return run_pandoc(text, from_, to, options=options)
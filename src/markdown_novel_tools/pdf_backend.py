@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""markdown-novel-tools in-process pdf rendering.
+
+Render markdown and html documents to pdf with WeasyPrint in this process, keeping the parsed
+stylesheets and the font configuration warm between documents, instead of paying for a
+`pandoc --pdf-engine=weasyprint` process per document. If WeasyPrint or Python-Markdown isn't
+installed, `HAS_WEASYPRINT` is False and callers fall back to pandoc.
+"""
+
+import threading
+from html import escape
+from pathlib import Path
+
+from markdown_novel_tools.mdfile import get_frontmatter_and_body
+from markdown_novel_tools.profiling import count, timed
+from markdown_novel_tools.yaml_backend import YAMLError, load_yaml
+
+try:
+    import markdown
+    from weasyprint import CSS, HTML
+    from weasyprint.text.fonts import FontConfiguration
+
+    HAS_WEASYPRINT = True
+except (ImportError, OSError):
+    # WeasyPrint raises OSError if it can't load pango.
+    HAS_WEASYPRINT = False
+
+# `smarty` curls quotes and turns `--` and `---` into dashes, like pandoc's default `smart`.
+MARKDOWN_EXTENSIONS = ("extra", "sane_lists", "smarty", "toc")
+
+# The pandoc metadata fields to render in the title block, and their html tags.
+TITLE_BLOCK_FIELDS = (("title", "h1"), ("subtitle", "p"), ("author", "p"), ("date", "p"))
+
+
+def _title_block(metadata):
+    """Return the pandoc-style title block html for the `metadata` dict."""
+    parts = []
+    for field, tag in TITLE_BLOCK_FIELDS:
+        values = metadata.get(field)
+        if not values:
+            continue
+        if not isinstance(values, list):
+            values = [values]
+        for value in values:
+            parts.append(f'<{tag} class="{field}">{escape(str(value))}</{tag}>\n')
+    if not parts:
+        return ""
+    return f'<header id="title-block-header">\n{"".join(parts)}</header>\n'
+
+
+class PdfRenderer:
+    """A warm WeasyPrint engine.
+
+    The font configuration and each parsed stylesheet are kept for the life of the renderer, so
+    only the first document pays for loading them. Renders are serialized, since WeasyPrint
+    isn't thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._font_config = FontConfiguration()
+        self._stylesheets = {}
+        self._markdown = markdown.Markdown(extensions=list(MARKDOWN_EXTENSIONS))
+
+    def get_stylesheet(self, css_path):
+        """Return the parsed stylesheet at `css_path`, parsing it only once."""
+        css_path = str(css_path)
+        if css_path not in self._stylesheets:
+            count("pdf stylesheets parsed")
+            self._stylesheets[css_path] = CSS(filename=css_path, font_config=self._font_config)
+        return self._stylesheets[css_path]
+
+    def markdown_to_html(self, contents, toc=False):
+        """Return `contents`, markdown with optional pandoc yaml metadata, as an html document."""
+        frontmatter, body = get_frontmatter_and_body(contents)
+        metadata = {}
+        if frontmatter:
+            try:
+                metadata = load_yaml(frontmatter) or {}
+            except YAMLError:
+                metadata = {}
+            if not isinstance(metadata, dict):
+                metadata = {}
+        self._markdown.reset()
+        html_body = self._markdown.convert(body)
+        if toc:
+            html_body = f'<nav id="TOC" role="doc-toc">\n{self._markdown.toc}</nav>\n{html_body}'
+        title = escape(str(metadata.get("title", "")))
+        return (
+            '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+            f"<title>{title}</title>\n</head>\n<body>\n"
+            f"{_title_block(metadata)}{html_body}\n</body>\n</html>\n"
+        )
+
+    @timed("pdf_backend.render")
+    def render(self, from_, output_pdf, css_path, toc=False):
+        """Render the markdown or html file `from_` to `output_pdf`, styled by `css_path`.
+
+        `toc` only applies to markdown; html is rendered as is.
+        """
+        from_ = Path(from_)
+        with open(from_, encoding="utf-8") as fh:
+            contents = fh.read()
+        with self._lock:
+            if from_.suffix.lower() not in (".html", ".htm"):
+                contents = self.markdown_to_html(contents, toc=toc)
+            HTML(string=contents, base_url=str(from_.parent)).write_pdf(
+                str(output_pdf),
+                stylesheets=[self.get_stylesheet(css_path)],
+                font_config=self._font_config,
+            )
+        count("pdfs rendered")
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_pdf_renderer():
+    """Return the shared PdfRenderer, creating it on first use."""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = PdfRenderer()
+        return _renderer
+
+
+def use_pdf_renderer(config):
+    """Return True if pdfs should be rendered in-process, per `convert.pdf_engine` in `config`.
+
+    `auto` renders in-process when WeasyPrint is available; `pandoc` always uses pandoc.
+    """
+    engine = config["convert"].get("pdf_engine", "auto")
+    if engine not in ("auto", "pandoc"):
+        raise ValueError(f"Unknown convert.pdf_engine {engine}!")
+    return engine == "auto" and HAS_WEASYPRINT
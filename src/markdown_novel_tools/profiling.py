@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""markdown-novel-tools instrumentation.
+
+Named timing spans and counters for the hot paths. Profiling is off by default, and the spans and
+counters are close to free until `--profile` turns it on.
+"""
+
+import functools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+_NULL_SPAN = nullcontext()
+
+
+class Profiler:
+    """Collect timing spans and counters."""
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self.counters = Counter()
+        self._origin = time.perf_counter_ns()
+        self._lock = threading.Lock()
+
+    def enable(self):
+        """Start collecting."""
+        self.enabled = True
+        self._origin = time.perf_counter_ns()
+
+    def reset(self):
+        """Drop everything collected so far, and stop collecting."""
+        self.enabled = False
+        self.spans = []
+        self.counters = Counter()
+
+    def span(self, name):
+        """Return a context manager timing `name`."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def count(self, name, value=1):
+        """Add `value` to the counter `name`."""
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += value
+
+    def record(self, name, start, end):
+        """Record a span from `start` to `end`, in `time.perf_counter_ns()` nanoseconds."""
+        with self._lock:
+            self.spans.append((name, start, end, threading.get_ident()))
+
+    def report(self):
+        """Return a report of the spans, sorted by total time, and the counters."""
+        totals = {}
+        for name, start, end, _ in self.spans:
+            calls, total, longest = totals.get(name, (0, 0, 0))
+            duration = end - start
+            totals[name] = (calls + 1, total + duration, max(longest, duration))
+        lines = [f"{'span':<48} {'calls':>7} {'total ms':>10} {'mean ms':>9} {'max ms':>9}"]
+        for name, (calls, total, longest) in sorted(
+            totals.items(), key=lambda item: item[1][1], reverse=True
+        ):
+            lines.append(
+                f"{name:<48} {calls:>7} {total / 1e6:>10.1f} {total / calls / 1e6:>9.2f} "
+                f"{longest / 1e6:>9.2f}"
+            )
+        if self.counters:
+            lines.append("")
+            lines.append(f"{'counter':<48} {'value':>7}")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name:<48} {value:>7}")
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        """Return the spans and counters in Chrome trace-event format."""
+        pid = os.getpid()
+        events = []
+        for name, start, end, tid in self.spans:
+            events.append(
+                {
+                    "name": name,
+                    "cat": name.split(".")[0].split(" ")[0],
+                    "ph": "X",
+                    "ts": (start - self._origin) / 1000,
+                    "dur": (end - start) / 1000,
+                    "pid": pid,
+                    "tid": tid,
+                }
+            )
+        if self.counters:
+            end = max([span[2] for span in self.spans], default=self._origin)
+            events.append(
+                {
+                    "name": "counters",
+                    "ph": "C",
+                    "ts": (end - self._origin) / 1000,
+                    "pid": pid,
+                    "args": dict(self.counters),
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+class _Span:
+    """A context manager recording a single span."""
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.start, time.perf_counter_ns())
+
+
+PROFILER = Profiler()
+
+
+def span(name):
+    """Return a context manager timing `name`."""
+    return PROFILER.span(name)
+
+
+def count(name, value=1):
+    """Add `value` to the counter `name`."""
+    PROFILER.count(name, value)
+
+
+def timed(name=None):
+    """Decorate a function to time each call as a span.
+
+    The span name defaults to `module.function`, without the package prefix.
+    """
+
+    def decorator(func):
+        span_name = name or f"{func.__module__.split('.')[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            with _Span(PROFILER, span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def check_call(cmd, **kwargs):
+    """`subprocess.check_call`, timed as a `subprocess <command>` span."""
+    with span(f"subprocess {os.path.basename(str(cmd[0]))}"):
+        count("subprocesses")
+        return subprocess.check_call(cmd, **kwargs)
+
+
+def add_profile_parser_args(parser):
+    """Add the global profiling args."""
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print a report of where the time went to stderr.",
+    )
+    parser.add_argument(
+        "--profile-output",
+        help="Write a Chrome trace-event json file of where the time went, instead of a report.",
+    )
+
+
+def run_func(args):
+    """Run `args.func(args)`, profiling it if requested."""
+    if not (args.profile or args.profile_output):
+        args.func(args)
+        return
+    PROFILER.enable()
+    try:
+        with span(args.func.__name__):
+            args.func(args)
+    finally:
+        if args.profile_output:
+            with open(args.profile_output, "w", encoding="utf-8") as fh:
+                json.dump(PROFILER.chrome_trace(), fh)
+        else:
+            print(PROFILER.report(), file=sys.stderr)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Query frontmatter through a persistent inverted index.
+
+The index maps each frontmatter field and value to the files that have it, and remembers each
+file's mtime and size, so only the files that changed since the last query get re-parsed.
+
+Queries are boolean expressions of field tests:
+
+    characters=Alice and not pov=Alice
+    (locations^=Old or locations=Harbor) and todo
+
+`field=value` matches a value exactly, `field^=value` matches a value prefix, and a bare `field`
+matches files where the field has any value. Values may be quoted, and `[[ ]]` and `#` are ignored
+on both sides, so `characters=Alice` matches `[[Alice]]`.
+"""
+
+import json
+import os
+from bisect import bisect_left
+
+from markdown_novel_tools.constants import QUERY_TOKEN_REGEX
+from markdown_novel_tools.mdfile import get_markdown_file
+from markdown_novel_tools.profiling import count, timed
+from markdown_novel_tools.utils import unwikilink
+from markdown_novel_tools.yaml_backend import YAMLError, load_yaml
+
+# Bump this when the index format changes.
+QUERY_INDEX_VERSION = 1
+
+
+# Index {{{1
+def new_query_index():
+    """Return an empty index."""
+    return {"files": {}, "postings": {}}
+
+
+def load_query_index(path):
+    """Load the index at `path`, or return an empty one if it's missing, broken, or outdated."""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            contents = json.load(fh)
+    except (OSError, ValueError):
+        return new_query_index()
+    if not isinstance(contents, dict) or contents.get("version") != QUERY_INDEX_VERSION:
+        return new_query_index()
+    postings = {}
+    for field, values in contents["postings"].items():
+        postings[field] = {value: set(paths) for value, paths in values.items()}
+    return {"files": contents["files"], "postings": postings}
+
+
+def save_query_index(path, index):
+    """Write `index` to `path`."""
+    postings = {}
+    for field, values in index["postings"].items():
+        postings[field] = {value: sorted(paths) for value, paths in values.items()}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(
+            {"version": QUERY_INDEX_VERSION, "files": index["files"], "postings": postings}, fh
+        )
+    os.replace(tmp_path, path)
+
+
+def normalize_value(value):
+    """Return the form of `value` we index and match on."""
+    return unwikilink(str(value)).strip()
+
+
+def _field_values(parsed_yaml):
+    """Return a dict of field to a list of string values, skipping empty values."""
+    fields = {}
+    for field, value in parsed_yaml.items():
+        if value is None:
+            continue
+        if not isinstance(value, (list, tuple)):
+            value = [value]
+        values = [
+            item if isinstance(item, str) else str(item) for item in value if item is not None
+        ]
+        if values:
+            fields[str(field)] = values
+    return fields
+
+
+def _read_fields(path):
+    """Return the frontmatter fields of `path`, or None if it has no usable frontmatter."""
+    markdown_file = get_markdown_file(path)
+    try:
+        parsed_yaml = load_yaml(markdown_file.yaml)
+    except YAMLError:
+        return None
+    if not isinstance(parsed_yaml, dict):
+        return None
+    return _field_values(parsed_yaml)
+
+
+def _unindex(index, key):
+    """Remove the postings for the file `key`."""
+    entry = index["files"].pop(key, None)
+    if not entry or entry["fields"] is None:
+        return
+    for field, values in entry["fields"].items():
+        postings = index["postings"].get(field, {})
+        for value in values:
+            paths = postings.get(normalize_value(value))
+            if paths is not None:
+                paths.discard(key)
+                if not paths:
+                    del postings[normalize_value(value)]
+        if not postings:
+            index["postings"].pop(field, None)
+
+
+@timed()
+def update_query_index(index, paths):
+    """Re-index any of `paths` that changed, and drop the files that no longer exist.
+
+    Returns the set of index keys for `paths`, and whether the index changed.
+    """
+    keys = set()
+    changed = False
+    for path in paths:
+        key = os.path.abspath(path)
+        keys.add(key)
+        stat = os.stat(path)
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        entry = index["files"].get(key)
+        if entry is not None and entry["stamp"] == stamp:
+            continue
+        count("query index updates")
+        changed = True
+        _unindex(index, key)
+        fields = _read_fields(path)
+        index["files"][key] = {"stamp": stamp, "fields": fields}
+        for field, values in (fields or {}).items():
+            postings = index["postings"].setdefault(field, {})
+            for value in values:
+                postings.setdefault(normalize_value(value), set()).add(key)
+    for key in [key for key in index["files"] if key not in keys and not os.path.exists(key)]:
+        changed = True
+        _unindex(index, key)
+    return keys, changed
+
+
+# Query {{{1
+def _tokenize(query):
+    """Split `query` into (kind, text) tokens."""
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        m = QUERY_TOKEN_REGEX.match(query, position)
+        if m is None:
+            raise ValueError(f"Can't parse query at {query[position:]!r}")
+        kind = m.lastgroup
+        text = m[kind]
+        if kind == "paren":
+            kind = text
+        elif kind == "quoted":
+            kind, text = "word", text[1:-1]
+        elif kind == "word" and text.lower() in ("and", "or", "not"):
+            kind = text.lower()
+        tokens.append((kind, text))
+        position = m.end()
+    return tokens
+
+
+def parse_query(query):
+    """Parse `query` into a tree of tuples.
+
+    Nodes are `("or", left, right)`, `("and", left, right)`, `("not", node)`, `("eq", field,
+    value)`, `("prefix", field, value)` and `("has", field)`.
+    """
+    tokens = _tokenize(query)
+    position = 0
+
+    def peek():
+        return tokens[position][0] if position < len(tokens) else None
+
+    def take(kind):
+        nonlocal position
+        if peek() != kind:
+            found = tokens[position][1] if position < len(tokens) else "the end of the query"
+            raise ValueError(f"Expected {kind} but found {found!r} in {query!r}")
+        position += 1
+        return tokens[position - 1][1]
+
+    def parse_or():
+        node = parse_and()
+        while peek() == "or":
+            take("or")
+            node = ("or", node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_not()
+        while peek() == "and":
+            take("and")
+            node = ("and", node, parse_not())
+        return node
+
+    def parse_not():
+        if peek() == "not":
+            take("not")
+            return ("not", parse_not())
+        if peek() == "(":
+            take("(")
+            node = parse_or()
+            take(")")
+            return node
+        field = take("word")
+        if peek() == "op":
+            operator = take("op")
+            value = normalize_value(take("word"))
+            return ("eq" if operator == "=" else "prefix", field, value)
+        return ("has", field)
+
+    if not tokens:
+        raise ValueError("Empty query!")
+    tree = parse_or()
+    if position != len(tokens):
+        raise ValueError(f"Unexpected {tokens[position][1]!r} in {query!r}")
+    return tree
+
+
+def _prefix_matches(postings, prefix):
+    """Return the files with a value starting with `prefix`."""
+    values = sorted(postings)
+    matches = set()
+    for value in values[bisect_left(values, prefix) :]:
+        if not value.startswith(prefix):
+            break
+        matches.update(postings[value])
+    return matches
+
+
+def _evaluate(index, tree, universe):
+    """Return the set of files in `universe` matching the query node `tree`."""
+    kind = tree[0]
+    if kind == "or":
+        return _evaluate(index, tree[1], universe) | _evaluate(index, tree[2], universe)
+    if kind == "and":
+        left = _evaluate(index, tree[1], universe)
+        if not left:
+            return left
+        return left & _evaluate(index, tree[2], universe)
+    if kind == "not":
+        return universe - _evaluate(index, tree[1], universe)
+    postings = index["postings"].get(tree[1], {})
+    if kind == "eq":
+        matches = postings.get(tree[2], set())
+    elif kind == "prefix":
+        matches = _prefix_matches(postings, tree[2])
+    else:
+        matches = set().union(*postings.values())
+    return universe & matches
+
+
+@timed()
+def run_query(index, tree, universe):
+    """Return the set of files in `universe` matching the parsed query `tree`."""
+    return _evaluate(index, tree, universe)
+
+
+def query_fields(tree):
+    """Return the fields a parsed query tree tests, in order."""
+    if tree[0] in ("or", "and"):
+        fields = query_fields(tree[1])
+        return fields + [field for field in query_fields(tree[2]) if field not in fields]
+    if tree[0] == "not":
+        return query_fields(tree[1])
+    return [tree[1]]
@@ -3,12 +3,12 @@
 
 import os
 import platform
-import subprocess
 import time
 from pathlib import Path
 
 from git import Repo
 
+from markdown_novel_tools.profiling import check_call
 from markdown_novel_tools.utils import find_files_by_content, find_files_by_name, local_time
 
 
@@ -40,10 +40,10 @@ def replace(args):
         else:
             sed = "sed"
         for _file in content_files:
-            subprocess.check_call([sed, "-e", f"s%{args.from_}%{args.to}%g", "-i", _file])
+            check_call([sed, "-e", f"s%{args.from_}%{args.to}%g", "-i", _file])
     name_files = find_files_by_name(args.config, args.from_)
     print("\n".join(name_files))
     if not args.list:
         for _file in name_files:
             to_file = _file.replace(args.from_, args.to)
-            subprocess.check_call(["git", "mv", _file, to_file])
+            check_call(["git", "mv", _file, to_file])
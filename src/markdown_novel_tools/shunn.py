@@ -1,44 +1,148 @@
 #!/usr/bin/env python3
 """Convert between markdown and editor-submission formatted docx."""
 
-import glob
 import os
 import shutil
 import subprocess
+import sys
 import tempfile
 from pathlib import Path
 
-from git import Repo
+from git import GitCommandError, InvalidGitRepositoryError, NoSuchPathError, Repo
 
+from markdown_novel_tools.config import get_cache_dir
+from markdown_novel_tools.constants import SCENE_SPLIT_REGEX, SHUNN_REPO_FILES
 from markdown_novel_tools.convert import convert_chapter, get_output_basestr
+from markdown_novel_tools.profiling import check_call, count, span, timed
 
 
+def _checkout_rev(repo, rev, url):
+    """Check out `rev` in `repo`, fetching from `url` if we don't have it yet."""
+    try:
+        repo.git.checkout("--detach", rev)
+    except GitCommandError:
+        repo.git.fetch(url, "+refs/heads/*:refs/remotes/origin/*", "--tags")
+        repo.git.checkout("--detach", rev)
+
+
+def _open_cached_shunn_repo(repo_path):
+    """Return the cached checkout at `repo_path`, or None if it's missing or damaged.
+
+    Local edits are undone. A checkout without a head commit or the template files, e.g. from an
+    interrupted clone, counts as damaged.
+    """
+    try:
+        repo = Repo(repo_path)
+        if not repo.head.is_valid():
+            return None
+        if repo.is_dirty():
+            repo.git.reset("--hard")
+    except (InvalidGitRepositoryError, NoSuchPathError, GitCommandError):
+        return None
+    if not all((repo_path / path).is_file() for path in SHUNN_REPO_FILES):
+        return None
+    return repo
+
+
+@timed()
+def get_shunn_repo(config):
+    """Return the path to a pandoc-templates checkout.
+
+    If `shunn_repo_path` is set, use it as is. Otherwise keep a checkout in the cache dir, cloned
+    from `shunn_repo_mirror` if set, or `shunn_repo_url`, and reuse it across runs; it's cloned
+    again if it's damaged. The checkout is only updated when `shunn_repo_rev` is set, to the
+    commit it pins.
+    """
+    convert_config = config["convert"]
+    if convert_config["shunn_repo_path"] is not None:
+        return Path(os.path.expanduser(convert_config["shunn_repo_path"]))
+    url = convert_config.get("shunn_repo_mirror") or convert_config["shunn_repo_url"]
+    rev = convert_config.get("shunn_repo_rev")
+    cache_dir = get_cache_dir(config, "shunn")
+    repo_path = cache_dir / "pandoc-templates"
+    repo = _open_cached_shunn_repo(repo_path)
+    if repo is None:
+        if os.path.exists(repo_path):
+            shutil.rmtree(repo_path)
+        with tempfile.TemporaryDirectory(dir=cache_dir) as d:
+            Repo.clone_from(url=os.path.expanduser(url), to_path=Path(d) / "repo")
+            os.rename(Path(d) / "repo", repo_path)
+        repo = Repo(repo_path)
+    if rev is not None and not repo.head.commit.hexsha.startswith(rev):
+        try:
+            _checkout_rev(repo, rev, os.path.expanduser(url))
+        except GitCommandError as e:
+            print(f"Can't check out shunn_repo_rev {rev} in {repo_path}!\n{e}", file=sys.stderr)
+            sys.exit(1)
+    return repo_path
+
+
+@timed()
 def shunn_docx(args):
     """Convert markdown file(s) to a Shunn novel docx suitable for submission to an editor"""
-    repo_path = args.config["convert"]["shunn_repo_path"]
     artifact_dir = Path(args.artifact_dir)
     output_basestr = get_output_basestr(args)
     to = artifact_dir / f"{output_basestr}.docx"
 
-    convert_chapter(args, output_basestr=output_basestr)
-
-    with tempfile.TemporaryDirectory() as d:
-        if repo_path is None:
-            repo_path = Path(d) / "repo"
-            Repo.clone_from(url=args.config["convert"]["shunn_repo_url"], to_path=repo_path)
-        else:
-            repo_path = Path(os.path.expanduser(repo_path))
-        cmd = [
-            repo_path / "bin" / "md2long.sh",
-            "--output",
-            to,
-            "--overwrite",
-            "--modern",
-        ]
-        cmd.extend(sorted(artifact_dir.glob("*.md")))
-        subprocess.check_call(cmd)
+    chapter_paths = convert_chapter(args, output_basestr=output_basestr)
+
+    repo_path = get_shunn_repo(args.config)
+    cmd = [
+        repo_path / "bin" / "md2long.sh",
+        "--output",
+        to,
+        "--overwrite",
+        "--modern",
+    ]
+    cmd.extend(chapter_paths)
+    check_call(cmd)
+
+
+def _chapter_path(artifact_dir, chapter, scene=None):
+    """Return the path of a `shunn_md` chapter, or chapter scene, file."""
+    if scene is None:
+        return artifact_dir / f"chapter{str(chapter).zfill(3)}.md"
+    return artifact_dir / f"chapter{str(chapter).zfill(3)}-scene{str(scene).zfill(3)}.md"
+
+
+@timed()
+def split_markdown_chapters(lines, artifact_dir, split_scenes=False):
+    """Write each chapter in the markdown `lines` to its own file, as the lines arrive.
+
+    A chapter starts at each `# ` heading. If `split_scenes`, each chapter is further split into
+    scene files at the lines matching SCENE_SPLIT_REGEX, which are dropped.
+
+    Returns the list of paths written.
+    """
+    artifact_dir = Path(artifact_dir)
+    chapter = 1
+    scene = 1 if split_scenes else None
+    paths = [_chapter_path(artifact_dir, chapter, scene)]
+    fh = open(paths[-1], "w", encoding="utf-8")
+    has_contents = False
+    try:
+        for line in lines:
+            if line.startswith("# ") and has_contents:
+                chapter += 1
+                scene = 1 if split_scenes else None
+            elif split_scenes and SCENE_SPLIT_REGEX.match(line):
+                scene += 1
+                line = ""
+            else:
+                fh.write(line)
+                has_contents = True
+                continue
+            fh.close()
+            paths.append(_chapter_path(artifact_dir, chapter, scene))
+            fh = open(paths[-1], "w", encoding="utf-8")
+            fh.write(line)
+            has_contents = bool(line)
+    finally:
+        fh.close()
+    return paths
 
 
+@timed()
 def shunn_md(args):
     """Convert a docx file to markdown files."""
     artifact_dir = Path(args.artifact_dir)
@@ -47,27 +151,19 @@ def shunn_md(args):
     if not os.path.exists(artifact_dir):
         os.mkdir(artifact_dir)
 
-    with tempfile.TemporaryDirectory() as d:
-        tmpfile = Path(d) / "temp.md"
-        cmd = [
-            "pandoc",
-            "--from=docx",
-            "--to=markdown_strict",
-            "--columns=80",
-            f"--output={tmpfile}",
-            args.filename[0],
-        ]
-        subprocess.check_call(cmd)
-
-        with open(tmpfile) as from_fh:
-            count = 1
-            contents = ""
-            for line in from_fh.readlines():
-                if line.startswith("# ") and contents:
-                    with open(artifact_dir / f"chapter{str(count).zfill(3)}.md", "w") as fh:
-                        fh.write(contents)
-                    contents = ""
-                    count += 1
-                contents += line
-            with open(artifact_dir / f"chapter{str(count).zfill(3)}.md", "w") as fh:
-                fh.write(contents)
+    cmd = [
+        "pandoc",
+        "--from=docx",
+        "--to=markdown_strict",
+        "--columns=80",
+        args.filename[0],
+    ]
+    # Split pandoc's output into chapters as it streams in, rather than through a temp file.
+    with span("subprocess pandoc"):
+        count("subprocesses")
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, encoding="utf-8") as proc:
+            split_markdown_chapters(
+                proc.stdout, artifact_dir, split_scenes=getattr(args, "split_scenes", False)
+            )
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
@@ -9,16 +9,25 @@ from difflib import unified_diff
 from pathlib import Path
 
 import pytz
-import yaml
 from git import Repo
 
+from markdown_novel_tools.constants import LEADING_SYMBOL_WORD_REGEX, SYMBOL_WORD_REGEX
+from markdown_novel_tools.profiling import timed
+from markdown_novel_tools.yaml_backend import MAX_WIDTH, dump_yaml
 
-def represent_none(self, _):
-    """Don't print `null` for None in yaml strings."""
-    return self.represent_scalar("tag:yaml.org,2002:null", "")
 
+@timed()
+def count_words(text):
+    """Count the words in `text`, skipping any symbol-only words.
 
-yaml.add_representer(type(None), represent_none)
+    This is equivalent to counting the whitespace-delimited words that match `ALPHANUM_REGEX`, but
+    scans the whole text at once instead of searching each word. Symbol-only words are rare, so we
+    count all the words and subtract those.
+    """
+    symbol_words = len(SYMBOL_WORD_REGEX.findall(text))
+    if LEADING_SYMBOL_WORD_REGEX.match(text):
+        symbol_words += 1
+    return len(text.split()) - symbol_words
 
 
 def diff_yaml(from_yaml, to_yaml, from_name="from", to_name="to", verbose=False):
@@ -191,10 +200,10 @@ def unwikilink(string, remove=("[[", "]]", "#")):
 def yaml_string(yaml_object):
     """Return a yaml formatted string from the yaml object."""
 
-    return yaml.dump(
+    return dump_yaml(
         yaml_object,
         default_flow_style=False,
-        width=float("inf"),
+        width=MAX_WIDTH,
         sort_keys=False,
         allow_unicode=True,
     )
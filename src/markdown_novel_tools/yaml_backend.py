@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""markdown-novel-tools yaml loading and dumping.
+
+Use libyaml's `CSafeLoader` and `CSafeDumper` when PyYAML was built with libyaml, and fall back to
+the pure python `SafeLoader` and `SafeDumper` otherwise. Data the safe dumpers can't represent,
+like an `OrderedDict` or a `Counter`, is dumped with the full `yaml.Dumper` instead.
+"""
+
+import yaml
+
+from markdown_novel_tools.profiling import timed
+
+try:
+    from yaml import CSafeDumper as _FastDumper
+    from yaml import CSafeLoader as _FastLoader
+
+    HAS_LIBYAML = True
+except ImportError:
+    from yaml import SafeDumper as _FastDumper
+    from yaml import SafeLoader as _FastLoader
+
+    HAS_LIBYAML = False
+
+YAMLError = yaml.YAMLError
+
+# libyaml needs an int line width; this is effectively infinite.
+MAX_WIDTH = 2**31 - 1
+
+
+def represent_none(self, _):
+    """Don't print `null` for None in yaml strings."""
+    return self.represent_scalar("tag:yaml.org,2002:null", "")
+
+
+class Dumper(_FastDumper):
+    """The fastest available safe dumper, with our representers."""
+
+
+class PureDumper(yaml.SafeDumper):
+    """The pure python safe dumper, with our representers."""
+
+
+class FullDumper(yaml.Dumper):
+    """The full dumper, which can represent python objects, with our representers."""
+
+
+Loader = _FastLoader
+PureLoader = yaml.SafeLoader
+
+for _dumper in (Dumper, PureDumper, FullDumper):
+    _dumper.add_representer(type(None), represent_none)
+
+
+@timed("yaml.load")
+def load_yaml(stream, pure=False):
+    """Parse the yaml in `stream`, a string or file object.
+
+    If `pure`, use the pure python loader even if libyaml is available.
+    """
+    return yaml.load(stream, Loader=PureLoader if pure else Loader)
+
+
+@timed("yaml.dump")
+def dump_yaml(data, pure=False, **kwargs):
+    """Return `data` dumped to a yaml string.
+
+    If `pure`, use the pure python dumper even if libyaml is available.
+    """
+    try:
+        return yaml.dump(data, Dumper=PureDumper if pure else Dumper, **kwargs)
+    except yaml.representer.RepresenterError:
+        return yaml.dump(data, Dumper=FullDumper, **kwargs)
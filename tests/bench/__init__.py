@@ -0,0 +1,6 @@
+"""Benchmarks for the outline, stats and convert hot paths.
+
+These run once as regular tests. Run `tox -e bench` to benchmark them, saving a JSON baseline
+under `.benchmarks/` and comparing against the previous run. Add e.g.
+`-- --benchmark-compare-fail=mean:20%` to fail on regressions.
+"""
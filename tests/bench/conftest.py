@@ -0,0 +1,23 @@
+"""Benchmark fixtures."""
+
+from copy import deepcopy
+
+import pytest
+
+from markdown_novel_tools.constants import DEFAULT_CONFIG
+
+from .vault import make_vault
+
+
+@pytest.fixture(scope="session")
+def vault(tmp_path_factory):
+    """A synthetic vault, shared by all the benchmarks."""
+    return make_vault(tmp_path_factory.mktemp("vault"))
+
+
+@pytest.fixture
+def config():
+    """The default config for book 1."""
+    config = deepcopy(DEFAULT_CONFIG)
+    config["book_num"] = "1"
+    return config
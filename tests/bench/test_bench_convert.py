@@ -0,0 +1,40 @@
+"""Benchmark manuscript conversion."""
+
+import pytest
+
+import markdown_novel_tools.convert as convert
+from markdown_novel_tools.constants import SCENE_SPLIT_ASTERISK
+
+from ..test_convert import _per_pattern_simplify_line, _synthetic_lines
+
+
+@pytest.mark.parametrize("format_", ("text", "pdf"))
+def test_simplify_markdown(benchmark, vault, format_):
+    contents = "".join(path.read_text() for path in vault["manuscript"][1])
+    convert_config = convert.get_format_convert_config(format_)
+    simplified = benchmark(
+        convert.simplify_markdown,
+        contents,
+        ignore_blank_lines=convert_config["ignore_blank_lines"],
+        plaintext=convert_config["plaintext"],
+        scene_split_string=convert_config["scene_split_string"],
+    )
+    assert simplified
+
+
+def test_simplify_lines_per_pattern(benchmark):
+    """The previous per-pattern line transform, to compare with `test_simplify_lines`."""
+    lines = _synthetic_lines(10_000)
+    benchmark(lambda: [_per_pattern_simplify_line(line, SCENE_SPLIT_ASTERISK) for line in lines])
+
+
+def test_simplify_lines(benchmark):
+    lines = _synthetic_lines(10_000)
+    simplified = benchmark(
+        convert.simplify_markdown,
+        "\n".join(lines),
+        ignore_blank_lines=False,
+        plaintext=False,
+        scene_split_string=SCENE_SPLIT_ASTERISK,
+    )
+    assert simplified
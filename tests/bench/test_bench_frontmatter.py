@@ -0,0 +1,23 @@
+"""Benchmark the frontmatter tool."""
+
+from argparse import Namespace
+
+import markdown_novel_tools.frontmatter as frontmatter
+
+from .vault import make_vault
+
+
+def test_frontmatter_update(benchmark, tmp_path, config):
+    # `frontmatter update` rewrites the manuscript, so it gets its own vault rather than the
+    # shared one the other benchmarks read.
+    vault = make_vault(tmp_path)
+    args = Namespace(
+        config=config,
+        outline=str(vault["outline"][1]),
+        path=[str(path) for path in vault["manuscript"][1]],
+        fix=False,
+        noop=False,
+        strict=True,
+        no_cache=True,
+    )
+    benchmark(frontmatter.frontmatter_update, args)
@@ -0,0 +1,23 @@
+"""Benchmark the outline sync and repo stats."""
+
+import markdown_novel_tools.mdfile as mdfile
+import markdown_novel_tools.novel as novel
+
+
+def test_create_single_sync_set(benchmark, vault, tmp_path):
+    benchmark(
+        novel.create_single_sync_set,
+        [vault["outline"][1]],
+        tmp_path,
+        "scenes",
+        "book1-{outline_type}.md",
+    )
+    assert (tmp_path / "book1-beats.md").exists()
+
+
+def test_walk_repo_dir(benchmark, vault, config, monkeypatch):
+    monkeypatch.chdir(vault["root"])
+    books, stats, errors = benchmark(mdfile.walk_repo_dir, config)
+    assert not errors
+    assert stats["manuscript"]["files"] == len(vault["manuscript"][1])
+    assert len(books) == len(vault["manuscript"])
@@ -0,0 +1,36 @@
+"""Benchmark outline parsing and rendering."""
+
+import pytest
+
+import markdown_novel_tools.outline as outline
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    (
+        {},
+        {"column": "Scene"},
+        {"column": "Arc", "split_columns": ["Arc", "Beat"], "also_split_by_slash": True},
+    ),
+    ids=("full", "scenes", "arcs"),
+)
+def test_build_table_from_files(benchmark, vault, kwargs):
+    path = vault["outline"][1]
+    table = benchmark(lambda: outline.build_table_from_files(path, **dict(kwargs)))
+    assert table.line_count
+
+
+@pytest.mark.parametrize("format_", ("markdown", "yaml", "html"))
+def test_get_beats(benchmark, vault, format_):
+    table = outline.build_table_from_files(vault["outline"][1], column="Scene")
+    stdout, stderr = benchmark(
+        outline.get_beats,
+        table,
+        file_headers=True,
+        multi_table_output=True,
+        stats=True,
+        format_=format_,
+        beats_type="scenes",
+    )
+    assert stdout
+    assert "Num beats" in stderr
@@ -0,0 +1,24 @@
+"""Benchmark word counting."""
+
+import pytest
+
+import markdown_novel_tools.utils as utils
+
+from ..test_utils import _per_word_count_words, _synthetic_corpus
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    """Return a 1M-word corpus, and its per-word count."""
+    text = _synthetic_corpus(1_000_000)
+    return text, _per_word_count_words(text)
+
+
+@pytest.mark.parametrize(
+    "count_words",
+    (_per_word_count_words, utils.count_words),
+    ids=("per-word", "count_words"),
+)
+def test_count_words(benchmark, corpus, count_words):
+    text, expected = corpus
+    assert benchmark(count_words, text) == expected
@@ -0,0 +1,30 @@
+"""Benchmark the yaml backends."""
+
+import pytest
+
+import markdown_novel_tools.yaml_backend as yaml_backend
+
+from ..test_yaml_backend import _scene_frontmatter_corpus
+
+DUMP_KWARGS = {
+    "default_flow_style": False,
+    "width": yaml_backend.MAX_WIDTH,
+    "sort_keys": False,
+    "allow_unicode": True,
+}
+
+
+@pytest.mark.parametrize("pure", (True, False), ids=("pure", "default"))
+def test_load_yaml(benchmark, pure):
+    corpus = _scene_frontmatter_corpus(100)
+    parsed = benchmark(lambda: [yaml_backend.load_yaml(item, pure=pure) for item in corpus])
+    assert len(parsed) == len(corpus)
+
+
+@pytest.mark.parametrize("pure", (True, False), ids=("pure", "default"))
+def test_dump_yaml(benchmark, pure):
+    parsed = [yaml_backend.load_yaml(item) for item in _scene_frontmatter_corpus(100)]
+    dumped = benchmark(
+        lambda: [yaml_backend.dump_yaml(item, pure=pure, **DUMP_KWARGS) for item in parsed]
+    )
+    assert len(dumped) == len(parsed)
@@ -0,0 +1,122 @@
+"""Generate a synthetic novel vault for the benchmarks."""
+
+import random
+from pathlib import Path
+
+from git import Repo
+
+POVS = ("Alice", "Bob", "Carol", "Dmitri")
+LOCATIONS = ("Harbor", "Old Town", "Lighthouse", "Market")
+ARCS = ("Book Arc", "Mystery", "Alice Arc", "Bob Arc")
+BEATS = (
+    "Hook",
+    "Question",
+    "Pinch 1",
+    "Promise",
+    "Midpoint",
+    "Reveal",
+    "Pinch 2",
+    "Status",
+    "Resolution",
+)
+VOCAB = (
+    'the and she he said, walked toward door. "Hello," whispered -- don\'t [[Alice]] '
+    "quickly into darkness harbor letter *"
+).split(" ")
+
+
+def _prose(rng, num_words):
+    """Return `num_words` words of prose-like text, in paragraphs."""
+    paragraphs = []
+    count = 0
+    while count < num_words:
+        length = min(rng.randint(20, 120), num_words - count)
+        paragraphs.append(" ".join(rng.choice(VOCAB) for _ in range(length)))
+        count += length
+    return "\n\n".join(paragraphs)
+
+
+def _beat(rng, chapter, scene, pov):
+    """Return the Description, POV, Scene, Arc and Beat of a single outline beat."""
+    arcs = rng.sample(ARCS, rng.randint(1, 2))
+    beats = ["/".join(rng.sample(BEATS, rng.randint(1, 2))) for _ in arcs]
+    description = f"[[{pov}]] {' '.join(rng.choice(VOCAB) for _ in range(rng.randint(8, 30)))}"
+    return (
+        description.replace("|", ""),
+        pov,
+        f"{chapter:02d}.{scene:02d}",
+        ", ".join(arcs),
+        ", ".join(beats),
+    )
+
+
+def _outline(rows):
+    """Return a scenes outline, one table per scene, for `rows` of beats."""
+    header = ("Description", "POV", "Scene", "Arc", "Beat")
+    contents = ["---\ntags: ['outline', 'scenes']\naliases: []\n---\n\n# Scenes\n"]
+    current_scene = None
+    for row in rows:
+        if row[2] != current_scene:
+            current_scene = row[2]
+            contents.append(f"\n## {current_scene}\n")
+            contents.append(f"| {' | '.join(header)} |\n")
+            contents.append(f"|{'|'.join('---' for _ in header)}|\n")
+        contents.append(f"| {' | '.join(row)} |\n")
+    return "".join(contents)
+
+
+def make_vault(
+    root,
+    books=2,
+    chapters=10,
+    scenes=3,
+    words_per_scene=800,
+    beats_per_scene=4,
+    seed=1,
+):
+    """Write a git repo with `books` books of `chapters` chapters of `scenes` scenes.
+
+    Each scene has valid frontmatter and `words_per_scene` words of body text; each book has a
+    scenes outline with `beats_per_scene` beats per scene.
+
+    Returns a dict of the interesting paths.
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    paths = {"root": root, "manuscript": {}, "outline": {}}
+    for book in range(1, books + 1):
+        manuscript_dir = root / "manuscript" / f"book{book}"
+        outline_dir = root / "outline" / f"book{book}"
+        manuscript_dir.mkdir(parents=True, exist_ok=True)
+        outline_dir.mkdir(parents=True, exist_ok=True)
+        rows = []
+        for chapter in range(1, chapters + 1):
+            pov = POVS[chapter % len(POVS)]
+            for scene in range(1, scenes + 1):
+                scene_rows = [_beat(rng, chapter, scene, pov) for _ in range(beats_per_scene)]
+                rows.extend(scene_rows)
+                summary = "".join(f"- {row[0]} ({row[3]})\n" for row in scene_rows)
+                characters = sorted(set(rng.sample(POVS, 2)) | {pov})
+                frontmatter = (
+                    (
+                        "tags: [scene]\n"
+                        "aliases: []\n"
+                        f"pov: {pov}\n"
+                        f"locations: [{rng.choice(LOCATIONS)}]\n"
+                        f"characters: [{', '.join(characters)}]\n"
+                        f"summary:\n{summary}"
+                    )
+                    .replace("[[", "")
+                    .replace("]]", "")
+                )
+                path = manuscript_dir / f"{book}_{chapter:02d}_{scene:02d} - {pov}.md"
+                path.write_text(
+                    f"---\n{frontmatter}---\n{_prose(rng, words_per_scene)}\n", encoding="utf-8"
+                )
+                paths["manuscript"].setdefault(book, []).append(path)
+        outline_path = outline_dir / f"book{book}-scenes.md"
+        outline_path.write_text(_outline(rows), encoding="utf-8")
+        paths["outline"][book] = outline_path
+    repo = Repo.init(root)
+    repo.index.add([str(path.relative_to(root)) for path in root.rglob("*.md")])
+    return paths
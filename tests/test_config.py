@@ -17,13 +17,17 @@ def hack_private_var(path):
     return re.sub("^/private/var/", "/var/", str(path))
 
 
-def test_get_config_path():
+def test_get_config_path(monkeypatch):
     with tempfile.TemporaryDirectory() as tmp_home, tempfile.TemporaryDirectory() as tmp_repo, tempfile.TemporaryDirectory() as tmp_config:
-        os.environ = {
-            "HOME": tmp_home,
-            "XDG_CONFIG_HOME": tmp_config,
-        }
-        os.chdir(tmp_repo)
+        monkeypatch.setattr(
+            os,
+            "environ",
+            {
+                "HOME": tmp_home,
+                "XDG_CONFIG_HOME": tmp_config,
+            },
+        )
+        monkeypatch.chdir(tmp_repo)
 
         # No config file in invalid git root, config dir, home dir
         assert mdconfig.get_config_path() is None
@@ -226,3 +230,19 @@ def test_add_config_parser_args():
     parser = Mock()
     mdconfig.add_config_parser_args(parser)
     parser.add_argument.assert_called()
+
+
+def test_get_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.delenv("XDG_CACHE_HOME", raising=False)
+    assert mdconfig.get_cache_dir({}, "lint") == tmp_path / "home" / ".cache" / "md-novel" / "lint"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+    assert (
+        mdconfig.get_cache_dir({"cache_dir": None}, "lint")
+        == tmp_path / "xdg" / "md-novel" / "lint"
+    )
+    assert (
+        mdconfig.get_cache_dir({"cache_dir": str(tmp_path / "c")}, "lint")
+        == tmp_path / "c" / "lint"
+    )
+    assert (tmp_path / "c" / "lint").is_dir()
@@ -0,0 +1,143 @@
+"""Test convert."""
+
+import argparse
+import random
+import re
+import zipfile
+from copy import deepcopy
+
+import pytest
+from git import Actor, Repo
+
+import markdown_novel_tools.convert as convert
+import markdown_novel_tools.epub as epub
+from markdown_novel_tools.constants import DEFAULT_CONFIG, SCENE_SPLIT_ASTERISK, SCENE_SPLIT_REGEX
+
+
+def _per_pattern_simplify_line(line, scene_split_string=None):
+    """The previous, pattern-string-per-call line transform, for comparison."""
+    line = re.sub(r"""\[\[([^\]\|]+\|)?([^\]]+)\]\]""", r"\2", line)
+    line = re.sub(r"""([^-])(\s+-\s+|--)([^-]|$)""", r"\1&mdash;\3", line)
+    line = re.sub(r"'\"", r"'&nbsp;&#8221;", line)
+    line = re.sub(r"\"'", r"&#8220;&nbsp;'", line)
+    if scene_split_string:
+        line = re.sub(SCENE_SPLIT_REGEX, scene_split_string, line)
+    return line
+
+
+def _synthetic_lines(num_lines, seed=1):
+    """Return `num_lines` lines of prose with links, dashes and nested quotes."""
+    rng = random.Random(seed)
+    vocab = (
+        "the",
+        "she",
+        "said,",
+        "[[Alice]]",
+        "[[Bob|him]]",
+        "--",
+        "-",
+        '"Hello,"',
+        "'\"Hi,'",
+        "\"'",
+        "'\"'",
+        "don't",
+        "well-known",
+    )
+    return [
+        " ".join(rng.choice(vocab) for _ in range(rng.randint(0, 15))) for _ in range(num_lines)
+    ]
+
+
+@pytest.mark.parametrize(
+    "contents, kwargs, expected",
+    (
+        ("---\ntags: []\n---\nOne [[two]].\n\nThree\n", {}, "One two.\nThree\n"),
+        (
+            "---\ntags: []\n---\nOne [[two]].\n\nThree\n",
+            {"ignore_blank_lines": False},
+            "One two.\n\nThree\n",
+        ),
+        # A horizontal rule in the body doesn't hide the text after it
+        (
+            "---\ntags: []\n---\nOne\n\n---\n\nTwo\n",
+            {"ignore_blank_lines": False},
+            "One\n\n---\n\nTwo\n",
+        ),
+    ),
+)
+def test_simplify_markdown(contents, kwargs, expected):
+    assert convert.simplify_markdown(contents, **kwargs) == expected
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    (
+        ("\"'Hi,' she said.\"", "&#8220;&nbsp;'Hi,' she said.\""),
+        ("\"She said 'hi.'\"", "\"She said 'hi.'&nbsp;&#8221;"),
+        ("\"'Hi'\"", "&#8220;&nbsp;'Hi'&nbsp;&#8221;"),
+        ("One - two--three", "One&mdash;two&mdash;three"),
+        ("[[Alice|her]] and [[Bob]]", "her and Bob"),
+    ),
+)
+def test_simplify_markdown_html(line, expected):
+    assert convert.simplify_markdown(line, plaintext=False) == f"{expected}\n"
+
+
+def test_simplify_markdown_matches_per_pattern():
+    """The compiled, combined substitutions match the previous per-pattern ones."""
+    lines = _synthetic_lines(2000) + ["        * * *", "    * * * more"]
+    expected = "".join(
+        f"{_per_pattern_simplify_line(line, SCENE_SPLIT_ASTERISK)}\n" for line in lines
+    )
+    assert (
+        convert.simplify_markdown(
+            "\n".join(lines),
+            ignore_blank_lines=False,
+            plaintext=False,
+            scene_split_string=SCENE_SPLIT_ASTERISK,
+        )
+        == expected
+    )
+
+
+def test_convert_full_epub(tmp_path, monkeypatch):
+    """The native epub build writes the annotated cover to the artifact dir too."""
+    pytest.importorskip("markdown")
+    monkeypatch.chdir(tmp_path)
+    manuscript = tmp_path / "manuscript"
+    manuscript.mkdir()
+    (manuscript / "1_01_01 - Alice.md").write_text(
+        '---\ntags: []\n---\nShe said "hello".\n', encoding="utf-8"
+    )
+    (tmp_path / "metadata.txt").write_text(
+        "---\ntitle: Book\ncover-image: cover.png\n---\n", encoding="utf-8"
+    )
+    (tmp_path / "cover.png").write_bytes(b"png")
+    repo = Repo.init(tmp_path)
+    repo.index.add(["metadata.txt"])
+    repo.index.commit("metadata", author=Actor("Test", "test@example.com"))
+
+    def check_call(cmd):
+        with open(cmd[1], "rb") as from_fh, open(cmd[-1], "wb") as to_fh:
+            to_fh.write(from_fh.read())
+
+    monkeypatch.setattr(epub, "check_call", check_call)
+    config = deepcopy(DEFAULT_CONFIG)
+    config["book_num"] = "1"
+    config["cache_dir"] = str(tmp_path / "cache")
+    config["convert"]["metadata_path"] = {"default": str(tmp_path / "metadata.txt")}
+    config["convert"]["frontmatter_files"] = {}
+    args = argparse.Namespace(
+        config=config,
+        filename=[str(manuscript)],
+        artifact_dir=str(tmp_path / "_output"),
+        clean=False,
+        subtitle="",
+        format="epub",
+    )
+    convert.convert_full(args)
+
+    assert (tmp_path / "_output" / "cover.png").read_bytes() == b"png"
+    (output,) = (tmp_path / "_output").glob("*.epub")
+    with zipfile.ZipFile(output) as zf:
+        assert zf.read("EPUB/media/cover.png") == b"png"
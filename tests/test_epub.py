@@ -0,0 +1,202 @@
+"""Test epub."""
+
+import os
+import zipfile
+from xml.etree import ElementTree
+
+import pytest
+
+import markdown_novel_tools.epub as epub
+from markdown_novel_tools.constants import DEFAULT_CONFIG
+
+
+@pytest.mark.parametrize(
+    "engine, has_markdown, has_server, expected",
+    (
+        ("auto", True, False, True),
+        ("auto", False, False, False),
+        ("auto", False, True, True),
+        ("pandoc", True, True, False),
+        (None, True, False, True),
+    ),
+)
+def test_use_epub_packager(monkeypatch, engine, has_markdown, has_server, expected):
+    monkeypatch.setattr(epub, "HAS_MARKDOWN", has_markdown)
+    monkeypatch.setattr(
+        epub, "pandoc_server_cmd", lambda: ["pandoc-server"] if has_server else None
+    )
+    config = {"convert": {} if engine is None else {"epub_engine": engine}}
+    assert epub.use_epub_packager(config) is expected
+
+
+@pytest.mark.parametrize(
+    "engine, has_markdown, expected",
+    (
+        ("auto", True, False),
+        ("auto", False, True),
+        ("pandoc", True, True),
+    ),
+)
+def test_epub_needs_pandoc(monkeypatch, engine, has_markdown, expected):
+    monkeypatch.setattr(epub, "HAS_MARKDOWN", has_markdown)
+    monkeypatch.setattr(epub, "pandoc_server_cmd", lambda: ["pandoc-server"])
+    assert epub.epub_needs_pandoc({"convert": {"epub_engine": engine}}) is expected
+
+
+def test_use_epub_packager_invalid():
+    with pytest.raises(ValueError):
+        epub.use_epub_packager({"convert": {"epub_engine": "calibre"}})
+
+
+def test_split_chapters():
+    contents = "Intro\n\n# One\n\nText\n## Scene\n\n# Two\n\nMore #1\n\n"
+    assert epub.split_chapters(contents) == [
+        "Intro\n\n",
+        "# One\n\nText\n## Scene\n\n",
+        "# Two\n\nMore #1\n\n",
+    ]
+    assert epub.split_chapters("\n\n# One\n") == ["# One\n"]
+
+
+def _cover_commands(monkeypatch):
+    """Patch `magick` to copy the image, and return the list of commands run."""
+    commands = []
+
+    def check_call(cmd):
+        commands.append(cmd)
+        with open(cmd[1], "rb") as from_fh, open(cmd[-1], "wb") as to_fh:
+            to_fh.write(from_fh.read())
+
+    monkeypatch.setattr(epub, "check_call", check_call)
+    return commands
+
+
+def test_cover(tmp_path, monkeypatch):
+    """The cover is only drawn again when its annotation changes."""
+    commands = _cover_commands(monkeypatch)
+    image = tmp_path / "cover.png"
+    image.write_bytes(b"png")
+    builder = epub.EpubBuilder(tmp_path / "build", DEFAULT_CONFIG)
+    first = builder.cover(image, "Book\n2026.10.19")
+    assert builder.cover(image, "Book\n2026.10.19") == first
+    assert len(commands) == 1
+    second = builder.cover(image, "Book\n2026.10.20")
+    assert second != first
+    assert len(commands) == 2
+    assert second.read_bytes() == b"png"
+
+
+def test_cover_no_magick(tmp_path, monkeypatch, capsys):
+    """Without imagemagick, a cached cover is still used, and drawing a new one exits."""
+    _cover_commands(monkeypatch)
+    image = tmp_path / "cover.png"
+    image.write_bytes(b"png")
+    builder = epub.EpubBuilder(tmp_path / "build", DEFAULT_CONFIG)
+    cached = builder.cover(image, "Book")
+
+    def check_call(cmd):
+        raise FileNotFoundError(cmd[0])
+
+    monkeypatch.setattr(epub, "check_call", check_call)
+    assert builder.cover(image, "Book") == cached
+    with pytest.raises(SystemExit):
+        builder.cover(image, "Book 2")
+    assert "imagemagick" in capsys.readouterr().err
+
+
+def test_chapter_xhtml(tmp_path):
+    """Chapters are converted once, then read from the build dir; unused ones are pruned."""
+    pytest.importorskip("markdown")
+    builder = epub.EpubBuilder(tmp_path, DEFAULT_CONFIG)
+    fragment = builder.chapter_xhtml("# One {#heading-one}\n\n&ast;&nbsp;&ast; &amp; &bogus;\n")
+    assert '<h1 id="heading-one">One</h1>' in fragment
+    assert "*\xa0* &amp; &amp;bogus;" in fragment
+    chapter_files = list((tmp_path / "chapters").iterdir())
+    assert len(chapter_files) == 1
+    chapter_files[0].write_text("cached", encoding="utf-8")
+    builder = epub.EpubBuilder(tmp_path, DEFAULT_CONFIG)
+    assert builder.chapter_xhtml("# One {#heading-one}\n\n&ast;&nbsp;&ast; &amp; &bogus;\n") == (
+        "cached"
+    )
+    builder.chapter_xhtml("# Two\n")
+
+
+def test_prune(tmp_path):
+    """Other builds' chapters are kept until the build dir is too big, oldest first."""
+    pytest.importorskip("markdown")
+    builder = epub.EpubBuilder(tmp_path, DEFAULT_CONFIG)
+    builder.chapter_xhtml("# One\n")
+    builder.chapter_xhtml("# Two\n")
+    one, two = sorted((tmp_path / "chapters").iterdir())
+    os.utime(one, ns=(0, 0))
+    builder = epub.EpubBuilder(tmp_path, DEFAULT_CONFIG)
+    builder.chapter_xhtml("# Three\n")
+    builder.prune()
+    assert len(list((tmp_path / "chapters").iterdir())) == 3
+    builder.prune(max_bytes=two.stat().st_size + len(builder.chapter_xhtml("# Three\n")))
+    assert not one.exists()
+    assert two.exists()
+    builder.prune(max_bytes=0)
+    assert len(list((tmp_path / "chapters").iterdir())) == 1
+
+
+def test_chapter_xhtml_pandoc(tmp_path, monkeypatch):
+    """Without Python-Markdown, chapters go through pandoc, and are cached separately."""
+    conversions = []
+
+    def pandoc_convert(config, text, from_, to):
+        conversions.append((text, from_, to))
+        return "<h1>One</h1>\n<p>&mdash;</p>"
+
+    monkeypatch.setattr(epub, "HAS_MARKDOWN", False)
+    monkeypatch.setattr(epub, "pandoc_convert", pandoc_convert)
+    builder = epub.EpubBuilder(tmp_path, DEFAULT_CONFIG)
+    assert builder.chapter_xhtml("# One\n") == "<h1>One</h1>\n<p>\u2014</p>"
+    assert builder.chapter_xhtml("# One\n") == "<h1>One</h1>\n<p>\u2014</p>"
+    assert conversions == [("# One\n", "markdown", "html5")]
+
+
+def test_write(tmp_path, monkeypatch):
+    """Write a valid epub, with the table of contents linking across chapters."""
+    pytest.importorskip("markdown")
+    _cover_commands(monkeypatch)
+    (tmp_path / "cover.png").write_bytes(b"png")
+    (tmp_path / "epub.css").write_text("body { margin: 0; }\n")
+    builder = epub.EpubBuilder(tmp_path / "build", DEFAULT_CONFIG)
+    cover_path = builder.cover(tmp_path / "cover.png", "Book")
+    chapters = epub.split_chapters(
+        "# Table of Contents\n\n- [One](#heading-one)\n- [Two](#heading-two)\n\n"
+        "# One {#heading-one}\n\nShe said&nbsp;hi.\n\n"
+        '# Two {#heading-two}\n\nBack to [one](#heading-one). He said "hi" -- and left.\n'
+    )
+    output = tmp_path / "book.epub"
+    builder.write(
+        output,
+        {"title": "Book & Co", "author": ["Aki"], "lang": "en-US"},
+        chapters,
+        tmp_path / "epub.css",
+        cover_path=cover_path,
+    )
+    with zipfile.ZipFile(output) as zf:
+        infos = zf.infolist()
+        assert infos[0].filename == "mimetype"
+        assert infos[0].compress_type == zipfile.ZIP_STORED
+        assert zf.read("mimetype") == b"application/epub+zip"
+        names = zf.namelist()
+        for name in names:
+            if name.endswith((".xhtml", ".opf", ".xml")):
+                ElementTree.fromstring(zf.read(name))
+        assert zf.read("EPUB/media/cover.png") == b"png"
+        assert zf.read("EPUB/styles/stylesheet.css") == b"body { margin: 0; }\n"
+        toc = zf.read("EPUB/text/ch001.xhtml").decode("utf-8")
+        assert 'href="ch002.xhtml#heading-one"' in toc
+        assert 'href="ch003.xhtml#heading-two"' in toc
+        two = zf.read("EPUB/text/ch003.xhtml").decode("utf-8")
+        assert 'href="ch002.xhtml#heading-one"' in two
+        assert "He said \u201chi\u201d \u2013 and left." in two
+        nav = zf.read("EPUB/nav.xhtml").decode("utf-8")
+        assert '<a href="text/ch002.xhtml">One</a>' in nav
+        opf = zf.read("EPUB/content.opf").decode("utf-8")
+        assert "<dc:title>Book &amp; Co</dc:title>" in opf
+        assert "<dc:creator>Aki</dc:creator>" in opf
+        assert 'properties="cover-image"' in opf
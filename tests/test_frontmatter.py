@@ -0,0 +1,81 @@
+"""Test frontmatter."""
+
+import argparse
+import shutil
+from copy import deepcopy
+
+import pytest
+
+import markdown_novel_tools.frontmatter as frontmatter
+from markdown_novel_tools.constants import DEFAULT_CONFIG
+from markdown_novel_tools.outline import build_table_from_files
+
+from . import TEST_DATA_DIR
+
+SCENE = """---
+tags: [scene]
+summary:
+{summary}---
+Text.
+"""
+
+
+def test_reconcile_scenes(tmp_path):
+    outline_path = tmp_path / "outline.md"
+    shutil.copy(TEST_DATA_DIR / "general" / "test-simple.md", outline_path)
+    table = build_table_from_files([outline_path], column="Scene")
+    manuscript = tmp_path / "manuscript"
+    manuscript.mkdir()
+    scenes = {
+        # Matches the outline
+        "1_01_01 - Trinity.md": "- Trinity took an extra shift to watch Neo. (The One Hook, Trinity Hook)\n",
+        # Mismatched
+        "1_02_01 - Neo.md": "- Neo - Huh. (Spoon)\n",
+        # Not in the outline
+        "1_05_01 - Neo.md": "- Neo goes off script. (Spoon)\n",
+    }
+    paths = []
+    for name, summary in scenes.items():
+        path = manuscript / name
+        path.write_text(SCENE.format(summary=summary), encoding="utf-8")
+        paths.append(str(path))
+    paths.append(str(tmp_path / "not-a-scene.md"))
+
+    diff, missing_from_outline, missing_from_manuscript = frontmatter.reconcile_scenes(table, paths)
+    assert missing_from_outline == [str(manuscript / "1_05_01 - Neo.md")]
+    assert missing_from_manuscript == ["13.02"]
+    assert "1_01_01 - Trinity" not in diff
+    assert "--- 1_02_01 - Neo scene\n+++ 1_02_01 - Neo outline\n" in diff
+    assert "-- Neo - Huh. (Spoon)\n+- Neo - Whoa. (Spoon)\n" in diff
+    assert "-- Neo goes off script. (Spoon)\n" in diff
+
+
+@pytest.mark.parametrize(
+    "grep, where, expected",
+    (
+        # `--grep` matches the value exactly, as written
+        ("[[Alice]]", None, ["alice.md"]),
+        ("Alice", None, ["plain.md"]),
+        ("Alice ", None, []),
+        # `--where` matches the unwikilinked, stripped value
+        (None, "characters=Alice", ["alice.md", "plain.md"]),
+    ),
+)
+def test_frontmatter_query(tmp_path, capsys, grep, where, expected):
+    (tmp_path / "alice.md").write_text("---\ncharacters: ['[[Alice]]']\n---\n", encoding="utf-8")
+    (tmp_path / "plain.md").write_text("---\ncharacters: [Alice]\n---\n", encoding="utf-8")
+    (tmp_path / "bob.md").write_text("---\ncharacters: [Bob]\n---\n", encoding="utf-8")
+    config = deepcopy(DEFAULT_CONFIG)
+    config["cache_dir"] = str(tmp_path / "cache")
+    args = argparse.Namespace(
+        config=config,
+        field="characters",
+        grep=grep,
+        where=where,
+        aggregate=False,
+        verbose=False,
+        path=[str(tmp_path)],
+    )
+    with pytest.raises(SystemExit):
+        frontmatter.frontmatter_query(args)
+    assert capsys.readouterr().out.split() == [str(tmp_path / name) for name in expected]
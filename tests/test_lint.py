@@ -0,0 +1,222 @@
+"""Test lint."""
+
+import json
+import os
+
+import pytest
+from git import Repo
+
+import markdown_novel_tools.lint as lint
+
+GOOD_FRONTMATTER = """---
+tags: [scene]
+aliases: []
+pov: Alice
+locations: [Harbor]
+characters: [Alice]
+summary:
+- Alice finds the letter.
+---
+"""
+
+
+def _write(path, contents):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(contents, encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize(
+    "relpath, contents, expected",
+    (
+        ("manuscript/1_01_01 - Alice.md", f"{GOOD_FRONTMATTER}One.\n", []),
+        (
+            "manuscript/1_01_01 - Alice.md",
+            f"{GOOD_FRONTMATTER}One [[[Bob]].\n\n  - two\n",
+            [(10, 5, "triple-link"), (12, 3, "list-item")],
+        ),
+        # List items are only a problem in the manuscript
+        ("wiki/Bob.md", "---\ntags: []\n---\n- [[[Alice]]\n", [(4, 3, "triple-link")]),
+        ("wiki/Bob.md", "No frontmatter [[[Alice]]\n", [(1, 16, "triple-link")]),
+        (
+            "manuscript/1_01_01 - Alice.md",
+            "---\ntags: [scene]\n---\nOne.\n",
+            [
+                (1, 1, "frontmatter-schema"),
+                (1, 1, "frontmatter-schema"),
+                (1, 1, "frontmatter-schema"),
+                (1, 1, "frontmatter-schema"),
+            ],
+        ),
+        (
+            "manuscript/1_01_01 - Alice.md",
+            "---\ntags: [scene]\naliases: [\n---\nOne.\n",
+            [(4, 1, "frontmatter-schema")],
+        ),
+    ),
+)
+def test_lint_file(tmp_path, relpath, contents, expected):
+    path = _write(tmp_path / relpath, contents)
+    diagnostics = lint.lint_file(path)
+    assert [(d.line, d.column, d.rule) for d in diagnostics] == expected
+    assert all(d.path == str(path) for d in diagnostics)
+    assert path.read_text(encoding="utf-8") == contents
+
+
+def test_lint_file_fix(tmp_path):
+    path = _write(
+        tmp_path / "manuscript" / "1_01_01 - Alice.md",
+        f"{GOOD_FRONTMATTER}One [[[Bob]].\n- two\n[[[[Carol]]\n",
+    )
+    assert lint.lint_file(path, fix=True) == []
+    assert path.read_text(encoding="utf-8").endswith("---\nOne [[Bob]].\n[[Carol]]\n")
+    assert lint.lint_file(path) == []
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    (
+        ("- two", True),
+        ("  -\ttwo", True),
+        ("-", False),
+        ("---", False),
+        ("- - -", False),
+        ("  ----  ", False),
+        ("-- she said", False),
+        ("--she said", False),
+        ("One - two", False),
+    ),
+)
+def test_list_item(line, expected):
+    assert (lint._list_item(line) is not None) is expected
+
+
+def test_lint_file_fix_keeps_breaks_and_dashes(tmp_path):
+    """Horizontal rules and dialogue dashes aren't list items, so `--fix` keeps them."""
+    body = "- a list item [[[Bob]]\n---\n- - -\n-- she said [[[x]]\nafter hr\n"
+    path = _write(tmp_path / "manuscript" / "1_01_01 - Alice.md", f"{GOOD_FRONTMATTER}{body}")
+    assert lint.lint_file(path, fix=True) == []
+    assert path.read_text(encoding="utf-8").endswith(
+        "---\n---\n- - -\n-- she said [[x]]\nafter hr\n"
+    )
+
+
+@pytest.mark.parametrize("frontmatter", ("---\n---\n", "---\n- a list\n---\n"))
+def test_lint_file_fix_unmapped_frontmatter(tmp_path, frontmatter):
+    """Body fixes are written even if the frontmatter isn't a mapping we can rewrite."""
+    path = _write(tmp_path / "manuscript" / "1_01_01 - Alice.md", f"{frontmatter}[[[Alice]]\n")
+    diagnostics = lint.lint_file(path, fix=True)
+    assert [d.rule for d in diagnostics] == ["frontmatter-schema"]
+    assert path.read_text(encoding="utf-8") == f"{frontmatter}[[Alice]]\n"
+
+
+def test_lint_file_fix_no_frontmatter(tmp_path):
+    path = _write(tmp_path / "wiki" / "Bob.md", "[[[Alice]]\n")
+    assert lint.lint_file(path, fix=True) == []
+    assert path.read_text(encoding="utf-8") == "[[Alice]]\n"
+
+
+@pytest.mark.parametrize("jobs", (1, 2))
+def test_lint_files(tmp_path, monkeypatch, jobs):
+    monkeypatch.setattr(lint, "MIN_PARALLEL_FILES", 2)
+    paths = [
+        _write(tmp_path / "manuscript" / f"1_01_{i:02d} - Alice.md", f"{GOOD_FRONTMATTER}[[[x]]\n")
+        for i in range(1, 5)
+    ]
+    diagnostics = lint.lint_files(paths, jobs=jobs)
+    assert [d.path for d in diagnostics] == [str(path) for path in paths]
+
+
+def test_register_duplicate_rule():
+    with pytest.raises(ValueError):
+        lint.line_rule("triple-link")(lambda line: None)
+
+
+def test_format_diagnostics():
+    diagnostics = [lint.Diagnostic("a.md", 3, 2, "triple-link", "found [[[")]
+    assert lint.format_diagnostics(diagnostics) == "a.md:3:2: triple-link found [[["
+    assert json.loads(lint.format_diagnostics(diagnostics, "json")) == [
+        {"path": "a.md", "line": 3, "column": 2, "rule": "triple-link", "message": "found [[["}
+    ]
+    sarif = json.loads(lint.format_diagnostics(diagnostics, "sarif"))
+    result = sarif["runs"][0]["results"][0]
+    assert result["ruleId"] == "triple-link"
+    assert result["locations"][0]["physicalLocation"]["region"] == {
+        "startLine": 3,
+        "startColumn": 2,
+    }
+    assert result["locations"][0]["physicalLocation"]["artifactLocation"] == {
+        "uri": "a.md",
+        "uriBaseId": "%SRCROOT%",
+    }
+    assert sarif["runs"][0]["originalUriBaseIds"]["%SRCROOT%"]["uri"].startswith("file://")
+    rule_ids = [rule["id"] for rule in sarif["runs"][0]["tool"]["driver"]["rules"]]
+    assert sorted(rule_ids) == sorted([*lint.LINE_RULES, *lint.FILE_RULES])
+
+
+def test_sarif_artifact_location(tmp_path):
+    assert lint._sarif_artifact_location("manuscript/1_01_01 - Alice.md") == {
+        "uri": "manuscript/1_01_01%20-%20Alice.md",
+        "uriBaseId": "%SRCROOT%",
+    }
+    path = tmp_path / "a b.md"
+    assert lint._sarif_artifact_location(str(path)) == {"uri": path.as_uri()}
+
+
+def test_lint_files_cache(tmp_path, monkeypatch):
+    path = _write(tmp_path / "manuscript" / "1_01_01 - Alice.md", f"{GOOD_FRONTMATTER}[[[x]]\n")
+    cache = {}
+    expected = lint.lint_files([path], cache=cache)
+    assert len(expected) == 1
+    assert list(cache) == [str(path)]
+
+    def fail(*args):
+        raise AssertionError("lint_file was called for an unchanged file")
+
+    monkeypatch.setattr(lint, "lint_file", fail)
+    assert lint.lint_files([path], cache=cache) == expected
+
+    cache_path = tmp_path / "diagnostics.json"
+    lint.save_lint_cache(cache_path, cache)
+    assert lint.load_lint_cache(cache_path) == cache
+    assert lint.lint_files([path], cache=lint.load_lint_cache(cache_path)) == expected
+
+    monkeypatch.undo()
+    path.write_text(f"{GOOD_FRONTMATTER}[[x]]\n", encoding="utf-8")
+    assert lint.lint_files([path], cache=cache) == []
+
+
+@pytest.mark.parametrize("contents", ("", "not json", '{"version": [0, []], "files": {}}'))
+def test_load_lint_cache_invalid(tmp_path, contents):
+    cache_path = tmp_path / "diagnostics.json"
+    if contents:
+        cache_path.write_text(contents, encoding="utf-8")
+    assert lint.load_lint_cache(cache_path) == {}
+
+
+def test_get_changed_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    repo = Repo.init(tmp_path)
+    with repo.config_writer() as writer:
+        writer.set_value("user", "name", "Test")
+        writer.set_value("user", "email", "test@example.com")
+    for name in ("1_01_01 - Alice.md", "1_01_02 - Bob.md", "1_01_03 - Carol.md", "_skip.md"):
+        _write(tmp_path / "manuscript" / name, f"{GOOD_FRONTMATTER}One.\n")
+    _write(tmp_path / "wiki" / "Alice.md", "Alice.\n")
+    repo.index.add(["manuscript/1_01_01 - Alice.md", "manuscript/1_01_02 - Bob.md"])
+    first = repo.index.commit("first")
+    _write(tmp_path / "manuscript" / "1_01_02 - Bob.md", f"{GOOD_FRONTMATTER}Two.\n")
+    repo.index.add(["manuscript/1_01_02 - Bob.md", "wiki/Alice.md"])
+    repo.index.commit("second")
+    _write(tmp_path / "manuscript" / "1_01_01 - Alice.md", f"{GOOD_FRONTMATTER}Two.\n")
+
+    assert lint.get_changed_files(["manuscript"]) == [
+        os.path.join("manuscript", "1_01_01 - Alice.md"),
+        os.path.join("manuscript", "1_01_03 - Carol.md"),
+    ]
+    assert lint.get_changed_files(["."], since=first.hexsha) == [
+        os.path.join("manuscript", "1_01_01 - Alice.md"),
+        os.path.join("manuscript", "1_01_02 - Bob.md"),
+        os.path.join("manuscript", "1_01_03 - Carol.md"),
+        os.path.join("wiki", "Alice.md"),
+    ]
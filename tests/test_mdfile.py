@@ -1,7 +1,122 @@
 """Test mdfile."""
 
+import pytest
+
 import markdown_novel_tools.mdfile as mdfile
 
 
+def _scene(title, pov="Alice", characters=("Alice", "Bob"), body="one two three"):
+    frontmatter = f"pov: {pov}\ncharacters: [{', '.join(characters)}]\n"
+    return mdfile.get_markdown_file(
+        f"manuscript/{title}.md", contents=f"---\n{frontmatter}---\n{body}\n"
+    )
+
+
 def test_mdfile():
     pass
+
+
+@pytest.mark.parametrize(
+    "contents, hack_yaml, legacy, expected",
+    (
+        ("---\na: b\n---\nbody\n", False, False, ("a: b\n", "body\n")),
+        ("---\na: b\n---\nbody\n", False, True, ("a: b\n", "body\n")),
+        ("no frontmatter\n", False, False, ("", "no frontmatter\n")),
+        ("---\n---\nbody", False, False, ("", "body")),
+        ("---\na: b\n---", False, False, ("a: b\n", "")),
+        ("---\na: [[b]]\n---\n", True, False, ("a: b\n", "")),
+        ("---\na: [[b]]\n---\n", True, True, ("a: b\n", "")),
+        # unterminated frontmatter is body
+        ("---\na: b\n", False, False, ("", "---\na: b\n")),
+        # horizontal rules in the body stay in the body
+        (
+            "---\na: b\n---\none\n---\ntwo\n---\nthree\n",
+            False,
+            False,
+            ("a: b\n", "one\n---\ntwo\n---\nthree\n"),
+        ),
+        (
+            "---\na: b\n---\none\n---\ntwo\n---\nthree\n",
+            False,
+            True,
+            ("a: b\ntwo\n", "one\nthree\n"),
+        ),
+        # `---` has to be the whole line
+        ("---\na: b\n----\n---\nbody\n", False, False, ("a: b\n----\n", "body\n")),
+        ("text\n---\na: b\n---\n", False, False, ("", "text\n---\na: b\n---\n")),
+    ),
+)
+def test_get_frontmatter_and_body(contents, hack_yaml, legacy, expected):
+    assert mdfile.get_frontmatter_and_body(contents, hack_yaml=hack_yaml, legacy=legacy) == expected
+
+
+def test_markdown_file_lazy():
+    """Reading the body doesn't parse the yaml; broken yaml only shows up when parsed."""
+    markdown_file = mdfile.get_markdown_file(
+        "manuscript/1_01_01 - Alice.md", contents="---\nfoo: [\n---\none two\n"
+    )
+    assert not hasattr(markdown_file, "__dict__")
+    assert markdown_file.body == "one two\n"
+    assert markdown_file._parsed_yaml is mdfile._UNPARSED
+    assert markdown_file.manuscript_info["manuscript_words"] == 2
+    assert markdown_file.parsed_yaml is None
+    assert "yaml is broken" in markdown_file.error
+
+
+def test_markdown_file_set_body():
+    markdown_file = _scene("1_01_01 - Alice")
+    assert markdown_file.manuscript_info["total_words"] == 3
+    markdown_file.body = "one\n"
+    assert markdown_file.manuscript_info["total_words"] == 1
+    assert markdown_file.manuscript_info["pov"] == "Alice"
+
+
+def test_book_instances_dont_share_state():
+    book1 = mdfile.Book("1")
+    book2 = mdfile.Book("2")
+    book1.add_scene(_scene("1_01_01 - Alice"))
+    assert book1.scenes
+    assert book2.scenes == {}
+    assert book2.chapters == {}
+    assert book2.povs == {}
+    assert book2.total_words == 0
+
+
+def test_book_add_scene():
+    book = mdfile.Book("1")
+    book.add_scene(_scene("1_01_01 - Alice"))
+    book.add_scene(_scene("1_01_02 - Bob", pov="Bob", characters=("Bob", "Carol")))
+    book.add_scene(_scene("1_02_01 - Alice", body="---"))
+    stats = book.stats()
+    assert stats["manuscript_words"] == 6
+    assert stats["chapters"]["01"] == {
+        "manuscript words": 6,
+        "total words": 6,
+        "characters": ["Alice", "Bob", "Carol"],
+    }
+    assert stats["povs"]["Alice"]["chapters"] == ["01", "02"]
+    assert stats["povs"]["Alice"]["populated chapters"] == ["01"]
+    assert stats["povs"]["Alice"]["num_chapters"] == 2
+    assert stats["povs"]["Bob"]["scenes"] == 1
+
+
+def test_book_remove_scene():
+    book = mdfile.Book("1")
+    book.add_scene(_scene("1_01_01 - Alice"))
+    expected = book.stats()
+    book.add_scene(_scene("1_01_02 - Bob", pov="Bob", characters=("Carol",)))
+    book.add_scene(_scene("1_02_01 - Alice"))
+    book.remove_scene("1_01_02 - Bob")
+    book.remove_scene("1_02_01 - Alice")
+    assert book.stats() == expected
+    with pytest.raises(KeyError):
+        book.remove_scene("1_02_01 - Alice")
+
+
+def test_book_replace_scene():
+    book = mdfile.Book("1")
+    book.add_scene(_scene("1_01_01 - Alice"))
+    book.add_scene(_scene("1_01_01 - Alice", pov="Bob", body="one"))
+    assert book.total_words == 1
+    assert list(book.povs) == ["Bob"]
+    assert book.stats()["chapters"]["01"]["total words"] == 1
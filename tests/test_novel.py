@@ -1,8 +1,17 @@
 """Test novel."""
 
+import argparse
+import shutil
+from copy import deepcopy
+
 import pytest
+from git import Actor, Repo
 
+import markdown_novel_tools.convert as convert
+import markdown_novel_tools.epub as epub
 import markdown_novel_tools.novel as novel
+import markdown_novel_tools.pdf_backend as pdf_backend
+from markdown_novel_tools.constants import DEFAULT_CONFIG
 
 from . import TEST_DATA_DIR
 
@@ -23,10 +32,150 @@ def test_novel_convert():
     pass
 
 
+@pytest.mark.parametrize(
+    "value, expected",
+    (
+        ("text", ["text"]),
+        ("pdf, epub,pdf", ["pdf", "epub"]),
+        ("shunn-md", ["shunn-md"]),
+    ),
+)
+def test_convert_format_list(value, expected):
+    assert novel._convert_format_list(value) == expected
+
+
+@pytest.mark.parametrize("value", ("txt", "text,simple-pdf"))
+def test_convert_format_list_invalid(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        novel._convert_format_list(value)
+
+
+def test_convert_multiple_formats(tmp_path, monkeypatch):
+    """Each format gets its own subdir, the same names, and the manuscript is read once."""
+    monkeypatch.chdir(tmp_path)
+    manuscript = tmp_path / "manuscript"
+    manuscript.mkdir()
+    for name in ("1_01_01 - Alice.md", "1_01_02 - Alice.md", "1_02_01 - Bob.md"):
+        (manuscript / name).write_text("---\ntags: []\n---\nShe said--hello.\n", encoding="utf-8")
+    (tmp_path / "metadata.txt").write_text(
+        "---\ntitle: Book\ncover-image: cover.png\n---\n", encoding="utf-8"
+    )
+    repo = Repo.init(tmp_path)
+    repo.index.add(["metadata.txt"])
+    repo.index.commit("metadata", author=Actor("Test", "test@example.com"))
+
+    reads = []
+    orig_read_file = convert._read_file
+    monkeypatch.setattr(
+        convert, "_read_file", lambda path: reads.append(path) or orig_read_file(path)
+    )
+    commands = []
+    monkeypatch.setattr(convert, "check_call", commands.append)
+    config = deepcopy(DEFAULT_CONFIG)
+    config["book_num"] = "1"
+    config["convert"]["metadata_path"] = {"default": str(tmp_path / "metadata.txt")}
+    config["convert"]["frontmatter_files"] = {}
+    config["convert"]["pdf_engine"] = "pandoc"
+    args = argparse.Namespace(
+        config=config,
+        filename=[str(manuscript)],
+        artifact_dir=str(tmp_path / "_output"),
+        clean=False,
+        subtitle="",
+        format=["text", "pdf"],
+    )
+    novel.convert_multiple_formats(args, args.format)
+
+    outputs = {path.parent.name: path.name for path in (tmp_path / "_output").glob("*/*.md")}
+    assert sorted(outputs) == ["pdf", "text"]
+    assert outputs["pdf"] == outputs["text"] == f"{convert.get_output_basestr(args)}.md"
+    text = (tmp_path / "_output" / "text" / outputs["text"]).read_text(encoding="utf-8")
+    pdf = (tmp_path / "_output" / "pdf" / outputs["pdf"]).read_text(encoding="utf-8")
+    assert "She said--hello." in text
+    assert "She said&mdash;hello." in pdf
+    assert len(reads) == 3
+    assert len(commands) == 1 and commands[0][0] == "pandoc"
+
+
+@pytest.mark.parametrize(
+    "format_, engine, works",
+    (
+        ("pdf", "auto", True),
+        ("pdf", "pandoc", False),
+        ("epub", "auto", True),
+        ("epub", "pandoc", False),
+    ),
+)
+def test_novel_convert_without_pandoc(tmp_path, monkeypatch, capsys, format_, engine, works):
+    """The in-process pdf renderer and the native epub packager don't need pandoc or magick."""
+    if format_ == "epub":
+        pytest.importorskip("markdown")
+    monkeypatch.chdir(tmp_path)
+    manuscript = tmp_path / "manuscript"
+    manuscript.mkdir()
+    (manuscript / "1_01_01 - Alice.md").write_text("---\ntags: []\n---\nOne.\n", encoding="utf-8")
+    (tmp_path / "metadata.txt").write_text(
+        "---\ntitle: Book\ncover-image: cover.png\n---\n", encoding="utf-8"
+    )
+    (tmp_path / "cover.png").write_bytes(b"png")
+    repo = Repo.init(tmp_path)
+    repo.index.add(["metadata.txt"])
+    repo.index.commit("metadata", author=Actor("Test", "test@example.com"))
+
+    class Renderer:
+        def render(self, from_, output_pdf, css_path, toc=False):
+            output_pdf.write_bytes(b"pdf")
+
+    def check_call(cmd):
+        """Draw the cover; only called when the cover isn't cached."""
+        shutil.copyfile(cmd[1], cmd[-1])
+
+    monkeypatch.setattr(shutil, "which", lambda cmd: None)
+    monkeypatch.setattr(pdf_backend, "HAS_WEASYPRINT", True)
+    monkeypatch.setattr(convert, "get_pdf_renderer", Renderer)
+    monkeypatch.setattr(epub, "check_call", check_call)
+    config = deepcopy(DEFAULT_CONFIG)
+    config["book_num"] = "1"
+    config["cache_dir"] = str(tmp_path / "cache")
+    config["convert"]["metadata_path"] = {"default": str(tmp_path / "metadata.txt")}
+    config["convert"]["frontmatter_files"] = {}
+    config["convert"][f"{format_}_engine"] = engine
+    args = argparse.Namespace(
+        config=config,
+        filename=[str(manuscript)],
+        artifact_dir=str(tmp_path / "_output"),
+        clean=False,
+        subtitle="",
+        format=[format_],
+    )
+    if not works:
+        with pytest.raises(SystemExit):
+            novel.novel_convert(args)
+        assert "requires `pandoc`" in capsys.readouterr().err
+        return
+    novel.novel_convert(args)
+    assert len(list((tmp_path / "_output").glob(f"*.{format_}"))) == 1
+
+
 def test_novel_lint():
     pass
 
 
+@pytest.mark.parametrize("in_repo", (False, True))
+def test_novel_lint_changed_error(tmp_path, monkeypatch, capsys, in_repo):
+    """No git repo, or a bad `--since` revision, is an error message rather than a traceback."""
+    monkeypatch.chdir(tmp_path)
+    if in_repo:
+        Repo.init(tmp_path)
+    args = argparse.Namespace(
+        config=deepcopy(DEFAULT_CONFIG), path=[], changed=False, since="nonexistent-rev"
+    )
+    with pytest.raises(SystemExit) as exc_info:
+        novel.novel_lint(args)
+    assert exc_info.value.code == 1
+    assert ("nonexistent-rev" if in_repo else "git repo") in capsys.readouterr().err
+
+
 def test_novel_links():
     pass
 
@@ -35,15 +184,51 @@ def test_novel_new():
     pass
 
 
-def test_novel_outline_convert():
-    pass
+@pytest.mark.parametrize("no_html", (False, True))
+@pytest.mark.parametrize("in_process", (False, True))
+def test_novel_outline_convert(tmp_path, monkeypatch, no_html, in_process):
+    """Both pdfs are built from the html views of a single parse."""
+    commands = []
 
+    class Renderer:
+        def render(self, from_, output_pdf, css_path, toc=False):
+            commands.append([output_pdf])
 
-def test_novel_stats():
-    pass
+    monkeypatch.setattr(convert, "check_call", lambda cmd: commands.append(cmd))
+    monkeypatch.setattr(convert, "get_pdf_renderer", Renderer)
+    monkeypatch.setattr(convert, "use_pdf_renderer", lambda config: in_process)
+    monkeypatch.setattr(novel, "use_pdf_renderer", lambda config: in_process)
+    config = deepcopy(DEFAULT_CONFIG)
+    config["outline"]["single"]["primary_outline_file"] = str(
+        TEST_DATA_DIR / "matrix" / "matrix-full.md"
+    )
+    args = argparse.Namespace(
+        config=config,
+        artifact_dir=str(tmp_path),
+        clean=False,
+        no_cache=True,
+        format="pdf",
+        no_html=no_html,
+        naming_context={
+            "book_num": "1",
+            "datestr": "2024.01.01",
+            "subtitle_dash": "",
+            "revstr": "abc",
+        },
+    )
+    novel.novel_outline_convert(args)
+
+    assert sorted(str(cmd[-1]) for cmd in commands) == [
+        str(tmp_path / "book1-2024.01.01-abc-arcs.pdf"),
+        str(tmp_path / "book1-2024.01.01-abc-scenes.pdf"),
+    ]
+    html = sorted(path.name for path in tmp_path.glob("*.html"))
+    assert html == (
+        [] if no_html else ["book1-2024.01.01-abc-arcs.html", "book1-2024.01.01-abc-scenes.html"]
+    )
 
 
-def test_arc_grep():
+def test_novel_stats():
     pass
 
 
@@ -51,6 +236,38 @@ def test_novel_sync():
     pass
 
 
+@pytest.mark.parametrize("primary_outline_type", ("scenes", "povs", "full"))
+def test_create_single_sync_set_book_sets(monkeypatch, tmp_path, primary_outline_type):
+    """Merging the books' parsed outlines should write the same series files as reparsing."""
+    with open(TEST_DATA_DIR / "matrix" / "matrix-full.md") as fh:
+        lines = [line for line in fh if line.startswith("|")]
+    header, rows = lines[:2], lines[2:]
+    paths = []
+    for book_num, book_rows in (
+        (1, rows),
+        (2, [row.replace(" |", "2 |", 1) for row in rows[::-1]]),
+    ):
+        path = tmp_path / f"book{book_num}-source.md"
+        path.write_text("".join(header + book_rows))
+        paths.append(path)
+
+    book_sets = [
+        novel.create_single_sync_set(
+            [path], tmp_path / f"book{i}", primary_outline_type, "{outline_type}.md"
+        )
+        for i, path in enumerate(paths)
+    ]
+    novel.create_single_sync_set(
+        paths, tmp_path / "parsed", primary_outline_type, "{outline_type}.md"
+    )
+    monkeypatch.setattr(novel, "build_table_from_files", None)
+    novel.create_single_sync_set(
+        paths, tmp_path / "merged", primary_outline_type, "{outline_type}.md", book_sets=book_sets
+    )
+    for path in (tmp_path / "parsed").iterdir():
+        assert (tmp_path / "merged" / path.name).read_text() == path.read_text()
+
+
 def test_novel_today():
     pass
 
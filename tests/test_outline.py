@@ -1,8 +1,12 @@
 """Test outline."""
 
+import os
+from copy import deepcopy
+
 import pytest
 
 import markdown_novel_tools.outline as outline
+from markdown_novel_tools.constants import BEATS_REGEX, QUESTIONS_REGEX
 
 from . import TEST_DATA_DIR
 
@@ -274,3 +278,208 @@ def test_missing_table():
         beats, _ = outline.beats_helper(
             scene_path, target_table_num=8, column="Scene", multi_table_output=True
         )
+
+
+@pytest.mark.parametrize(
+    "filter_",
+    (["01.01"], ["13.02", "1.13.02"], ["02.01", "01.01"], ["99.99"]),
+)
+def test_get_scene_yaml(filter_):
+    table = outline.build_table_from_files(GENERAL_DATA_DIR / "test-simple.md", column="Scene")
+    expected = outline.get_yaml_from_table(table, filter_=filter_) or None
+    assert outline.get_scene_yaml(outline.get_yaml_by_scene(table), filter_) == expected
+
+
+@pytest.mark.parametrize(
+    "beats_type, regex",
+    (("questions", QUESTIONS_REGEX), ("beats", BEATS_REGEX)),
+)
+def test_beats_helper_row_filter(beats_type, regex):
+    """Filtering the split arcs table by beat should result in the same file."""
+    with open(MATRIX_DATA_DIR / f"matrix-{beats_type}.md") as fh:
+        contents = fh.read()
+    beats, _ = outline.beats_helper(
+        MATRIX_DATA_DIR / "matrix-full.md",
+        column="Arc",
+        file_headers=True,
+        multi_table_output=True,
+        split_columns=["Arc", "Beat"],
+        also_split_by_slash=True,
+        beats_type=beats_type,
+        row_filter=outline.column_regex_filter(regex),
+    )
+    assert beats == contents
+
+
+@pytest.mark.parametrize("regex, expected_rows", ((QUESTIONS_REGEX, 0), (BEATS_REGEX, 1)))
+def test_get_markdown_from_table_row_filter(regex, expected_rows):
+    table = outline.build_table_from_files(GENERAL_DATA_DIR / "test-simple.md")
+    table.parsed_lines = {None: table.parsed_lines[None][:1]}
+    table.parsed_lines[None][0] = table.parsed_lines[None][0]._replace(Beat="Hook")
+    mdoutput = outline.get_markdown_from_table(table, row_filter=outline.column_regex_filter(regex))
+    # The table header is skipped when no rows survive
+    assert mdoutput.count("\n") == (expected_rows + 2 if expected_rows else 0)
+
+
+@pytest.mark.parametrize(
+    "parts, split_columns, also_split_by_slash, expected",
+    (
+        (["a", "b"], (), False, [("a", "b")]),
+        (
+            ["a", ["c", "d", "e"], ["f", "g"]],
+            (1, 2),
+            False,
+            [("a", "c", "f"), ("a", "d", "g"), ("a", "e", "")],
+        ),
+        (
+            ["a", ["c/d", "e"], ["f/g"]],
+            (1, 2),
+            True,
+            [
+                ("a", "c", "f"),
+                ("a", "c", "g"),
+                ("a", "d", "f"),
+                ("a", "d", "g"),
+                ("a", "e", ""),
+            ],
+        ),
+    ),
+)
+def test_iter_split_parts(parts, split_columns, also_split_by_slash, expected):
+    rows = outline.iter_split_parts(parts, split_columns, also_split_by_slash)
+    assert [tuple(row) for row in rows] == expected
+    assert outline.count_split_parts(parts, split_columns, also_split_by_slash) == len(expected)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    (
+        {},
+        {"column": "Scene"},
+        {"column": "Arc", "split_columns": ["Arc", "Beat"], "also_split_by_slash": True},
+        {"column": "Arc", "split_columns": ["Arc", "Beat"], "filter_": ["Hook"]},
+    ),
+)
+def test_beats_helper_stats_only(kwargs):
+    """`stats_only` should count the same beats as a full build, without keeping the lines."""
+    _, expected = outline.beats_helper(MATRIX_DATA_DIR / "matrix-full.md", stats=True, **kwargs)
+    stdout, stderr = outline.beats_helper(
+        MATRIX_DATA_DIR / "matrix-full.md", stats_only=True, **kwargs
+    )
+    assert stdout == ""
+    assert stderr == expected
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    (
+        {},
+        {"column": "POV"},
+        {"column": "Arc", "split_columns": ["Arc", "Beat"], "also_split_by_slash": True},
+        {"column": "Scene", "count_only": True},
+    ),
+)
+def test_build_table_from_files_cache(tmp_path, kwargs):
+    """The second build loads the snapshot, and renders the same as a fresh parse."""
+    expected = outline.build_table_from_files(MATRIX_DATA_DIR / "matrix-full.md", **kwargs)
+    for _ in range(2):
+        table = outline.build_table_from_files(
+            MATRIX_DATA_DIR / "matrix-full.md", cache_dir=tmp_path, **kwargs
+        )
+        assert len(list(tmp_path.glob("*.pickle"))) == 1
+        assert table.parsed_lines == expected.parsed_lines
+        assert table.max_width == expected.max_width
+        assert table.column_values == expected.column_values
+        assert outline.get_beats(table, stats=True) == outline.get_beats(expected, stats=True)
+
+
+def test_get_table_cache_key(tmp_path):
+    path = tmp_path / "outline.md"
+    path.write_text("| Scene | POV |\n|---|---|\n| 01.01 | Neo |\n")
+    key = outline.get_table_cache_key([path], column="Scene")
+    assert key == outline.get_table_cache_key([path], column="Scene")
+    assert key != outline.get_table_cache_key([path], column="POV")
+    path.write_text("| Scene | POV |\n|---|---|\n| 01.01 | Trinity |\n")
+    assert key != outline.get_table_cache_key([path], column="Scene")
+
+
+def test_load_table_snapshot_broken(tmp_path):
+    (tmp_path / "broken.pickle").write_bytes(b"not a pickle")
+    assert outline.load_table_snapshot(tmp_path, "broken") is None
+    assert outline.load_table_snapshot(tmp_path, "missing") is None
+
+
+def test_evict_table_snapshots(tmp_path):
+    """The least recently used snapshots go first."""
+    for i, name in enumerate(("old", "used", "new")):
+        path = tmp_path / f"{name}.pickle"
+        path.write_bytes(b"x" * 10)
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+    # Loading a snapshot touches it.
+    os.utime(tmp_path / "used.pickle")
+    outline.evict_table_snapshots(tmp_path, max_bytes=20)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["new.pickle", "used.pickle"]
+
+
+@pytest.mark.parametrize("column", (None, "Scene", "POV"))
+def test_merge_tables(column):
+    """Merging per-file tables matches parsing the files together."""
+    paths = [GENERAL_DATA_DIR / "test-simple.md", MATRIX_DATA_DIR / "matrix-full.md"]
+    expected = outline.build_table_from_files(paths, column=column)
+    merged = outline.merge_tables(
+        [outline.build_table_from_files(path, column=column) for path in paths]
+    )
+    assert merged.parsed_lines == expected.parsed_lines
+    assert merged.max_width == expected.max_width
+    assert outline.get_beats(merged, stats=True) == outline.get_beats(expected, stats=True)
+
+
+def test_natural_sort_key():
+    values = ["10.1", "2.10", None, "2.2", "02.2", "Arc"]
+    assert sorted(values[:2] + values[3:], key=outline.natural_sort_key) == [
+        "02.2",
+        "2.2",
+        "2.10",
+        "10.1",
+        "Arc",
+    ]
+    assert outline.natural_sort_key(None) < outline.natural_sort_key("1")
+
+
+@pytest.mark.parametrize("natural_sort", (False, True))
+def test_table_group_keys(tmp_path, natural_sort):
+    """The group index stays in order as lines are added, and survives a snapshot."""
+    path = tmp_path / "outline.md"
+    rows = "".join(f"| x | {scene} |\n" for scene in ("10.1", "2.1", "1.3", "2.1", "1.12"))
+    path.write_text(f"| POV | Scene |\n|---|---|\n{rows}")
+    expected = ["1.12", "1.3", "10.1", "2.1"]
+    if natural_sort:
+        expected = ["1.3", "1.12", "2.1", "10.1"]
+    for _ in range(2):
+        table = outline.build_table_from_files(
+            path, column="Scene", natural_sort=natural_sort, cache_dir=tmp_path
+        )
+        assert table.group_keys == expected
+        assert [key for key, _ in table.sorted_groups()] == expected
+        assert len(table.parsed_lines["2.1"]) == 2
+        assert outline.get_beats(table, stats=True)[1].startswith(f"Num values: 4 {expected}")
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    (
+        {"column": "Scene"},
+        {"column": "Arc", "split_columns": ["Arc", "Beat"]},
+        {"column": "Arc", "split_columns": ["Arc", "Beat"], "also_split_by_slash": True},
+    ),
+)
+def test_table_regroup(kwargs):
+    """Regrouping a parsed table matches parsing the file again with those options."""
+    path = MATRIX_DATA_DIR / "matrix-full.md"
+    expected = outline.build_table_from_files(path, **deepcopy(kwargs))
+    table = outline.build_table_from_files(path).regroup(**kwargs)
+    assert table.parsed_lines == expected.parsed_lines
+    assert table.max_width == expected.max_width
+    assert outline.get_beats(table, multi_table_output=True, stats=True) == outline.get_beats(
+        expected, multi_table_output=True, stats=True
+    )
@@ -0,0 +1,86 @@
+"""Test outline_query."""
+
+import re
+
+import pytest
+
+import markdown_novel_tools.outline as outline
+import markdown_novel_tools.outline_query as outline_query
+
+from . import TEST_DATA_DIR
+
+MATRIX_FULL = TEST_DATA_DIR / "matrix" / "matrix-full.md"
+
+
+@pytest.mark.parametrize(
+    "string, expected",
+    (
+        ("POV=Trinity", ("eq", "POV", "Trinity")),
+        ("Arc = 'The One'", ("eq", "Arc", "The One")),
+        ("POV in (Neo, 'Agent Smith')", ("in", "POV", ("Neo", "Agent Smith"))),
+        ("Scene=10..20", ("range", "Scene", (10,), (20,))),
+        ("Scene=1.2..3.4", ("range", "Scene", (1, 2), (3, 4))),
+        ("Scene='1..2'", ("eq", "Scene", "1..2")),
+        ('Beat~="^Pinch"', ("regex", "Beat", re.compile("^Pinch"))),
+        (
+            "a=1 or b=2 and not c=3",
+            ("or", ("eq", "a", "1"), ("and", ("eq", "b", "2"), ("not", ("eq", "c", "3")))),
+        ),
+        (
+            "(a=1 OR b=2) and c=3",
+            ("and", ("or", ("eq", "a", "1"), ("eq", "b", "2")), ("eq", "c", "3")),
+        ),
+    ),
+)
+def test_parse_where(string, expected):
+    assert outline_query.parse_where(string) == expected
+
+
+@pytest.mark.parametrize(
+    "string", ("", "POV", "POV=", "(POV=Neo", "POV=Neo)", "POV in Neo", "POV in (Neo,)", "Arc~='('")
+)
+def test_parse_where_error(string):
+    with pytest.raises(ValueError):
+        outline_query.parse_where(string)
+
+
+def test_where_columns():
+    tree = outline_query.parse_where("(Arc=a or POV=b) and not Arc=c and Scene=1..2")
+    assert outline_query.where_columns(tree) == ["Arc", "POV", "Scene"]
+
+
+def _expected_lines(table, test):
+    """Return the lines of `table` that `test` keeps, by scanning every line."""
+    return [line for lines in table.parsed_lines.values() for line in lines if test(line)]
+
+
+@pytest.mark.parametrize("column", (None, "POV", "Arc"))
+@pytest.mark.parametrize(
+    "string, test",
+    (
+        ("POV=Trinity", lambda line: line.POV == "Trinity"),
+        ("POV in (Neo, Morpheus)", lambda line: line.POV in ("Neo", "Morpheus")),
+        ("Arc=Judas and POV=Trinity", lambda line: line.Arc == "Judas" and line.POV == "Trinity"),
+        ("Scene=2..3.1", lambda line: "02.01" <= line.Scene <= "03.01"),
+        ("Beat~='^Pinch'", lambda line: line.Beat.startswith("Pinch")),
+        ("not Beat=Hook", lambda line: line.Beat != "Hook"),
+        ("Arc=Nobody", lambda line: False),
+    ),
+)
+def test_where_filter(column, string, test):
+    table = outline.build_table_from_files(
+        MATRIX_FULL, column=column, split_columns=["Arc", "Beat"]
+    )
+    row_filter = outline_query.where_filter(table, outline_query.parse_where(string))
+    assert _expected_lines(table, row_filter) == _expected_lines(table, test)
+
+
+def test_beats_helper_where():
+    """Only the matching lines are rendered, and counted in the stats."""
+    stdout, stderr = outline.beats_helper(
+        MATRIX_FULL, stats=True, where=outline_query.parse_where("POV=Trinity and Scene=1..1")
+    )
+    rows = stdout.splitlines()[2:]
+    assert rows
+    assert all("| Trinity " in row and "| 01." in row for row in rows)
+    assert stderr.endswith(f"Num matches: {len(rows)}")
@@ -0,0 +1,186 @@
+"""Test pandoc_backend."""
+
+import base64
+import json
+import sys
+from copy import deepcopy
+
+import pytest
+
+import markdown_novel_tools.pandoc_backend as pandoc_backend
+from markdown_novel_tools.constants import DEFAULT_CONFIG
+
+# A stand-in for `pandoc-server --port N`: reply with the text upper-cased.
+FAKE_SERVER = """
+import base64, json, sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+class Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with open(sys.argv[1], "w", encoding="utf-8") as fh:
+            json.dump(payload, fh)
+        if payload["to"] == "docx":
+            output = {"output": base64.b64encode(b"DOCX").decode("ascii"), "base64": True}
+        else:
+            output = {"output": payload["text"].upper(), "base64": False}
+        body = json.dumps(output).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+HTTPServer(("127.0.0.1", int(sys.argv[sys.argv.index("--port") + 1])), Handler).serve_forever()
+"""
+
+
+@pytest.fixture
+def fake_server(tmp_path):
+    """Start the fake server, which writes the last payload it got to `tmp_path/payload.json`."""
+    server = pandoc_backend.PandocServer(
+        [sys.executable, "-c", FAKE_SERVER, str(tmp_path / "payload.json")]
+    )
+    assert server.start()
+    yield server
+    server.stop()
+    assert not server.running
+
+
+@pytest.fixture
+def no_shared_server(monkeypatch):
+    monkeypatch.setattr(pandoc_backend, "_server", None)
+
+
+@pytest.mark.parametrize(
+    "options, expected",
+    (
+        (None, []),
+        ({"columns": 80, "toc": True, "standalone": False}, ["--columns=80", "--toc"]),
+        ({"css": ["a.css", "b.css"], "template": None}, ["--css=a.css", "--css=b.css"]),
+    ),
+)
+def test_pandoc_option_args(options, expected):
+    assert pandoc_backend.pandoc_option_args(options) == expected
+
+
+@pytest.mark.parametrize(
+    "engine, expected",
+    (
+        ("auto", True),
+        ("subprocess", False),
+        (None, True),
+    ),
+)
+def test_use_pandoc_server(engine, expected):
+    config = {"convert": {} if engine is None else {"pandoc_engine": engine}}
+    assert pandoc_backend.use_pandoc_server(config) is expected
+
+
+def test_use_pandoc_server_invalid():
+    with pytest.raises(ValueError):
+        pandoc_backend.use_pandoc_server({"convert": {"pandoc_engine": "docker"}})
+
+
+def test_server_convert(fake_server):
+    """Text comes back as str, and binary output as bytes."""
+    assert fake_server.convert("# One\n", "markdown", "html5", options={"columns": 80}) == "# ONE\n"
+    assert fake_server.convert(b"PK\x03\x04", "docx", "docx") == b"DOCX"
+
+
+def test_server_convert_payload(tmp_path, fake_server):
+    """Options go at the top level of the payload, and binary input as base64."""
+    fake_server.convert("text", "markdown", "html5", {"columns": 80})
+    payload = json.loads((tmp_path / "payload.json").read_text(encoding="utf-8"))
+    assert payload == {"columns": 80, "from": "markdown", "to": "html5", "text": "text"}
+    fake_server.convert(b"PK\x03\x04", "docx", "docx")
+    payload = json.loads((tmp_path / "payload.json").read_text(encoding="utf-8"))
+    assert payload["text"] == base64.b64encode(b"PK\x03\x04").decode("ascii")
+
+
+@pytest.mark.skipif(pandoc_backend.pandoc_server_cmd() is None, reason="pandoc isn't installed")
+def test_real_server():
+    """A real pandoc-server accepts our payloads, and agrees with a one-shot pandoc."""
+    server = pandoc_backend.PandocServer(pandoc_backend.pandoc_server_cmd())
+    assert server.start()
+    try:
+        text = "# One {#heading-one}\n\nShe said---hi.\n"
+        assert server.convert(text, "markdown", "html5") == pandoc_backend.run_pandoc(
+            text, "markdown", "html5"
+        )
+        assert server.convert(text, "markdown", "plain", {"columns": 20}) == (
+            pandoc_backend.run_pandoc(text, "markdown", "plain", options={"columns": 20})
+        )
+        docx = server.convert(text, "markdown", "docx")
+        assert docx.startswith(b"PK")
+        assert "She said" in server.convert(docx, "docx", "markdown")
+    finally:
+        server.stop()
+
+
+def test_server_start_failure():
+    """A command that exits, or doesn't exist, never starts."""
+    assert not pandoc_backend.PandocServer([sys.executable, "-c", "pass"]).start()
+    assert not pandoc_backend.PandocServer(["/nonexistent/pandoc-server"]).start()
+
+
+def test_get_pandoc_server(monkeypatch, no_shared_server):
+    """Starting the shared server is only tried once, and never for `subprocess`."""
+    calls = []
+
+    def pandoc_server_cmd():
+        calls.append(True)
+
+    monkeypatch.setattr(pandoc_backend, "pandoc_server_cmd", pandoc_server_cmd)
+    config = deepcopy(DEFAULT_CONFIG)
+    assert pandoc_backend.get_pandoc_server(config) is None
+    assert pandoc_backend.get_pandoc_server(config) is None
+    assert len(calls) == 1
+    config["convert"]["pandoc_engine"] = "subprocess"
+    monkeypatch.setattr(pandoc_backend, "_server", None)
+    assert pandoc_backend.get_pandoc_server(config) is None
+    assert len(calls) == 1
+
+
+def test_get_pandoc_server_started(tmp_path, monkeypatch, no_shared_server):
+    monkeypatch.setattr(
+        pandoc_backend,
+        "pandoc_server_cmd",
+        lambda: [sys.executable, "-c", FAKE_SERVER, str(tmp_path / "payload.json")],
+    )
+    monkeypatch.setattr(pandoc_backend.atexit, "register", lambda func: None)
+    server = pandoc_backend.get_pandoc_server(DEFAULT_CONFIG)
+    try:
+        assert server.running
+        assert pandoc_backend.get_pandoc_server(DEFAULT_CONFIG) is server
+        assert pandoc_backend.pandoc_convert(DEFAULT_CONFIG, "a", "markdown", "html5") == "A\n"
+    finally:
+        server.stop()
+    # A dead server isn't handed out.
+    assert pandoc_backend.get_pandoc_server(DEFAULT_CONFIG) is None
+
+
+@pytest.mark.parametrize("server_error", (None, OSError("connection refused")))
+def test_pandoc_convert_fallback(monkeypatch, server_error):
+    """Without a server, or when it fails, run a one-shot pandoc."""
+    runs = []
+
+    class Server:
+        def convert(self, *args, **kwargs):
+            raise server_error
+
+    monkeypatch.setattr(
+        pandoc_backend,
+        "get_pandoc_server",
+        lambda config: None if server_error is None else Server(),
+    )
+    monkeypatch.setattr(
+        pandoc_backend, "run_pandoc", lambda *args, **kwargs: runs.append((args, kwargs)) or "out"
+    )
+    output = pandoc_backend.pandoc_convert(
+        DEFAULT_CONFIG, "text", "markdown", "html5", options={"columns": 80}
+    )
+    assert output == "out"
+    assert runs == [(("text", "markdown", "html5"), {"options": {"columns": 80}})]
@@ -0,0 +1,92 @@
+"""Test pdf_backend."""
+
+import argparse
+from copy import deepcopy
+
+import pytest
+
+import markdown_novel_tools.convert as convert
+import markdown_novel_tools.pdf_backend as pdf_backend
+from markdown_novel_tools.constants import DEFAULT_CONFIG
+
+
+@pytest.mark.parametrize(
+    "engine, has_weasyprint, expected",
+    (
+        ("auto", True, True),
+        ("auto", False, False),
+        ("pandoc", True, False),
+        (None, True, True),
+    ),
+)
+def test_use_pdf_renderer(monkeypatch, engine, has_weasyprint, expected):
+    monkeypatch.setattr(pdf_backend, "HAS_WEASYPRINT", has_weasyprint)
+    config = {"convert": {} if engine is None else {"pdf_engine": engine}}
+    assert pdf_backend.use_pdf_renderer(config) is expected
+
+
+def test_use_pdf_renderer_invalid():
+    with pytest.raises(ValueError):
+        pdf_backend.use_pdf_renderer({"convert": {"pdf_engine": "prince"}})
+
+
+def test_title_block():
+    assert pdf_backend._title_block({}) == ""
+    assert pdf_backend._title_block({"title": "A & B", "author": ["Aki", "Bo"]}) == (
+        '<header id="title-block-header">\n'
+        '<h1 class="title">A &amp; B</h1>\n'
+        '<p class="author">Aki</p>\n'
+        '<p class="author">Bo</p>\n'
+        "</header>\n"
+    )
+
+
+def test_markdown_extensions_smart_typography():
+    """Quotes and dashes come out like pandoc's `smart` extension makes them."""
+    markdown = pytest.importorskip("markdown")
+    html = markdown.markdown(
+        'He said "hi" -- and left. It\'s --- done.',
+        extensions=list(pdf_backend.MARKDOWN_EXTENSIONS),
+    )
+    assert html == ("<p>He said &ldquo;hi&rdquo; &ndash; and left. It&rsquo;s &mdash; done.</p>")
+
+
+@pytest.mark.parametrize("in_process", (True, False))
+def test_single_markdown_to_pdf(tmp_path, monkeypatch, in_process):
+    """Render through the shared renderer if we can, otherwise through pandoc."""
+    renders = []
+    commands = []
+
+    class Renderer:
+        def render(self, *args, **kwargs):
+            renders.append((args, kwargs))
+
+    monkeypatch.setattr(convert, "use_pdf_renderer", lambda config: in_process)
+    monkeypatch.setattr(convert, "get_pdf_renderer", Renderer)
+    monkeypatch.setattr(convert, "check_call", commands.append)
+    args = argparse.Namespace(config=deepcopy(DEFAULT_CONFIG), artifact_dir=str(tmp_path))
+    convert.single_markdown_to_pdf(args, "book", tmp_path / "book.md", toc=True, css_path="a.css")
+    if in_process:
+        assert renders == [((tmp_path / "book.md", tmp_path / "book.pdf", "a.css"), {"toc": True})]
+        assert commands == []
+    else:
+        assert renders == []
+        assert commands[0][0] == "pandoc"
+
+
+def test_pdf_renderer(tmp_path):
+    """Render two documents through one warm renderer."""
+    pytest.importorskip("markdown")
+    pytest.importorskip("weasyprint")
+    (tmp_path / "style.css").write_text("body { font-size: 12px; }\n")
+    (tmp_path / "book.md").write_text("---\ntitle: Book\n---\n# One\n\nText.\n")
+    (tmp_path / "outline.html").write_text("<html><body><p>Outline</p></body></html>\n")
+    renderer = pdf_backend.PdfRenderer()
+    assert '<h1 class="title">Book</h1>' in renderer.markdown_to_html(
+        (tmp_path / "book.md").read_text(), toc=True
+    )
+    for name in ("book.md", "outline.html"):
+        output_pdf = tmp_path / f"{name}.pdf"
+        renderer.render(tmp_path / name, output_pdf, tmp_path / "style.css")
+        assert output_pdf.read_bytes().startswith(b"%PDF")
+    assert list(renderer._stylesheets) == [str(tmp_path / "style.css")]
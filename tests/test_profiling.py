@@ -0,0 +1,112 @@
+"""Test profiling."""
+
+import argparse
+import json
+
+import pytest
+
+import markdown_novel_tools.profiling as profiling
+from markdown_novel_tools.mdfile import get_markdown_file
+
+
+@pytest.fixture
+def profiler():
+    """Enable the global profiler for a test, and reset it after."""
+    profiling.PROFILER.reset()
+    profiling.PROFILER.enable()
+    yield profiling.PROFILER
+    profiling.PROFILER.reset()
+
+
+def test_disabled_is_a_noop():
+    profiling.PROFILER.reset()
+
+    @profiling.timed()
+    def func():
+        return 1
+
+    with profiling.span("foo"):
+        profiling.count("bar")
+    assert func() == 1
+    assert profiling.PROFILER.spans == []
+    assert not profiling.PROFILER.counters
+
+
+def test_spans_and_counters(profiler):
+    @profiling.timed()
+    def func(value):
+        profiling.count("calls")
+        return value
+
+    @profiling.timed("custom")
+    def other():
+        pass
+
+    assert func(3) == 3
+    func(4)
+    other()
+    with profiling.span("block"):
+        profiling.count("bytes", 10)
+    names = [span[0] for span in profiler.spans]
+    assert names == ["test_profiling.func", "test_profiling.func", "custom", "block"]
+    assert profiler.counters == {"calls": 2, "bytes": 10}
+    report = profiler.report()
+    assert "test_profiling.func" in report
+    assert "bytes" in report
+
+
+def test_span_records_on_exception(profiler):
+    with pytest.raises(ValueError):
+        with profiling.span("boom"):
+            raise ValueError("boom")
+    assert [span[0] for span in profiler.spans] == ["boom"]
+
+
+def test_chrome_trace(profiler):
+    with profiling.span("outer"):
+        with profiling.span("inner"):
+            profiling.count("things", 2)
+    trace = profiler.chrome_trace()
+    events = {event["name"]: event for event in trace["traceEvents"]}
+    assert events["outer"]["ph"] == "X"
+    assert events["outer"]["dur"] >= events["inner"]["dur"]
+    assert events["counters"]["args"] == {"things": 2}
+    json.dumps(trace)
+
+
+def test_file_counters(profiler, tmp_path):
+    path = tmp_path / "foo.md"
+    path.write_text("---\ntags: [scene]\n---\nfoo bar\n", encoding="utf-8")
+    get_markdown_file(path)
+    assert profiler.counters == {"files read": 1, "bytes read": path.stat().st_size}
+    assert [span[0] for span in profiler.spans] == ["mdfile.get_markdown_file"]
+
+
+@pytest.mark.parametrize("output", (False, True))
+def test_run_func(output, tmp_path, capsys):
+    profiling.PROFILER.reset()
+    parser = argparse.ArgumentParser()
+    profiling.add_profile_parser_args(parser)
+    argv = ["--profile"]
+    if output:
+        argv = ["--profile-output", str(tmp_path / "trace.json")]
+    args = parser.parse_args(argv)
+
+    def subcommand(_):
+        with profiling.span("work"):
+            pass
+
+    args.func = subcommand
+    try:
+        profiling.run_func(args)
+    finally:
+        profiling.PROFILER.reset()
+    stderr = capsys.readouterr().err
+    if output:
+        with open(tmp_path / "trace.json", encoding="utf-8") as fh:
+            names = [event["name"] for event in json.load(fh)["traceEvents"]]
+        assert names == ["work", "subcommand"]
+        assert stderr == ""
+    else:
+        assert "subcommand" in stderr
+        assert "work" in stderr
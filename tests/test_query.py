@@ -0,0 +1,111 @@
+"""Test query."""
+
+import os
+
+import pytest
+
+import markdown_novel_tools.query as query
+
+SCENES = {
+    "1_01_01 - Alice.md": "pov: '[[Alice]]'\ncharacters: ['[[Alice]]', '[[Bob]]']\nlocations: [Old Town]\n",
+    "1_01_02 - Bob.md": "pov: Bob\ncharacters: [Bob, Carol]\nlocations: [Harbor]\ntodo: [fix it]\n",
+    "1_02_01 - Carol.md": "pov: Carol\ncharacters: [Carol]\nlocations: [Old Mill]\ntodo:\n",
+}
+
+
+@pytest.fixture
+def vault(tmp_path):
+    """Write the scenes, and return their paths by name."""
+    paths = {}
+    for name, frontmatter in SCENES.items():
+        path = tmp_path / name
+        path.write_text(f"---\n{frontmatter}---\nText.\n", encoding="utf-8")
+        paths[name] = str(path)
+    (tmp_path / "broken.md").write_text("---\npov: [\n---\nText.\n", encoding="utf-8")
+    paths["broken.md"] = str(tmp_path / "broken.md")
+    return paths
+
+
+@pytest.mark.parametrize(
+    "string, expected",
+    (
+        ("pov=Alice", ("eq", "pov", "Alice")),
+        ("pov = '[[Alice]]'", ("eq", "pov", "Alice")),
+        ('locations^="Old T"', ("prefix", "locations", "Old T")),
+        ("todo", ("has", "todo")),
+        (
+            "a=1 or b=2 and not c",
+            ("or", ("eq", "a", "1"), ("and", ("eq", "b", "2"), ("not", ("has", "c")))),
+        ),
+        ("(a or b) AND c", ("and", ("or", ("has", "a"), ("has", "b")), ("has", "c"))),
+    ),
+)
+def test_parse_query(string, expected):
+    assert query.parse_query(string) == expected
+
+
+@pytest.mark.parametrize("string", ("", "pov=", "(pov", "pov=Alice)", "and pov", "pov=a=b"))
+def test_parse_query_error(string):
+    with pytest.raises(ValueError):
+        query.parse_query(string)
+
+
+@pytest.mark.parametrize(
+    "string, expected",
+    (
+        ("characters=Alice", ["1_01_01 - Alice.md"]),
+        ("characters=[[Bob]]", ["1_01_01 - Alice.md", "1_01_02 - Bob.md"]),
+        ("characters=Bob and not pov=Bob", ["1_01_01 - Alice.md"]),
+        ("locations^=Old", ["1_01_01 - Alice.md", "1_02_01 - Carol.md"]),
+        ("todo", ["1_01_02 - Bob.md"]),
+        ("not todo", ["1_01_01 - Alice.md", "1_02_01 - Carol.md", "broken.md"]),
+        (
+            "pov=Carol or (locations=Harbor and todo='fix it')",
+            ["1_01_02 - Bob.md", "1_02_01 - Carol.md"],
+        ),
+        ("pov=Dmitri", []),
+    ),
+)
+def test_run_query(vault, string, expected):
+    index = query.new_query_index()
+    keys, changed = query.update_query_index(index, list(vault.values()))
+    assert changed
+    matches = query.run_query(index, query.parse_query(string), keys)
+    assert sorted(os.path.basename(key) for key in matches) == expected
+
+
+def test_update_query_index(vault, tmp_path):
+    index_path = tmp_path / "index.json"
+    index = query.load_query_index(index_path)
+    keys, _ = query.update_query_index(index, list(vault.values()))
+    query.save_query_index(index_path, index)
+    index = query.load_query_index(index_path)
+    assert index["files"][vault["broken.md"]]["fields"] is None
+    assert query.update_query_index(index, list(vault.values())) == (keys, False)
+
+    # Edit one scene, and remove another
+    path = vault["1_01_01 - Alice.md"]
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write("---\npov: Dmitri\ncharacters: [Dmitri]\n---\nText.\n")
+    os.remove(vault["1_02_01 - Carol.md"])
+    paths = [path, vault["1_01_02 - Bob.md"]]
+    keys, changed = query.update_query_index(index, paths)
+    assert changed
+    assert query.run_query(index, query.parse_query("pov=Dmitri"), keys) == {path}
+    assert query.run_query(index, query.parse_query("characters=Alice"), keys) == set()
+    assert "locations" in index["postings"]
+    assert "Old Town" not in index["postings"]["locations"]
+    assert vault["1_02_01 - Carol.md"] not in index["files"]
+
+
+def test_load_query_index_invalid(tmp_path):
+    index_path = tmp_path / "index.json"
+    index_path.write_text('{"version": 0}', encoding="utf-8")
+    assert query.load_query_index(index_path) == query.new_query_index()
+
+
+def test_query_fields():
+    assert query.query_fields(query.parse_query("pov=a and (characters=b or not pov)")) == [
+        "pov",
+        "characters",
+    ]
@@ -0,0 +1,128 @@
+"""Test shunn."""
+
+from copy import deepcopy
+
+import pytest
+from git import Actor, Repo
+
+import markdown_novel_tools.shunn as shunn
+from markdown_novel_tools.constants import DEFAULT_CONFIG
+
+AUTHOR = Actor("Test", "test@example.com")
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    """Create a pandoc-templates mirror with two commits, and return it and the commits."""
+    path = tmp_path / "mirror"
+    repo = Repo.init(path)
+    script = path / "bin" / "md2long.sh"
+    script.parent.mkdir()
+    commits = []
+    for version in ("one", "two"):
+        script.write_text(f"echo {version}\n", encoding="utf-8")
+        repo.index.add(["bin/md2long.sh"])
+        commits.append(repo.index.commit(version, author=AUTHOR, committer=AUTHOR).hexsha)
+    return path, commits
+
+
+def _config(tmp_path, **kwargs):
+    config = deepcopy(DEFAULT_CONFIG)
+    config["cache_dir"] = str(tmp_path / "cache")
+    config["convert"].update(kwargs)
+    return config
+
+
+def test_get_shunn_repo_path(tmp_path):
+    config = _config(tmp_path, shunn_repo_path=str(tmp_path / "templates"))
+    assert shunn.get_shunn_repo(config) == tmp_path / "templates"
+
+
+def test_get_shunn_repo_cached(tmp_path, mirror, monkeypatch):
+    mirror_path, commits = mirror
+    config = _config(tmp_path, shunn_repo_mirror=str(mirror_path))
+    repo_path = shunn.get_shunn_repo(config)
+    assert repo_path == tmp_path / "cache" / "shunn" / "pandoc-templates"
+    assert Repo(repo_path).head.commit.hexsha == commits[1]
+
+    # The second run reuses the checkout, and undoes local edits
+    (repo_path / "bin" / "md2long.sh").write_text("echo edited\n", encoding="utf-8")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cloned twice")
+
+    monkeypatch.setattr(shunn.Repo, "clone_from", fail)
+    assert shunn.get_shunn_repo(config) == repo_path
+    assert (repo_path / "bin" / "md2long.sh").read_text(encoding="utf-8") == "echo two\n"
+
+    # Pin an older revision
+    config["convert"]["shunn_repo_rev"] = commits[0][:12]
+    shunn.get_shunn_repo(config)
+    assert Repo(repo_path).head.commit.hexsha == commits[0]
+
+
+@pytest.mark.parametrize("damage", ("empty", "missing-script", "not-a-repo"))
+def test_get_shunn_repo_damaged(tmp_path, mirror, damage):
+    """A damaged cached checkout, e.g. from an interrupted clone, is cloned again."""
+    mirror_path, commits = mirror
+    config = _config(tmp_path, shunn_repo_mirror=str(mirror_path))
+    repo_path = tmp_path / "cache" / "shunn" / "pandoc-templates"
+    if damage == "empty":
+        Repo.init(repo_path)
+    elif damage == "missing-script":
+        repo = Repo(shunn.get_shunn_repo(config))
+        repo.index.remove(["bin/md2long.sh"], working_tree=True)
+        repo.index.commit("remove", author=AUTHOR, committer=AUTHOR)
+    else:
+        repo_path.mkdir(parents=True)
+        (repo_path / "partial").write_text("", encoding="utf-8")
+    assert shunn.get_shunn_repo(config) == repo_path
+    assert Repo(repo_path).head.commit.hexsha == commits[1]
+    assert (repo_path / "bin" / "md2long.sh").read_text(encoding="utf-8") == "echo two\n"
+
+
+def test_get_shunn_repo_bad_rev(tmp_path, mirror):
+    mirror_path, _ = mirror
+    config = _config(tmp_path, shunn_repo_mirror=str(mirror_path), shunn_repo_rev="0" * 40)
+    with pytest.raises(SystemExit):
+        shunn.get_shunn_repo(config)
+
+
+SPLIT_MARKDOWN = """# One
+
+Alice.
+
+    * * *
+
+Bob.
+# Two
+
+Carol.
+"""
+
+
+@pytest.mark.parametrize(
+    "split_scenes, expected",
+    (
+        (
+            False,
+            {
+                "chapter001.md": "# One\n\nAlice.\n\n    * * *\n\nBob.\n",
+                "chapter002.md": "# Two\n\nCarol.\n",
+            },
+        ),
+        (
+            True,
+            {
+                "chapter001-scene001.md": "# One\n\nAlice.\n\n",
+                "chapter001-scene002.md": "\nBob.\n",
+                "chapter002-scene001.md": "# Two\n\nCarol.\n",
+            },
+        ),
+    ),
+)
+def test_split_markdown_chapters(tmp_path, split_scenes, expected):
+    lines = iter(SPLIT_MARKDOWN.splitlines(keepends=True))
+    paths = shunn.split_markdown_chapters(lines, tmp_path, split_scenes=split_scenes)
+    assert [path.name for path in paths] == list(expected)
+    assert {path.name: path.read_text(encoding="utf-8") for path in paths} == expected
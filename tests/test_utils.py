@@ -1,7 +1,67 @@
 """Test utils."""
 
+import random
+
+import pytest
+
 import markdown_novel_tools.utils as utils
+from markdown_novel_tools.constants import ALPHANUM_REGEX
+
+
+def _per_word_count_words(text):
+    """The original per-word implementation of `count_words`, for comparison."""
+    count = 0
+    for line in text.splitlines():
+        for word in line.split():
+            if ALPHANUM_REGEX.search(word):
+                count += 1
+    return count
+
+
+def _synthetic_corpus(num_words, seed=1):
+    """Return a prose-like corpus of roughly `num_words` words."""
+    rng = random.Random(seed)
+    vocab = (
+        'the and Alice said, walked toward door. "Hello," she whispered -- don\'t [[Bob]] '
+        "quickly into darkness * ... naïve _ 1984"
+    ).split(" ")
+    lines = []
+    count = 0
+    while count < num_words:
+        length = rng.randint(0, 40)
+        lines.append(" ".join(rng.choice(vocab) for _ in range(length)))
+        count += length
+    return "\n".join(lines) + "\n"
 
 
 def test_utils():
     pass
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    (
+        ("", 0),
+        ("one two three", 3),
+        ("-- leading symbol", 2),
+        ("trailing symbol --", 2),
+        ("--", 0),
+        ("    * * *\n", 0),
+        ("one -- two\n--\n---three", 3),
+        ("tab\tseparated\u00a0nbsp\u2028line", 4),
+        ("_ __ snake_case", 3),
+        ("naïve café — ok", 3),
+    ),
+)
+def test_count_words(text, expected):
+    assert utils.count_words(text) == expected
+    assert _per_word_count_words(text) == expected
+
+
+def test_count_words_fuzz():
+    """Random strings of word, symbol, and whitespace characters count the same as per-word."""
+    rng = random.Random(42)
+    alphabet = "ab_1é-*.,'\"[]— \t\n\r\u00a0\u2028\x1c\x85"
+    for _ in range(2000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        assert utils.count_words(text) == _per_word_count_words(text), repr(text)
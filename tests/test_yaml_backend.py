@@ -0,0 +1,82 @@
+"""Test yaml_backend."""
+
+from collections import Counter, OrderedDict
+
+import pytest
+import yaml
+
+import markdown_novel_tools.yaml_backend as yaml_backend
+from markdown_novel_tools.utils import yaml_string
+
+SCENE_FRONTMATTER = """tags: [scene, draft]
+aliases: []
+pov: "[[Alice]]"
+locations:
+- "[[Harbor]]"
+- "[[Old Town]]"
+characters:
+- "[[Alice]]"
+- "[[Bob]]"
+- "[[Carol]]"
+hook: Alice finds the letter.
+cliffhanger: "The seal is her mother's."
+summary:
+- Alice sneaks into the harbor master's office - the lock is already broken (Book Arc Hook, Mystery Question)
+- Bob covers for her; Carol notices, but says nothing (Bob Arc Pinch 1)
+- "She reads the letter: it's addressed to her, dated before she was born (Mystery Reveal)"
+todo:
+"""
+
+
+def _scene_frontmatter_corpus(num_scenes=500):
+    """Return a list of scene frontmatter strings."""
+    return [SCENE_FRONTMATTER.replace("Alice", f"Alice{i}") for i in range(num_scenes)]
+
+
+@pytest.mark.parametrize("pure", (True, False))
+def test_load_yaml(pure):
+    parsed = yaml_backend.load_yaml(SCENE_FRONTMATTER, pure=pure)
+    assert parsed["pov"] == "[[Alice]]"
+    assert parsed["todo"] is None
+    assert len(parsed["summary"]) == 3
+
+
+def test_load_yaml_error():
+    with pytest.raises(yaml_backend.YAMLError):
+        yaml_backend.load_yaml("foo: [")
+
+
+@pytest.mark.parametrize("pure", (True, False))
+def test_dump_yaml_none(pure):
+    assert yaml_backend.dump_yaml({"todo": None}, pure=pure) == "todo:\n"
+
+
+def test_yaml_string_roundtrip():
+    parsed = yaml_backend.load_yaml(SCENE_FRONTMATTER)
+    assert yaml_backend.load_yaml(yaml_string(parsed)) == parsed
+
+
+def test_fast_and_pure_match():
+    """The libyaml and pure python backends load and dump scene frontmatter the same."""
+    kwargs = {
+        "default_flow_style": False,
+        "width": yaml_backend.MAX_WIDTH,
+        "sort_keys": False,
+        "allow_unicode": True,
+    }
+    for frontmatter in _scene_frontmatter_corpus(20):
+        parsed = yaml_backend.load_yaml(frontmatter)
+        assert parsed == yaml_backend.load_yaml(frontmatter, pure=True)
+        assert yaml_backend.dump_yaml(parsed, **kwargs) == yaml_backend.dump_yaml(
+            parsed, pure=True, **kwargs
+        )
+
+
+@pytest.mark.parametrize("pure", (True, False))
+def test_dump_yaml_python_objects(pure):
+    """Python objects the safe dumpers can't represent fall back to the full dumper."""
+    data = {"order": OrderedDict(a=1), "counts": Counter(b=2), "todo": None}
+    assert yaml_backend.dump_yaml(data, pure=pure) == yaml.dump(
+        data, Dumper=yaml_backend.FullDumper
+    )
+    assert "todo:\n" in yaml_string(data)